@@ -4,9 +4,8 @@ if __name__ == "__main__":
     # Initialize the Yyt class with your project name
     manager = Yyt("school")  
     manager.add_urls(["https://www.youtube.com/watch?v=Ir0eO9H8P7k&pp=ygUOc2lkZW1lbiByZWFjdHM%3D"])
-    manager.download_all_audio()
-    manager.segment_all_audio(segment_length_ms=30 * 60 * 1000)
-    manager.embed_all_audio()
+    # Download, segment, embed, label and transcribe every URL as a streaming pipeline
+    manager.run_pipeline(segment_length_ms=30 * 60 * 1000)
 
     # Existing features (uncomment as needed)
     # manager.add_urls(["https://www.youtube.com/watch?v=cO8-_Eedjfk&pp=ygUJam9lIHJvZ2Fu"])
@@ -19,7 +18,7 @@ if __name__ == "__main__":
     # target_label = "Speaker 19"  # Replace with your desired label name
     # manager.get_label_info(target_label)
     # manager.list_labels()
-    # manager.segment_audio_using_embeddings_timestamps()
+    # manager.segment_audio_using_embeddings_timestamps()  # Optional: export speaker turns as WAV files
     # manager.transcribe_final_segments()
 
     # New Feature: Listen to all segments of a specific speaker
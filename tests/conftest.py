@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Point the package at a throwaway SQLite database before anything imports it, since the engine
+# is created on import. The artifact cache is disabled so tests never write outside the temp dir.
+TEST_DIRECTORY = tempfile.mkdtemp(prefix="yyt-tests-")
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_DIRECTORY, 'test.db')}"
+os.environ['ARTIFACT_CACHE'] = "off"
@@ -0,0 +1,83 @@
+import re
+from sqlalchemy import select, text
+from yttrackmyvoice.database.models import AudioFile, URL, Segment, Embedding, EmbeddingTimestamp, EmbeddingLabel, Transcript
+
+# Steps of SQLite's EXPLAIN QUERY PLAN output, e.g. "SEARCH segments USING INDEX ix_segments_audio_id (audio_id=?)"
+PLAN_STEP = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS \w+)?(?: USING (.*))?")
+
+# Hot lookups of the pipeline, with the table each one must reach through an index
+HOT_QUERIES = [
+    ("URLs of a project", 'urls',
+     select(URL.url_id).where(URL.project_id == 1)),
+    ("Audio files of a project", 'audio_files',
+     select(AudioFile.audio_id).where(AudioFile.project_id == 1)),
+    ("Segments of an audio file", 'segments',
+     select(Segment.segment_id).where(Segment.audio_id == 1)),
+    ("Segments without embeddings", 'embeddings',
+     select(Segment.segment_id)
+     .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+     .outerjoin(Embedding, Embedding.segment_id == Segment.segment_id)
+     .where(AudioFile.project_id == 1, Embedding.embedding_id.is_(None))),
+    ("Speaker turns of a segment", 'embedding_timestamps',
+     select(EmbeddingTimestamp.timestamp_id)
+     .join(Embedding, Embedding.embedding_id == EmbeddingTimestamp.embedding_id)
+     .where(Embedding.segment_id == 1)),
+    ("Speaker turns without transcripts", 'transcripts',
+     select(EmbeddingTimestamp.timestamp_id)
+     .outerjoin(Transcript, Transcript.timestamp_id == EmbeddingTimestamp.timestamp_id)
+     .where(Transcript.transcript_id.is_(None))),
+    ("Embeddings of a label", 'embedding_labels',
+     select(EmbeddingLabel.embedding_id).where(EmbeddingLabel.label_id == 1)),
+]
+
+
+def explain_query_plan(connection, statement):
+    """
+    Returns the steps of SQLite's query plan for a statement.
+
+    Parameters:
+    - connection (Connection): An open SQLite connection.
+    - statement (Select): The statement to explain.
+
+    Returns:
+    - List[str]: The 'detail' column of every plan step.
+    """
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def uses_index(plan, table):
+    """
+    Whether every plan step reading the given table goes through an index rather than a full scan.
+    """
+    steps = [PLAN_STEP.match(detail) for detail in plan]
+    steps = [step for step in steps if step and step.group(2) == table]
+    return bool(steps) and all(
+        step.group(1) == "SEARCH" or "INDEX" in (step.group(3) or "")
+        for step in steps
+    )
+
+
+def check_query_plans(engine):
+    """
+    Checks that the hot queries of the pipeline use the foreign-key indexes, to catch queries
+    that regressed to full table scans after a schema change.
+
+    Parameters:
+    - engine (Engine): The engine of a migrated database. Only SQLite is supported.
+
+    Returns:
+    - List[Dict]: 'name', 'table', 'uses_index' and 'plan' of every hot query.
+    """
+    if engine.dialect.name != "sqlite":
+        print(f"Query plan checks only support SQLite, not {engine.dialect.name}.")
+        return []
+
+    results = []
+    with engine.connect() as connection:
+        for name, table, statement in HOT_QUERIES:
+            plan = explain_query_plan(connection, statement)
+            results.append({'name': name, 'table': table, 'uses_index': uses_index(plan, table), 'plan': plan})
+            if not results[-1]['uses_index']:
+                print(f"Query '{name}' scans '{table}' without an index: {'; '.join(plan)}")
+    return results
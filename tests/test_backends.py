@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+
+from yttrackmyvoice.services.backends import OnnxModel, export_onnx
+from yttrackmyvoice.utils import get_key
+
+# Speech clip the ONNX backend is compared on against fp32; YYT_PARITY_CLIP overrides it
+PARITY_CLIP = os.environ.get("YYT_PARITY_CLIP") or os.path.join(os.path.dirname(__file__), "fixtures", "speech.wav")
+
+
+class WeightedMean(torch.nn.Module):
+    # Stand-in for pyannote's embedding models, whose weights input is optional
+    def forward(self, waveforms, weights=None):
+        samples = waveforms.mean(dim=1)
+        if weights is None:
+            weights = torch.ones_like(samples)
+        return (samples * weights).sum(dim=-1, keepdim=True) / weights.sum(dim=-1, keepdim=True)
+
+
+@pytest.fixture
+def onnx_model(tmp_path):
+    model = WeightedMean()
+    example = (torch.randn(1, 1, 160), torch.ones(1, 160))
+    path = export_onnx(model, str(tmp_path / "weighted_mean.onnx"), example, ["waveforms", "weights"])
+    wrapped = OnnxModel(model, path, ["waveforms", "weights"], defaults={
+        'weights': lambda waveforms: torch.ones(waveforms.shape[0], waveforms.shape[-1])
+    })
+    return model, wrapped, path
+
+
+def test_onnx_model_fills_omitted_inputs(onnx_model):
+    model, wrapped, _ = onnx_model
+    waveforms = torch.randn(3, 1, 400)
+
+    expected = model(waveforms).detach().numpy()
+    np.testing.assert_allclose(wrapped(waveforms).numpy(), expected, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(wrapped(waveforms, weights=None).numpy(), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_onnx_model_passes_given_inputs(onnx_model):
+    model, wrapped, _ = onnx_model
+    waveforms, weights = torch.randn(2, 1, 400), torch.rand(2, 400)
+
+    expected = model(waveforms, weights).detach().numpy()
+    np.testing.assert_allclose(wrapped(waveforms, weights=weights).numpy(), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_onnx_model_rejects_missing_inputs_without_default(onnx_model):
+    model, _, path = onnx_model
+    strict = OnnxModel(model, path, ["waveforms", "weights"])
+    with pytest.raises(TypeError):
+        strict(torch.randn(1, 1, 160))
+
+
+@pytest.mark.skipif(not os.path.exists(PARITY_CLIP), reason="no speech clip for the parity check")
+@pytest.mark.skipif(not get_key('SECRET_KEY_PYANNOTE'), reason="SECRET_KEY_PYANNOTE is required to load pyannote")
+def test_onnx_backend_matches_fp32():
+    pytest.importorskip("pyannote.metrics")
+    from yttrackmyvoice.embed_audio import Embedder
+
+    summary = Embedder(backend="onnx", cache=False).check_parity([PARITY_CLIP])
+
+    assert summary['speaker_count_delta'] == 0
+    assert summary['cosine_similarity'] >= 0.99
+    assert summary['diarization_error_rate'] <= 0.05
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from yttrackmyvoice.services.embedding.store import EmbeddingStore, _append_npy
+
+
+def test_append_after_partial_write_keeps_ids_and_vectors_aligned(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings"))
+    store.append(np.array([1, 2]), np.array([[1, 1], [2, 2]], dtype=np.float32))
+
+    # A crash between the two files of an append: vector 3 was written, its ID was not
+    _append_npy(store.vectors_path, np.array([[3, 3]], dtype=np.float32), np.float32)
+
+    store.append(np.array([4, 5]), np.array([[4, 4], [5, 5]], dtype=np.float32))
+
+    assert len(store) == 4
+    found, vectors = store.get(np.array([1, 2, 3, 4, 5]))
+    assert found.tolist() == [True, True, False, True, True]
+    np.testing.assert_array_equal(vectors, [[1, 1], [2, 2], [4, 4], [5, 5]])
+
+
+def test_append_after_ids_without_vectors(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings"))
+    store.append(np.array([1]), np.array([[1, 1]], dtype=np.float32))
+    _append_npy(store.ids_path, np.array([2]), np.int64)
+
+    store.append(np.array([3]), np.array([[3, 3]], dtype=np.float32))
+
+    found, vectors = store.get(np.array([1, 2, 3]))
+    assert found.tolist() == [True, False, True]
+    np.testing.assert_array_equal(vectors, [[1, 1], [3, 3]])
@@ -0,0 +1,101 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("alembic")
+
+from alembic import command
+from sqlalchemy import create_engine, text
+from yttrackmyvoice.database import alembic_config, engine, init_db
+from query_plans import HOT_QUERIES, check_query_plans, explain_query_plan, uses_index
+
+HOT_QUERY_IDS = [name for name, _, _ in HOT_QUERIES]
+
+# Rows of a database created by the first releases, including a duplicate transcript
+BASELINE_ROWS = [
+    "INSERT INTO projects (project_id, project_name, project_path) VALUES (1, 'project', '/tmp/project')",
+    "INSERT INTO urls (url_id, project_id, url) VALUES (1, 1, 'https://www.youtube.com/watch?v=a')",
+    "INSERT INTO urls (url_id, project_id, url) VALUES (2, 1, 'https://www.youtube.com/watch?v=b')",
+    "INSERT INTO audio_files (audio_id, audio_path, audio_folder_path, project_id, url_id) "
+    "VALUES (1, '/tmp/project/1/a.wav', '/tmp/project/1', 1, 1)",
+    "INSERT INTO segments (segment_id, audio_id, start_time, end_time, duration, file_path) "
+    "VALUES (1, 1, 0, 60, 60, '/tmp/project/1/segment_0.wav')",
+    "INSERT INTO embeddings (embedding_id, segment_id, vector) VALUES (1, 1, X'00')",
+    "INSERT INTO embedding_timestamps (timestamp_id, embedding_id, start_time, end_time) VALUES (1, 1, 0, 5)",
+    "INSERT INTO embedding_timestamps (timestamp_id, embedding_id, start_time, end_time) VALUES (2, 1, 5, 9)",
+    "INSERT INTO transcripts (transcript_id, timestamp_id, text) VALUES (1, 1, 'first take')",
+    "INSERT INTO transcripts (transcript_id, timestamp_id, text) VALUES (2, 1, 'second take')",
+    "INSERT INTO transcripts (transcript_id, timestamp_id, text) VALUES (3, 2, 'another turn')",
+]
+
+
+@pytest.fixture(scope="module")
+def connection():
+    init_db()
+    with engine.connect() as connection:
+        yield connection
+
+
+@pytest.fixture(scope="module")
+def upgraded_engine(tmp_path_factory):
+    # Upgrades a database from the initial schema, the path every pre-migration database takes
+    upgrade_engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('upgrade') / 'upgrade.db'}")
+    config = alembic_config()
+    with upgrade_engine.begin() as connection:
+        config.attributes['connection'] = connection
+        command.upgrade(config, "0001")
+    with upgrade_engine.begin() as connection:
+        for statement in BASELINE_ROWS:
+            connection.execute(text(statement))
+    with upgrade_engine.begin() as connection:
+        config.attributes['connection'] = connection
+        command.upgrade(config, "head")
+    yield upgrade_engine
+    upgrade_engine.dispose()
+
+
+@pytest.mark.parametrize("name, table, statement", HOT_QUERIES, ids=HOT_QUERY_IDS)
+def test_hot_query_uses_index(connection, name, table, statement):
+    plan = explain_query_plan(connection, statement)
+    assert uses_index(plan, table), f"'{name}' scans '{table}': {'; '.join(plan)}"
+
+
+@pytest.mark.parametrize("name, table, statement", HOT_QUERIES, ids=HOT_QUERY_IDS)
+def test_hot_query_uses_index_after_upgrade(upgraded_engine, name, table, statement):
+    with upgraded_engine.connect() as connection:
+        plan = explain_query_plan(connection, statement)
+    assert uses_index(plan, table), f"'{name}' scans '{table}': {'; '.join(plan)}"
+
+
+def test_upgrade_keeps_rows_and_removes_duplicate_transcripts(upgraded_engine):
+    with upgraded_engine.connect() as connection:
+        assert connection.execute(text("SELECT version_num FROM alembic_version")).scalar() == '0004'
+        assert connection.execute(text("SELECT url_id FROM urls ORDER BY url_id")).scalars().all() == [1, 2]
+        assert connection.execute(
+            text("SELECT transcript_id, timestamp_id, text FROM transcripts ORDER BY transcript_id")
+        ).all() == [(1, 1, 'first take'), (3, 2, 'another turn')]
+        assert connection.execute(
+            text("SELECT rowid FROM transcripts_fts WHERE transcripts_fts MATCH 'turn'")
+        ).scalars().all() == [3]
+
+
+def test_upgrade_enforces_uniqueness(upgraded_engine):
+    for statement in (
+        "INSERT INTO transcripts (timestamp_id, text) VALUES (1, 'third take')",
+        "INSERT INTO urls (project_id, url) VALUES (1, 'https://www.youtube.com/watch?v=a')",
+    ):
+        with pytest.raises(Exception, match="UNIQUE"):
+            with upgraded_engine.begin() as connection:
+                connection.execute(text(statement))
+
+
+def test_check_query_plans_reports_every_query(connection):
+    results = check_query_plans(engine)
+    assert [result['name'] for result in results] == HOT_QUERY_IDS
+    assert all(result['uses_index'] for result in results)
+
+
+def test_uses_index_rejects_full_scans():
+    assert not uses_index(["SCAN segments"], 'segments')
+    assert uses_index(["SCAN segments USING COVERING INDEX ix_segments_audio_id"], 'segments')
+    assert uses_index(["SEARCH segments USING INDEX ix_segments_audio_id (audio_id=?)"], 'segments')
+    assert not uses_index(["SEARCH urls USING INDEX ix_urls_project_id (project_id=?)"], 'segments')
@@ -1,14 +1,55 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import inspect
 from sqlalchemy.orm import sessionmaker
 from .models import Base  # Import your Base class
+from .engine import create_db_engine
+from .fulltext import create_transcript_fts
 
-# Create engine for SQLite database
-engine = create_engine('sqlite:///example.db', echo=False)
-
-# Create all tables automatically when the package is imported
-Base.metadata.create_all(engine)
+# Create the engine configured by DATABASE_URL and the pool / SQLite settings in .env
+engine = create_db_engine()
 
 # Optional: Create a configured "SessionLocal" class, used for each session
 SessionLocal = sessionmaker(bind=engine)
 
+# Alembic scripts, and the revision matching the schema of databases created before migrations existed
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+BASELINE_REVISION = '0001'
+
+
+def alembic_config():
+    """
+    Returns the Alembic configuration of the package's migration scripts.
+    """
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option('script_location', MIGRATIONS_DIRECTORY)
+    return config
+
+
+def init_db():
+    """
+    Creates or migrates the database schema. Called explicitly (Yyt does so on construction)
+    instead of on import, so importing the package never writes to the database.
+
+    A new database gets every table from the models and is stamped with the latest migration.
+    An existing database is upgraded with the Alembic migrations; one that predates migrations
+    is first stamped with the baseline revision. On SQLite both also get the full-text index
+    over transcripts.
+    """
+    from alembic import command
+
+    tables = set(inspect(engine).get_table_names())
+    config = alembic_config()
+
+    with engine.begin() as connection:
+        config.attributes['connection'] = connection
+        if not tables - {'alembic_version'}:
+            Base.metadata.create_all(connection)
+            create_transcript_fts(connection)
+            command.stamp(config, "head")
+            return
 
+        if 'alembic_version' not in tables:
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
@@ -0,0 +1,157 @@
+from sqlalchemy import text, cast, Float
+from .models import URL, AudioFile, Segment, Embedding, EmbeddingTimestamp, EmbeddingLabel, LabelName, Transcript
+
+# External-content FTS5 index over transcripts.text, kept in sync by triggers on every write
+TRANSCRIPT_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transcripts_fts USING fts5("
+    "text, content='transcripts', content_rowid='transcript_id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS transcripts_fts_insert AFTER INSERT ON transcripts BEGIN "
+    "INSERT INTO transcripts_fts(rowid, text) VALUES (new.transcript_id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS transcripts_fts_delete AFTER DELETE ON transcripts BEGIN "
+    "INSERT INTO transcripts_fts(transcripts_fts, rowid, text) VALUES ('delete', old.transcript_id, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS transcripts_fts_update AFTER UPDATE ON transcripts BEGIN "
+    "INSERT INTO transcripts_fts(transcripts_fts, rowid, text) VALUES ('delete', old.transcript_id, old.text); "
+    "INSERT INTO transcripts_fts(rowid, text) VALUES (new.transcript_id, new.text); END",
+]
+
+DROP_TRANSCRIPT_FTS_DDL = [
+    "DROP TRIGGER IF EXISTS transcripts_fts_update",
+    "DROP TRIGGER IF EXISTS transcripts_fts_delete",
+    "DROP TRIGGER IF EXISTS transcripts_fts_insert",
+    "DROP TABLE IF EXISTS transcripts_fts",
+]
+
+SEARCH_SQL = """
+SELECT t.transcript_id, t.timestamp_id,
+       snippet(transcripts_fts, 0, :open, :close, '…', :snippet_tokens) AS snippet,
+       -bm25(transcripts_fts) AS score,
+       ln.label_name, u.title, u.url, a.audio_id,
+       CAST(s.start_time AS REAL) / 1000.0 + et.start_time AS start_time,
+       CAST(s.start_time AS REAL) / 1000.0 + et.end_time AS end_time
+FROM transcripts_fts
+JOIN transcripts t ON t.transcript_id = transcripts_fts.rowid
+JOIN embedding_timestamps et ON et.timestamp_id = t.timestamp_id
+JOIN embeddings e ON e.embedding_id = et.embedding_id
+JOIN segments s ON s.segment_id = e.segment_id
+JOIN audio_files a ON a.audio_id = s.audio_id
+JOIN urls u ON u.url_id = a.url_id
+LEFT JOIN embedding_labels el ON el.embedding_id = e.embedding_id
+LEFT JOIN label_names ln ON ln.label_id = el.label_id
+WHERE transcripts_fts MATCH :query {project_filter}
+ORDER BY rank
+LIMIT :limit OFFSET :offset
+"""
+
+SEARCH_COLUMNS = [
+    'transcript_id', 'timestamp_id', 'snippet', 'score', 'label', 'title', 'url', 'audio_id', 'start_time', 'end_time'
+]
+
+
+def create_transcript_fts(connection):
+    """
+    Creates the FTS5 index over transcripts and its triggers, and indexes existing rows.
+    Does nothing on databases other than SQLite, which search with LIKE instead.
+
+    Parameters:
+    - connection (Connection): An open connection, inside a transaction.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transcripts_fts'"
+    )).first()
+    for statement in TRANSCRIPT_FTS_DDL:
+        connection.execute(text(statement))
+    if not exists:
+        connection.execute(text("INSERT INTO transcripts_fts(transcripts_fts) VALUES ('rebuild')"))
+
+
+def drop_transcript_fts(connection):
+    if connection.dialect.name != "sqlite":
+        return
+    for statement in DROP_TRANSCRIPT_FTS_DDL:
+        connection.execute(text(statement))
+
+
+def to_match_query(query):
+    """
+    Turns free text into an FTS5 query matching every word, so punctuation and FTS5 operators
+    typed by the user cannot cause syntax errors.
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def _like_snippet(transcript, query, open_mark, close_mark, width=60):
+    position = transcript.lower().find(query.lower())
+    if position < 0:
+        return transcript[:2 * width]
+    start, end = max(0, position - width), position + len(query)
+    return (("…" if start else "") + transcript[start:position] + open_mark + transcript[position:end]
+            + close_mark + transcript[end:end + width] + ("…" if end + width < len(transcript) else ""))
+
+
+def search_transcripts(session, query, project_id=None, limit=20, offset=0, raw=False,
+                       open_mark="[", close_mark="]", snippet_tokens=16):
+    """
+    Searches transcripts, best match first.
+
+    On SQLite the FTS5 index is used and hits are ranked by BM25. Other databases fall back to a
+    case-insensitive LIKE search ordered by transcript ID, without a score.
+
+    Parameters:
+    - session (Session): The active database session.
+    - query (str): Words to search for (all must match).
+    - project_id (int, optional): Only search this project.
+    - limit (int): Number of hits per page.
+    - offset (int): Number of hits to skip, for pagination.
+    - raw (bool): Pass query to FTS5 unchanged, to use its syntax (phrases, OR, NEAR, prefix*).
+    - open_mark, close_mark (str): Markers around matched words in the snippet.
+    - snippet_tokens (int): Approximate snippet length, in words.
+
+    Returns:
+    - List[Dict]: 'transcript_id', 'timestamp_id', 'snippet', 'score', 'label', 'title', 'url',
+      'audio_id', and 'start_time' / 'end_time' in seconds from the start of the video.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        sql = SEARCH_SQL.format(project_filter="AND a.project_id = :project_id" if project_id is not None else "")
+        rows = session.execute(text(sql), {
+            'query': query if raw else to_match_query(query),
+            'project_id': project_id,
+            'open': open_mark,
+            'close': close_mark,
+            'snippet_tokens': snippet_tokens,
+            'limit': limit,
+            'offset': offset
+        }).all()
+        return [dict(zip(SEARCH_COLUMNS, row)) for row in rows]
+
+    segment_start = cast(Segment.start_time, Float) / 1000.0
+    like_query = (
+        session.query(
+            Transcript.transcript_id, Transcript.timestamp_id, Transcript.text, LabelName.label_name,
+            URL.title, URL.url, AudioFile.audio_id,
+            segment_start + EmbeddingTimestamp.start_time, segment_start + EmbeddingTimestamp.end_time
+        )
+        .join(EmbeddingTimestamp, EmbeddingTimestamp.timestamp_id == Transcript.timestamp_id)
+        .join(Embedding, Embedding.embedding_id == EmbeddingTimestamp.embedding_id)
+        .join(Segment, Segment.segment_id == Embedding.segment_id)
+        .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+        .join(URL, URL.url_id == AudioFile.url_id)
+        .outerjoin(EmbeddingLabel, EmbeddingLabel.embedding_id == Embedding.embedding_id)
+        .outerjoin(LabelName, LabelName.label_id == EmbeddingLabel.label_id)
+        .filter(*[Transcript.text.ilike(f"%{word}%") for word in query.split()])
+    )
+    if project_id is not None:
+        like_query = like_query.filter(AudioFile.project_id == project_id)
+    rows = like_query.order_by(Transcript.transcript_id).limit(limit).offset(offset).all()
+
+    first_word = query.split()[0] if query.split() else ""
+    return [
+        {
+            'transcript_id': transcript_id, 'timestamp_id': timestamp_id,
+            'snippet': _like_snippet(transcript, first_word, open_mark, close_mark),
+            'score': None, 'label': label, 'title': title, 'url': url, 'audio_id': audio_id,
+            'start_time': start_time, 'end_time': end_time
+        }
+        for transcript_id, timestamp_id, transcript, label, title, url, audio_id, start_time, end_time in rows
+    ]
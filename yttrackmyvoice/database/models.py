@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, DECIMAL, LargeBinary, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, DECIMAL, LargeBinary, Float, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -29,10 +29,13 @@ class Project(Base):
 # Model for the URL table
 class URL(Base):
     __tablename__ = 'urls'
+    __table_args__ = (
+        UniqueConstraint('project_id', 'url', name='uq_urls_project_id_url'),  # A URL is added to a project only once
+    )
 
     # Primary key and foreign key for project association
     url_id = Column(Integer, primary_key=True, index=True, autoincrement=True)  # Changed from 'id' to 'url_id' for clarity
-    project_id = Column(Integer, ForeignKey('projects.project_id'), nullable=False)  # Foreign key linking URLs to a project
+    project_id = Column(Integer, ForeignKey('projects.project_id'), nullable=False, index=True)  # Foreign key linking URLs to a project
     url = Column(String(2083), nullable=False)  # Storing the actual URL, 2083 is the maximum URL length
 
     # Additional metadata for the URL
@@ -60,11 +63,13 @@ class AudioFile(Base):
     audio_folder_path = Column(String(500), nullable=False)  # Folder path containing the audio file
     
     # Foreign keys linking audio to a project and a URL
-    project_id = Column(Integer, ForeignKey('projects.project_id'), nullable=False)
-    url_id = Column(Integer, ForeignKey('urls.url_id'), nullable=False)  # Foreign key linking to the URL model
+    project_id = Column(Integer, ForeignKey('projects.project_id'), nullable=False, index=True)
+    url_id = Column(Integer, ForeignKey('urls.url_id'), nullable=False, index=True)  # Foreign key linking to the URL model
 
     # Duration of the audio file
     duration_seconds = Column(DECIMAL(10, 2), nullable=True)  # Storing the duration in seconds, allowing decimals
+    sample_rate = Column(Integer, nullable=True)  # Sample rate of the stored audio, in Hz
+    channels = Column(Integer, nullable=True)  # Number of audio channels of the stored audio
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))  # Automatically set to the current UTC time
 
 
@@ -78,7 +83,8 @@ class AudioFile(Base):
     def __repr__(self):
         # Debugging representation for the AudioFile model
         return (f"<AudioFile(id={self.audio_id}, project_id={self.project_id}, url_id={self.url_id}, "
-                f"audio_path='{self.audio_path}', duration_seconds={self.duration_seconds}, created_at={self.created_at})>")
+                f"audio_path='{self.audio_path}', duration_seconds={self.duration_seconds}, "
+                f"sample_rate={self.sample_rate}, channels={self.channels}, created_at={self.created_at})>")
 
 # Model for the Segment table
 class Segment(Base):
@@ -86,7 +92,7 @@ class Segment(Base):
 
     # Primary key and foreign key linking to the AudioFile table
     segment_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    audio_id = Column(Integer, ForeignKey('audio_files.audio_id', ondelete='CASCADE'), nullable=False)  # Link to the audio file, with cascade delete
+    audio_id = Column(Integer, ForeignKey('audio_files.audio_id', ondelete='CASCADE'), nullable=False, index=True)  # Link to the audio file, with cascade delete
     start_time = Column(DECIMAL(10, 2), nullable=False)  # Start time of the segment, in seconds
     end_time = Column(DECIMAL(10, 2), nullable=False)    # End time of the segment, in seconds
     duration = Column(DECIMAL(10, 2), nullable=False)    # Duration of the segment, in seconds
@@ -107,7 +113,7 @@ class Embedding(Base):
     __tablename__ = 'embeddings'
 
     embedding_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    segment_id = Column(Integer, ForeignKey('segments.segment_id', ondelete='CASCADE'), nullable=False)  # Reference to Segment model
+    segment_id = Column(Integer, ForeignKey('segments.segment_id', ondelete='CASCADE'), nullable=False, index=True)  # Reference to Segment model
     vector = Column(LargeBinary, nullable=False)  # Embedding vector stored as binary data
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))  # Timestamp of embedding creation
 
@@ -124,7 +130,7 @@ class EmbeddingTimestamp(Base):
     __tablename__ = 'embedding_timestamps'
 
     timestamp_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    embedding_id = Column(Integer, ForeignKey('embeddings.embedding_id', ondelete='CASCADE'), nullable=False)
+    embedding_id = Column(Integer, ForeignKey('embeddings.embedding_id', ondelete='CASCADE'), nullable=False, index=True)
     start_time = Column(Float, nullable=False)  # Start time in seconds
     end_time = Column(Float, nullable=False)    # End time in seconds
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -142,7 +148,7 @@ class EmbeddingLabel(Base):
     __tablename__ = 'embedding_labels'
 
     embedding_id = Column(Integer, ForeignKey('embeddings.embedding_id', ondelete='CASCADE'), primary_key=True)
-    label_id = Column(Integer, ForeignKey('label_names.label_id', ondelete='CASCADE'), primary_key=True)
+    label_id = Column(Integer, ForeignKey('label_names.label_id', ondelete='CASCADE'), primary_key=True, index=True)
 
     # Relationships
     embedding = relationship("Embedding", back_populates="labels")
@@ -156,18 +162,20 @@ class LabelName(Base):
 
     label_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     label_name = Column(String(255), nullable=False, unique=True)
+    centroid = Column(LargeBinary, nullable=True)  # Mean embedding vector of the label, stored as binary float32
+    embedding_count = Column(Integer, nullable=False, default=0)  # Number of embeddings behind the centroid
 
     # Relationships
     embeddings = relationship("EmbeddingLabel", back_populates="label")
 
     def __repr__(self):
-        return f"<LabelName(id={self.label_id}, name='{self.label_name}')>"
+        return f"<LabelName(id={self.label_id}, name='{self.label_name}', embedding_count={self.embedding_count})>"
 
 class Transcript(Base):
     __tablename__ = 'transcripts'
 
     transcript_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    timestamp_id = Column(Integer, ForeignKey('embedding_timestamps.timestamp_id', ondelete='CASCADE'), nullable=False)
+    timestamp_id = Column(Integer, ForeignKey('embedding_timestamps.timestamp_id', ondelete='CASCADE'), nullable=False, unique=True, index=True)  # One transcript per speaker turn
     text = Column(Text, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
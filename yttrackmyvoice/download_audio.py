@@ -1,17 +1,36 @@
 import os
 import re
+import json
 from pytubefix import YouTube
 from pytubefix.cli import on_progress
-from pydub import AudioSegment
 from .database import SessionLocal
 from .database.models import URL, AudioFile
-from .utils import create_directory_if_not_exists
+from .services.audio.pcm import PcmFormatError, read_pcm_info
+from .services.cache import resolve_cache
+from .utils import create_directory_if_not_exists, get_key
 import subprocess
 
+# Canonical pipeline format: pyannote and Whisper both work on 16 kHz mono
+DEFAULT_SAMPLE_RATE = 16000
+DEFAULT_CHANNELS = 1
+
 
 class Downloader:
-    def __init__(self):
-        pass
+    def __init__(self, sample_rate=None, channels=None, cache=None):
+        """
+        Initialize the Downloader with the format converted audio is stored in.
+
+        Parameters:
+        - sample_rate (int, optional): Sample rate of the converted .wav files. Defaults to the
+          AUDIO_SAMPLE_RATE environment key, or 16000.
+        - channels (int, optional): Channel count of the converted .wav files. Defaults to the
+          AUDIO_CHANNELS environment key, or 1.
+        - cache (ArtifactCache, optional): Cache of downloaded and converted audio, shared across
+          projects. Defaults to the default cache; False disables it.
+        """
+        self.sample_rate = int(sample_rate or get_key('AUDIO_SAMPLE_RATE') or DEFAULT_SAMPLE_RATE)
+        self.channels = int(channels or get_key('AUDIO_CHANNELS') or DEFAULT_CHANNELS)
+        self.cache = resolve_cache(cache)
 
     @staticmethod
     def sanitize_filename(filename):
@@ -27,21 +46,61 @@ class Downloader:
         Downloads the audio stream from a YouTube video given its URL, converts it to a .wav file,
         and returns the path to the .wav file along with the duration of the audio.
         """
+        try:
+            job = self.fetch_audio_stream(url_id)
+            if job is None:
+                return
+
+            if os.path.exists(job['wav_path']):
+                print(f"Converted .wav file already exists: {job['wav_path']}")
+                return
+
+            if self.convert_audio(job):
+                self.register_audio_file(job)
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+    def fetch_audio_stream(self, url_id, on_progress_callback=on_progress):
+        """
+        Downloads the audio-only stream of a URL record into its project folder.
+        This is the network-bound part of download_youtube_audio; errors are raised to the caller.
+
+        Parameters:
+        - url_id (int): The ID of the URL record.
+        - on_progress_callback (callable, optional): pytubefix progress callback.
+
+        Returns:
+        - Dict: 'url_id', 'project_id', 'audio_folder_path', 'source_path' and 'wav_path' of the
+          download, or None if the URL record does not exist.
+        """
         session = SessionLocal()
         try:
             # Retrieve the URL record from the database
             url_record = session.query(URL).filter_by(url_id=url_id).first()
+            if not url_record:
+                print(f"URL with ID {url_id} not found.")
+                return None
             url = url_record.url
 
             # Create a YouTube object
-            yt = YouTube(url, on_progress_callback=on_progress)
+            yt = YouTube(url, on_progress_callback=on_progress_callback)
             print(f'Downloading: {yt.title}')
 
-            # Filter for an audio-only stream in the .webm format
-            audio_stream = yt.streams.filter(only_audio=True, file_extension='webm').first()
-            file_format = audio_stream.subtype
             sanitized_title = self.sanitize_filename(yt.title)
 
+            # A video downloaded before, by any project, is copied from the cache instead
+            cache_key = self.cache.key(yt.video_id, "download") if self.cache else None
+            cached = self.cache.get_json("download", cache_key) if self.cache else None
+            if cached and not self.cache.has_blob(cached['blob']):
+                cached = None
+
+            audio_stream = None
+            if cached:
+                file_format = cached['subtype']
+            else:
+                audio_stream = self._audio_stream(yt)
+                file_format = audio_stream.subtype
+
             # Retrieve the associated project and its file path from the URL record
             project = url_record.project
             project_path = project.project_path
@@ -61,51 +120,178 @@ class Downloader:
             # Download the audio if it doesn't already exist
             if os.path.exists(audio_file_path):
                 print(f"File already exists: {audio_file_path}")
+            elif cached and self.cache.restore_blob(cached['blob'], audio_file_path):
+                print(f"Restored audio file from the cache: {audio_file_path}")
             else:
-                audio_stream.download(output_path=audio_folder_path, filename=audio_file_name)
+                # The blob may have been evicted since it was looked up
+                if audio_stream is None:
+                    audio_stream = self._audio_stream(yt)
+                # Download under a temporary name so a failed attempt never leaves a file that
+                # looks complete to the existence check above
+                partial_path = audio_file_path + ".part"
+                try:
+                    audio_stream.download(output_path=audio_folder_path, filename=audio_file_name + ".part")
+                    os.replace(partial_path, audio_file_path)
+                except BaseException:
+                    if os.path.exists(partial_path):
+                        os.remove(partial_path)
+                    raise
                 print(f"Downloaded audio file: {audio_file_path} in {file_format} format")
 
-            # Convert to .wav format
-            wav_file_name = f"{sanitized_title}.wav"
-            wav_file_path = os.path.join(audio_folder_path, wav_file_name)
-
-            if not os.path.exists(wav_file_path):
-                self.convert_webm_to_wav(audio_file_path, wav_file_path)
-                # Load the .wav file to get its duration
-                audio_segment = AudioSegment.from_wav(wav_file_path)
-                duration = audio_segment.duration_seconds  # Duration in seconds
-
-                # Create a new AudioFile record
-                audio_file = AudioFile(
-                    project_id=project.project_id,
-                    url_id=url_record.url_id,
-                    audio_path=wav_file_path,
-                    audio_folder_path=audio_folder_path,
-                    duration_seconds=duration
-                )
-                session.add(audio_file)
-                session.commit()
-                print(f"Audio file record created for '{wav_file_path}'")
-            else:
-                print(f"Converted .wav file already exists: {wav_file_path}")
+                # Only a download that just completed is published; a file that already existed may
+                # be left over from an older, unsafe run and is never trusted for other projects
+                if self.cache:
+                    self.cache.put_json("download", cache_key, {
+                        'blob': self.cache.put_blob(audio_file_path),
+                        'subtype': file_format
+                    })
 
-        except Exception as e:
+            return {
+                'url_id': url_record.url_id,
+                'project_id': project.project_id,
+                'audio_folder_path': audio_folder_path,
+                'source_path': audio_file_path,
+                'wav_path': os.path.join(audio_folder_path, f"{sanitized_title}.wav")
+            }
+        finally:
+            session.close()
+
+    @staticmethod
+    def _audio_stream(yt):
+        # Filter for an audio-only stream in the .webm format
+        return yt.streams.filter(only_audio=True, file_extension='webm').first()
+
+    def register_audio_file(self, job):
+        """
+        Creates the AudioFile record for a converted .wav file.
+
+        Parameters:
+        - job (Dict): A download job as returned by fetch_audio_stream.
+
+        Returns:
+        - int: The ID of the new AudioFile record.
+        """
+        session = SessionLocal()
+        try:
+            # Read the duration and format from the file header instead of decoding the audio
+            audio_info = self.probe_audio(job['wav_path'])
+
+            # Create a new AudioFile record
+            audio_file = AudioFile(
+                project_id=job['project_id'],
+                url_id=job['url_id'],
+                audio_path=job['wav_path'],
+                audio_folder_path=job['audio_folder_path'],
+                duration_seconds=audio_info['duration_seconds'],
+                sample_rate=audio_info['sample_rate'],
+                channels=audio_info['channels']
+            )
+            session.add(audio_file)
+            session.commit()
+            print(f"Audio file record created for '{job['wav_path']}'")
+            return audio_file.audio_id
+        except Exception:
             session.rollback()
-            print(f"An error occurred: {e}")
+            raise
         finally:
             session.close()
 
+    def convert_audio(self, job):
+        """
+        Converts a downloaded job's source file to its .wav file in the pipeline format.
+        The converted audio is cached by the content hash of the source, the sample rate and
+        the channel count, so the same source is only converted once.
+
+        Parameters:
+        - job (Dict): A download job as returned by fetch_audio_stream.
+
+        Returns:
+        - bool: True if the .wav file was converted or restored from the cache.
+        """
+        if not self.cache:
+            return self.convert_webm_to_wav(job['source_path'], job['wav_path'], self.sample_rate, self.channels)
+
+        cache_key = self.cache.key(
+            self.cache.file_hash(job['source_path']), "convert",
+            sample_rate=self.sample_rate, channels=self.channels
+        )
+        cached = self.cache.get_json("convert", cache_key)
+        if cached and self.cache.restore_blob(cached['blob'], job['wav_path']):
+            print(f"Restored {job['wav_path']} from the cache")
+            return True
+
+        if not self.convert_webm_to_wav(job['source_path'], job['wav_path'], self.sample_rate, self.channels):
+            return False
+        self.cache.put_json("convert", cache_key, {'blob': self.cache.put_blob(job['wav_path'])})
+        return True
+
     @staticmethod
-    def convert_webm_to_wav(input_filepath, output_filepath):
+    def convert_webm_to_wav(input_filepath, output_filepath, sample_rate=DEFAULT_SAMPLE_RATE, channels=DEFAULT_CHANNELS):
         """
         Converts a .webm audio file to a .wav file using ffmpeg to handle large files.
+        Downmixing and resampling to the pipeline format happen in the same ffmpeg pass.
+        ffmpeg writes to a temporary file that is renamed once it finishes, so an interrupted
+        conversion never leaves a .wav file that looks complete.
+
+        Parameters:
+        - input_filepath (str): Path to the source audio file.
+        - output_filepath (str): Path to the .wav file to write.
+        - sample_rate (int): Sample rate of the output file.
+        - channels (int): Channel count of the output file.
+
+        Returns:
+        - bool: True if the conversion succeeded.
         """
+        partial_filepath = output_filepath + ".part"
         try:
-            # Use ffmpeg to convert the file
+            # Use ffmpeg to convert the file; the format is explicit since the extension is not .wav
             command = [
-                'ffmpeg', '-i', input_filepath, '-acodec', 'pcm_s16le', '-ar', '44100', output_filepath
+                'ffmpeg', '-y', '-i', input_filepath, '-vn', '-acodec', 'pcm_s16le',
+                '-ar', str(sample_rate), '-ac', str(channels), '-f', 'wav', partial_filepath
             ]
             subprocess.run(command, check=True)
-            print(f"Converted {input_filepath} to {output_filepath}")
+            os.replace(partial_filepath, output_filepath)
+            print(f"Converted {input_filepath} to {output_filepath} ({sample_rate} Hz, {channels} channel(s))")
+            return True
         except subprocess.CalledProcessError as e:
             print(f"An error occurred during conversion: {e}")
+            return False
+        finally:
+            if os.path.exists(partial_filepath):
+                os.remove(partial_filepath)
+
+    @staticmethod
+    def probe_audio(file_path):
+        """
+        Reads the duration, sample rate and channel count of an audio file without decoding it.
+        PCM WAV files are read from their header; anything else is probed with ffprobe.
+
+        Parameters:
+        - file_path (str): Path to the audio file.
+
+        Returns:
+        - Dict: 'duration_seconds', 'sample_rate' and 'channels'.
+        """
+        try:
+            info = read_pcm_info(file_path)
+            frames = info.data_size // (info.channels * info.sample_width)
+            return {
+                'duration_seconds': frames / info.sample_rate,
+                'sample_rate': info.sample_rate,
+                'channels': info.channels
+            }
+        except PcmFormatError:
+            pass
+
+        command = [
+            'ffprobe', '-v', 'error', '-select_streams', 'a:0',
+            '-show_entries', 'format=duration:stream=sample_rate,channels',
+            '-of', 'json', file_path
+        ]
+        probe = json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+        stream = (probe.get('streams') or [{}])[0]
+        return {
+            'duration_seconds': float(probe['format']['duration']),
+            'sample_rate': int(stream['sample_rate']) if 'sample_rate' in stream else None,
+            'channels': stream.get('channels')
+        }
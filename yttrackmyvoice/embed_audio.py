@@ -1,27 +1,244 @@
 import os
+import time
 import numpy as np
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.exc import SQLAlchemyError
 import torch
 
-from pyannote.audio import Pipeline
+from pyannote.audio import Audio
 
-from .utils import get_key
-from .database.models import Segment, Embedding, EmbeddingTimestamp
+from .database.models import Segment, Embedding
 from .database import SessionLocal
+from .services.backends import BACKENDS, check_parity
+from .services.cache import resolve_cache
+from .services.embedding.retrieval import fetch_embeddings
+from .services.embedding.store import EmbeddingStore, project_paths_for_segments
+from .services.persistence import insert_embeddings
+from .services.models import DIARIZATION_MODEL, pyannote_revision, registry
 
 
 class Embedder:
-    def __init__(self):
-        # Check if CUDA is available and set the device accordingly
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        print(f"Using device: {self.device}")
+    def __init__(self, model_name=DIARIZATION_MODEL, model_version=None, backend="fp32", cache=None):
+        """
+        Initialize the Embedder. The diarization pipeline is taken from the process-wide model
+        registry the first time it is needed, so creating an Embedder is cheap.
+
+        Parameters:
+        - model_name (str): Hugging Face name of the diarization pipeline.
+        - model_version (str, optional): Revision of the pipeline.
+        - backend (str): Inference backend of the segmentation and embedding models:
+          "fp32" (default), "int8" (dynamic int8 quantization, CPU) or "onnx" (ONNX Runtime, CPU).
+          Use check_parity to measure the accuracy cost of a CPU backend.
+        - cache (ArtifactCache, optional): Cache of diarization results, keyed by the segment audio,
+          model, resolved revision, pyannote.audio version and backend. Defaults to the default
+          cache; False disables it.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Choose one of {', '.join(BACKENDS)}.")
+
+        # Check if CUDA is available and set the device accordingly; quantized backends run on CPU
+        use_cuda = torch.cuda.is_available() and backend == "fp32"
+        self.device = torch.device("cuda" if use_cuda else "cpu")
+        print(f"Using device: {self.device} ({backend} backend)")
+
+        self.model_name = model_name
+        self.model_version = model_version
+        self.backend = backend
+        self.cache = resolve_cache(cache)
+        self._revision = None  # Resolved by _diarization_key, see pyannote_revision
+
+        # Decodes segment files to the mono 16 kHz waveforms the pipeline works on
+        self.audio = Audio(sample_rate=16000, mono="downmix")
+
+    @property
+    def pipeline(self):
+        kind = 'pyannote' if self.backend == "fp32" else f"pyannote-{self.backend}"
+        return registry.get(kind, self.model_name, self.device, self.model_version)
+
+    def check_parity(self, file_paths, reference_backend="fp32"):
+        """
+        Measures how far this Embedder's backend drifts from a reference backend on sample files.
+
+        Parameters:
+        - file_paths (List[str]): Audio files to diarize with both backends.
+        - reference_backend (str): Backend to compare against (default is "fp32").
+
+        Returns:
+        - Dict: Mean cosine similarity of matched speaker embeddings, diarization error rate,
+          boundary error, speaker count delta and speedup, plus per-file results.
+        """
+        reference = Embedder(self.model_name, self.model_version, backend=reference_backend)
+        return check_parity(reference, self, file_paths)
+
+    def configure(self, segmentation_batch_size=None, embedding_batch_size=None, num_threads=None, num_interop_threads=None):
+        """
+        Tunes batching and torch threading of the diarization pipeline.
 
-        # Initialize the diarization pipeline once when the Embedder is created
-        self.pipeline = Pipeline.from_pretrained(
-            'pyannote/speaker-diarization-3.1',
-            use_auth_token=get_key('SECRET_KEY_PYANNOTE')
-        ).to(self.device)
+        Parameters:
+        - segmentation_batch_size (int, optional): Batch size of the segmentation model.
+        - embedding_batch_size (int, optional): Batch size of the speaker embedding model.
+        - num_threads (int, optional): Torch intra-op thread count.
+        - num_interop_threads (int, optional): Torch inter-op thread count. Torch only accepts this
+          before any parallel work has run in the process.
+        """
+        if segmentation_batch_size:
+            self.pipeline.segmentation_batch_size = segmentation_batch_size
+        if embedding_batch_size:
+            self.pipeline.embedding_batch_size = embedding_batch_size
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        if num_interop_threads:
+            try:
+                torch.set_num_interop_threads(num_interop_threads)
+            except RuntimeError as e:
+                print(f"Could not set inter-op threads to {num_interop_threads}: {e}")
+
+        print(f"Diarization batch sizes: segmentation={self.pipeline.segmentation_batch_size}, "
+              f"embedding={self.pipeline.embedding_batch_size}; torch threads: "
+              f"intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}")
+
+    def load_audio(self, file_path):
+        """
+        Loads an audio file as the in-memory input accepted by the diarization pipeline.
+
+        Parameters:
+        - file_path (str): Path to the audio file.
+
+        Returns:
+        - Dict: 'waveform' (torch.Tensor of shape (channel, time)) and 'sample_rate'.
+        """
+        waveform, sample_rate = self.audio(file_path)
+        return {'waveform': waveform, 'sample_rate': sample_rate}
+
+    def diarize(self, audio):
+        """
+        Runs the diarization pipeline and returns its output as plain arrays.
+
+        Parameters:
+        - audio (str | Dict): Path to an audio file, or the output of load_audio.
+
+        Returns:
+        - Dict:
+            - 'embeddings' (np.ndarray): float32 matrix with one row per speaker.
+            - 'speakers' (np.ndarray): Speaker row index of each turn.
+            - 'starts' (np.ndarray): Start time of each turn, in seconds.
+            - 'ends' (np.ndarray): End time of each turn, in seconds.
+        """
+        diarization, embeddings = self.pipeline(audio, return_embeddings=True)
+
+        speaker_index = {speaker: idx for idx, speaker in enumerate(diarization.labels())}
+        turns = [
+            (speaker_index[speaker], turn.start, turn.end)
+            for turn, _, speaker in diarization.itertracks(yield_label=True)
+        ]
+
+        # Without speech pyannote returns a (0, dim) matrix, which reshape(0, -1) rejects
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if speaker_index:
+            embeddings = embeddings.reshape(len(speaker_index), -1)
+        else:
+            embeddings = embeddings.reshape(0, embeddings.shape[-1] if embeddings.ndim > 1 else 0)
+
+        return {
+            'embeddings': embeddings,
+            'speakers': np.array([turn[0] for turn in turns], dtype=np.int64),
+            'starts': np.array([turn[1] for turn in turns], dtype=np.float64),
+            'ends': np.array([turn[2] for turn in turns], dtype=np.float64)
+        }
+
+    def _diarization_key(self, file_path):
+        # Without a pinned version the weights are whatever "main" pointed to when downloaded, so
+        # the key uses the resolved revision. Until the pipeline is downloaded nothing is cached.
+        if self._revision is None:
+            self._revision = pyannote_revision(self.model_name, self.model_version)
+            if self._revision is None:
+                return None
+        return self.cache.key(
+            self.cache.file_hash(file_path), "diarization",
+            model=self.model_name, revision=self._revision, backend=self.backend
+        )
+
+    def cached_diarization(self, file_path):
+        """
+        Looks up the diarization of an audio file in the cache.
+
+        Returns:
+        - Tuple[Dict, float]: The diarize output and the audio duration in seconds, or None on a miss.
+        """
+        if not self.cache:
+            return None
+        cache_key = self._diarization_key(file_path)
+        arrays = self.cache.get_arrays("diarization", cache_key) if cache_key else None
+        if arrays is None:
+            return None
+        audio_seconds = float(arrays.pop('audio_seconds'))
+        return arrays, audio_seconds
+
+    def cache_diarization(self, file_path, result, audio_seconds):
+        cache_key = self._diarization_key(file_path) if self.cache else None
+        if cache_key:
+            self.cache.put_arrays("diarization", cache_key, {
+                **result, 'audio_seconds': np.float64(audio_seconds)
+            })
+
+    def diarize_file(self, file_path):
+        """
+        Diarizes an audio file, or returns its cached diarization.
+
+        Returns:
+        - Tuple[Dict, float]: The diarize output and the audio duration in seconds.
+        """
+        cached = self.cached_diarization(file_path)
+        if cached is not None:
+            return cached
+        audio = self.load_audio(file_path)
+        result = self.diarize(audio)
+        audio_seconds = audio['waveform'].shape[-1] / audio['sample_rate']
+        self.cache_diarization(file_path, result, audio_seconds)
+        return result, audio_seconds
+
+    def _load_unless_cached(self, file_path):
+        cached = self.cached_diarization(file_path)
+        if cached is not None:
+            return cached, None
+        return None, self.load_audio(file_path)
+
+    @staticmethod
+    def store_diarizations(session, results, min_duration=1.0):
+        """
+        Inserts the Embedding and EmbeddingTimestamp rows of diarized segments in bulk.
+        Speakers without any turn of at least min_duration are not stored. The caller commits,
+        then appends the new vectors to the project's EmbeddingStore.
+
+        Parameters:
+        - session (Session): The active database session.
+        - results (List[Tuple[int, Dict]]): Segment ID and output of diarize, per segment.
+        - min_duration (float): Minimum duration in seconds for a valid timestamp.
+
+        Returns:
+        - Tuple[np.ndarray, np.ndarray, np.ndarray]: IDs of the new embeddings, their (n, d)
+          float32 matrix, and the segment ID of each.
+        """
+        rows = []
+        for segment_id, result in results:
+            durations = result['ends'] - result['starts']
+            valid = durations >= min_duration
+            print(f"Segment ID {segment_id}: {int(valid.sum())} turns kept, {int((~valid).sum())} shorter than {min_duration}s skipped.")
+
+            for idx, embedding_vector in enumerate(result['embeddings']):
+                speaker_turns = valid & (result['speakers'] == idx)
+                if not speaker_turns.any():
+                    continue
+                rows.append({
+                    'segment_id': segment_id,
+                    'vector': embedding_vector.tobytes(),
+                    'timestamps': list(zip(result['starts'][speaker_turns], result['ends'][speaker_turns])),
+                    'embedding': embedding_vector
+                })
+
+        embedding_ids = np.array(insert_embeddings(session, rows), dtype=np.int64)
+        vectors = np.vstack([row['embedding'] for row in rows]) if rows else np.empty((0, 0), dtype=np.float32)
+        return embedding_ids, vectors, np.array([row['segment_id'] for row in rows], dtype=np.int64)
 
     def store_embedding_and_timestamp(self, segment_id, min_duration=1.0):
         """
@@ -59,85 +276,114 @@ class Embedder:
 
             # 3. Apply diarization to the audio file
             print("\nApplying diarization pipeline...\n")
-            diarization_result = self.pipeline(audio_file_path, return_embeddings=True)
-            diarization, embeddings = diarization_result
-
-            # 4. Get the list of unique speakers from the diarization labels
-            speakers = diarization.labels()
-
-            # 5. Iterate through each speaker and store their embedding and timestamps
-            for idx, speaker in enumerate(speakers):
-                print(f"\nSpeaker {speaker}'s embedding:\n{embeddings[idx]}\n")
-                embedding_vector = embeddings[idx]
-
-                # Convert the embedding vector to bytes for storage
-                embedding_bytes = embedding_vector.tobytes()
-
-                # Create a new Embedding instance
-                new_embedding = Embedding(
-                    segment_id=segment.segment_id,
-                    vector=embedding_bytes,
-                    created_at=datetime.now(timezone.utc)
-                )
-                session.add(new_embedding)
-                session.flush()  # Assign embedding_id
-
-                print(f"Created Embedding with ID: {new_embedding.embedding_id}")
-
-                # Initialize a flag to check if at least one valid timestamp is added
-                valid_timestamp_added = False
-
-                # Iterate through the speech segments of this speaker
-                for segment_obj, track, spkr in diarization.itertracks(yield_label=True):
-                    if spkr == speaker:
-                        segment_start = segment_obj.start
-                        segment_end = segment_obj.end
-                        duration = segment_end - segment_start
-
-                        # Check if the duration is at least the minimum duration
-                        if duration >= min_duration:
-                            print(f"Speaker {speaker} speaks from {segment_start:.1f}s to {segment_end:.1f}s (Duration: {duration:.2f}s)")
-
-                            # Create a new EmbeddingTimestamp instance
-                            new_timestamp = EmbeddingTimestamp(
-                                embedding_id=new_embedding.embedding_id,
-                                start_time=segment_start,
-                                end_time=segment_end,
-                                created_at=datetime.now(timezone.utc)
-                            )
-                            session.add(new_timestamp)
-                            valid_timestamp_added = True
-                        else:
-                            print(f"Skipped short timestamp: {segment_start:.1f}s to {segment_end:.1f}s (Duration: {duration:.2f}s)")
-
-                if not valid_timestamp_added:
-                    # If no valid timestamps were added, remove the embedding
-                    session.delete(new_embedding)
-                    print(f"No valid timestamps for Embedding ID {new_embedding.embedding_id}. Embedding deleted.")
-
-            # 6. Commit all changes
-            try:
-                session.commit()
-                print(f"Successfully stored embeddings and timestamps for segment_id {segment_id}.")
-            except SQLAlchemyError as e:
-                session.rollback()
-                print(f"Database error occurred during commit: {e}")
-            except Exception as e:
-                session.rollback()
-                print(f"An unexpected error occurred during commit: {e}")
-            finally:
-                session.close()
+            result, _ = self.diarize_file(audio_file_path)
+
+            # 4. Store each speaker's embedding and timestamps, then commit
+            project_path = segment.audio_file.project.project_path
+            embedding_ids, vectors, _ = self.store_diarizations(session, [(segment_id, result)], min_duration)
+            session.commit()
+            EmbeddingStore.for_project(project_path).append(embedding_ids, vectors)
+            print(f"Successfully stored {len(embedding_ids)} embeddings and their timestamps for segment_id {segment_id}.")
 
         except SQLAlchemyError as e:
+            session.rollback()
             print(f"Database error occurred: {e}")
         except Exception as e:
+            session.rollback()
             print(f"An unexpected error occurred: {e}")
         finally:
             session.close()
 
+    def embed_segments(self, segment_ids, min_duration=1.0, segmentation_batch_size=None,
+                       embedding_batch_size=None, num_threads=None, num_interop_threads=None):
+        """
+        Diarizes a list of segments and stores their embeddings and timestamps.
+
+        The next segment's audio is decoded on a background thread while the current one is
+        diarized, and throughput is reported as audio seconds processed per wall-clock second.
+
+        Parameters:
+        - segment_ids (List[int]): IDs of the segments to process.
+        - min_duration (float): Minimum duration in seconds for a valid timestamp.
+        - segmentation_batch_size (int, optional): Batch size of the segmentation model.
+        - embedding_batch_size (int, optional): Batch size of the speaker embedding model.
+        - num_threads (int, optional): Torch intra-op thread count.
+        - num_interop_threads (int, optional): Torch inter-op thread count.
+
+        Returns:
+        - Dict: 'segments', 'audio_seconds', 'wall_seconds' and 'throughput' (audio seconds per second).
+        """
+        self.configure(segmentation_batch_size, embedding_batch_size, num_threads, num_interop_threads)
+
+        session = SessionLocal()
+        try:
+            segments = session.query(Segment.segment_id, Segment.file_path).filter(
+                Segment.segment_id.in_(segment_ids)
+            ).all()
+            project_paths = project_paths_for_segments(session, segment_ids)
+        finally:
+            session.close()
+
+        started = time.perf_counter()
+        audio_seconds = 0.0
+        processed = 0
+
+        with ThreadPoolExecutor(max_workers=1) as loader:
+            pending = loader.submit(self._load_unless_cached, segments[0].file_path) if segments else None
+
+            for i, (segment_id, file_path) in enumerate(segments):
+                try:
+                    cached, audio = pending.result()
+                except Exception as e:
+                    cached, audio = None, None
+                    print(f"Could not load audio for Segment ID {segment_id} from '{file_path}': {e}")
+
+                # Start decoding the next segment while this one is diarized
+                if i + 1 < len(segments):
+                    pending = loader.submit(self._load_unless_cached, segments[i + 1].file_path)
+
+                if cached is None and audio is None:
+                    continue
+
+                session = SessionLocal()
+                try:
+                    if cached is not None:
+                        result, seconds = cached
+                    else:
+                        result = self.diarize(audio)
+                        seconds = audio['waveform'].shape[-1] / audio['sample_rate']
+                        self.cache_diarization(file_path, result, seconds)
+                    embedding_ids, vectors, _ = self.store_diarizations(session, [(segment_id, result)], min_duration)
+                    session.commit()
+                    EmbeddingStore.for_project(project_paths[segment_id]).append(embedding_ids, vectors)
+                except Exception as e:
+                    session.rollback()
+                    print(f"An error occurred while embedding Segment ID {segment_id}: {e}")
+                    continue
+                finally:
+                    session.close()
+
+                processed += 1
+                audio_seconds += seconds
+                elapsed = time.perf_counter() - started
+                print(f"Embedded {processed}/{len(segments)} segments, "
+                      f"{audio_seconds / elapsed:.1f} audio seconds per second.")
+
+        wall_seconds = time.perf_counter() - started
+        stats = {
+            'segments': processed,
+            'audio_seconds': audio_seconds,
+            'wall_seconds': wall_seconds,
+            'throughput': audio_seconds / wall_seconds if wall_seconds else 0.0
+        }
+        print(f"Embedded {processed} segments ({audio_seconds:.0f}s of audio) in {wall_seconds:.1f}s: "
+              f"{stats['throughput']:.1f} audio seconds per second.")
+        return stats
+
     def retrieve_embeddings(self, segment_id):
         """
         Retrieves all embeddings and their corresponding timestamps for a given segment_id.
+        Adapter over fetch_embeddings, which returns the same data in columnar form.
 
         Parameters:
         - segment_id (int): The ID of the segment to retrieve embeddings for.
@@ -153,51 +399,18 @@ class Embedder:
             print(f"Retrieving embeddings for Segment ID: {segment_id}")
 
             # 1. Retrieve the Segment from the database
-            segment = session.query(Segment).filter_by(segment_id=segment_id).first()
-            if not segment:
+            if not session.query(Segment.segment_id).filter_by(segment_id=segment_id).first():
                 print(f"Segment with ID {segment_id} not found.")
                 return []
 
-            # 2. Retrieve all Embeddings associated with the segment
-            embeddings = session.query(Embedding).filter_by(segment_id=segment_id).all()
-            if not embeddings:
+            # 2. Retrieve all Embeddings of the segment and their timestamps in joined queries
+            embedding_set = fetch_embeddings(session, segment_ids=[segment_id])
+            if not len(embedding_set):
                 print(f"No embeddings found for Segment ID {segment_id}.")
                 return []
 
-            # 3. Prepare the list to hold embedding data
-            embedding_data = []
-
-            for embedding in embeddings:
-                print(f"\nProcessing Embedding ID: {embedding.embedding_id}")
-
-                # 3.1. Convert the binary vector back to a NumPy array
-                embedding_vector = np.frombuffer(embedding.vector, dtype=np.float32)
-                print(f"Embedding vector shape: {embedding_vector.shape}")
-
-                # 3.2. Retrieve associated timestamps
-                timestamps = session.query(EmbeddingTimestamp).filter_by(embedding_id=embedding.embedding_id).all()
-
-                timestamp_list = []
-                for ts in timestamps:
-                    timestamp_info = {
-                        'start_time': ts.start_time,
-                        'end_time': ts.end_time,
-                        'created_at': ts.created_at
-                    }
-                    timestamp_list.append(timestamp_info)
-                    print(f" - Timestamp: {ts.start_time:.1f}s to {ts.end_time:.1f}s")
-
-                # 3.3. Append the embedding and its timestamps to the list
-                embedding_entry = {
-                    'embedding_id': embedding.embedding_id,
-                    'vector': embedding_vector,
-                    'timestamps': timestamp_list,
-                    'created_at': embedding.created_at
-                }
-                embedding_data.append(embedding_entry)
-
-            print(f"\nTotal embeddings retrieved: {len(embedding_data)}")
-            return embedding_data
+            print(f"\nTotal embeddings retrieved: {len(embedding_set)}")
+            return embedding_set.to_records()
 
         except SQLAlchemyError as e:
             print(f"Database error occurred: {e}")
@@ -1,74 +1,250 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import numpy as np
-from sqlalchemy.orm import Session
-from scipy.cluster.hierarchy import linkage, fcluster
 from yttrackmyvoice.database import SessionLocal
-from yttrackmyvoice.database.models import Embedding, EmbeddingLabel, LabelName
+from yttrackmyvoice.database.models import Segment, Embedding, EmbeddingLabel, LabelName
+from yttrackmyvoice.services.embedding.store import load_vectors
+from yttrackmyvoice.services.persistence import upsert_label_names, insert_embedding_labels
+from yttrackmyvoice.services.label import decode_vectors, finite_rows, nearest_centroids, ward_clusters, merge_centroids, cluster_centroids
 
 class EmbeddingLabeler:
-    def __init__(self, distance_threshold=1):
+    def __init__(self, distance_threshold=1, assignment_threshold=None, link_threshold=None):
         """
         Initialize the EmbeddingLabeler with a specified distance threshold for clustering.
 
         Parameters:
         - distance_threshold (float): The distance threshold for hierarchical clustering.
+        - assignment_threshold (float, optional): Maximum Euclidean distance between a new embedding
+          and a label centroid for the embedding to join that label. Defaults to distance_threshold.
+        - link_threshold (float, optional): Distance threshold for linking per-video speakers across
+          videos in cluster_hierarchically. Defaults to distance_threshold.
         """
         self.distance_threshold = distance_threshold
+        self.assignment_threshold = assignment_threshold if assignment_threshold is not None else distance_threshold
+        self.link_threshold = link_threshold if link_threshold is not None else distance_threshold
+
+    @staticmethod
+    def _load_vectors(session, embedding_ids=None):
+        """
+        Loads vectors from the embedding stores, dropping vectors that contain NaN or infinite values.
+        """
+        embedding_ids, vectors = load_vectors(session, embedding_ids)
+
+        valid = finite_rows(vectors)
+        if not valid.all():
+            print(f"Skipping {int((~valid).sum())} embeddings with non-finite values.")
+        return embedding_ids[valid], vectors[valid]
+
+    @staticmethod
+    def _next_speaker_number(session):
+        numbers = [
+            int(match.group(1))
+            for (label_name,) in session.query(LabelName.label_name)
+            for match in [re.fullmatch(r"Speaker (\d+)", label_name)]
+            if match
+        ]
+        return max(numbers, default=0) + 1
+
+    @staticmethod
+    def _replace_labels(session, embedding_ids, vectors, clusters):
+        """
+        Replaces every embedding label with the given clustering, and recomputes the
+        centroid and count of every label. The caller commits.
+        """
+        session.query(EmbeddingLabel).delete(synchronize_session=False)
+        session.query(LabelName).update(
+            {LabelName.centroid: None, LabelName.embedding_count: 0},
+            synchronize_session=False
+        )
+
+        # Map each unique cluster to a label name, creating or updating the labels in bulk
+        cluster_nums, centroids, counts = cluster_centroids(vectors, clusters)
+        label_ids = upsert_label_names(session, [
+            {'label_name': f"Speaker {cluster_num}", 'centroid': centroid.tobytes(), 'embedding_count': int(count)}
+            for cluster_num, centroid, count in zip(cluster_nums, centroids, counts)
+        ])
+
+        # Store the assigned labels
+        members = np.split(np.argsort(clusters, kind='stable'), np.cumsum(counts)[:-1])
+        insert_embedding_labels(session, (
+            {'embedding_id': int(embedding_id), 'label_id': label_ids[f"Speaker {cluster_num}"]}
+            for cluster_num, member_idx in zip(cluster_nums, members)
+            for embedding_id in embedding_ids[member_idx]
+        ))
 
     def cluster_and_label_embeddings(self):
         """
-        Clusters embeddings using hierarchical clustering and labels them in the database.
+        Clusters every embedding using hierarchical clustering and labels them in the database.
+
+        This is a full re-cluster: existing embedding labels are replaced, not added to, and the
+        centroid and count of every label are recomputed.
         """
         session = SessionLocal()
         try:
-            # Retrieve all embeddings from the database
-            embeddings = session.query(Embedding).all()
-            if not embeddings:
+            # Retrieve all embeddings from the memory-mapped embedding stores
+            if not session.query(Embedding.embedding_id).first():
                 print("No embeddings found in the database.")
                 return
-            
-            # Convert embeddings to a NumPy array
-            embedding_vectors = np.array([np.frombuffer(embedding.vector, dtype=np.float32) for embedding in embeddings])
-            
-            # Perform hierarchical clustering using Ward's method
-            Z = linkage(embedding_vectors, method='ward')
-            
-            # Assign cluster labels based on the distance threshold
-            clusters = fcluster(Z, self.distance_threshold, criterion='distance')
-            
-            # Map each unique cluster to a label name
-            cluster_to_label = {}
-            for cluster_num in np.unique(clusters):
-                label_name = f"Speaker {cluster_num}"
-                label = session.query(LabelName).filter_by(label_name=label_name).first()
-                if not label:
-                    label = LabelName(label_name=label_name)
-                    session.add(label)
-                    session.commit()  # Commit to assign a label_id
-                cluster_to_label[cluster_num] = label.label_id
-            
-            # Update the EmbeddingLabel table with the assigned labels
-            for embedding, cluster_label in zip(embeddings, clusters):
-                label_id = cluster_to_label[cluster_label]
-                
-                # Check if the embedding already has this label
-                existing_label = session.query(EmbeddingLabel).filter_by(
-                    embedding_id=embedding.embedding_id,
-                    label_id=label_id
-                ).first()
-                
-                if not existing_label:
-                    embedding_label = EmbeddingLabel(
-                        embedding_id=embedding.embedding_id,
-                        label_id=label_id
-                    )
-                    session.add(embedding_label)
-            
-            # Commit all changes to the database
+
+            embedding_ids, embedding_vectors = self._load_vectors(session)
+            if not len(embedding_ids):
+                print("No valid embeddings to cluster.")
+                return
+
+            # Perform hierarchical clustering using Ward's method and cut at the distance threshold
+            clusters = ward_clusters(embedding_vectors, self.distance_threshold)
+
+            # Replace previous labels and reset every centroid
+            self._replace_labels(session, embedding_ids, embedding_vectors, clusters)
             session.commit()
-            print("Embeddings have been successfully clustered and labeled.")
-            
+            print(f"Embeddings have been successfully clustered and labeled into {len(np.unique(clusters))} speakers.")
+
         except Exception as e:
             session.rollback()
             print(f"An error occurred during clustering and labeling: {e}")
         finally:
-            session.close()
\ No newline at end of file
+            session.close()
+
+    def cluster_hierarchically(self, workers=None):
+        """
+        Clusters every embedding in two stages and labels them in the database.
+
+        Embeddings are first clustered within each audio file, in parallel across files. The
+        per-file speaker centroids are then linked across files by a second clustering, so the
+        cost of the global stage grows with the number of per-file speakers instead of the number
+        of embeddings. Like cluster_and_label_embeddings, this replaces existing labels.
+
+        Parameters:
+        - workers (int, optional): Number of processes for the per-file stage; defaults to the CPU count.
+        """
+        session = SessionLocal()
+        try:
+            embedding_ids, vectors = self._load_vectors(session)
+            if not len(embedding_ids):
+                print("No valid embeddings to cluster.")
+                return
+
+            # Group embeddings by the audio file they come from
+            audio_ids = dict(
+                session.query(Embedding.embedding_id, Segment.audio_id)
+                .join(Segment, Segment.segment_id == Embedding.segment_id)
+                .all()
+            )
+            file_of = np.array([audio_ids[int(embedding_id)] for embedding_id in embedding_ids])
+            order = np.argsort(file_of, kind='stable')
+            _, starts = np.unique(file_of[order], return_index=True)
+            groups = np.split(order, starts[1:])
+
+            # Stage 1: cluster within each audio file
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                local_clusters = list(executor.map(
+                    ward_clusters, (vectors[group] for group in groups), repeat(self.distance_threshold), chunksize=16
+                ))
+
+            local_centroids = []
+            local_speaker = np.empty(len(embedding_ids), dtype=np.int64)  # Per-file speaker of every embedding
+            offset = 0
+            for group, clusters in zip(groups, local_clusters):
+                cluster_nums, centroids, _ = cluster_centroids(vectors[group], clusters)
+                local_speaker[group] = offset + np.searchsorted(cluster_nums, clusters)
+                local_centroids.append(centroids)
+                offset += len(cluster_nums)
+
+            # Stage 2: link per-file speakers across files
+            speakers = ward_clusters(np.vstack(local_centroids), self.link_threshold)
+            clusters = speakers[local_speaker]
+
+            self._replace_labels(session, embedding_ids, vectors, clusters)
+            session.commit()
+            print(f"Clustered {len(embedding_ids)} embeddings from {len(groups)} audio files into {offset} "
+                  f"per-file speakers, linked into {len(np.unique(clusters))} speakers.")
+
+        except Exception as e:
+            session.rollback()
+            print(f"An error occurred during hierarchical clustering: {e}")
+        finally:
+            session.close()
+
+    def assign_new_embeddings(self):
+        """
+        Labels embeddings that have no label yet, without re-clustering the existing ones.
+
+        Each new embedding joins the label with the nearest centroid when it is within
+        assignment_threshold. The rest are clustered among themselves and open new speakers.
+        Label centroids and counts are updated as running means.
+        """
+        session = SessionLocal()
+        try:
+            # Retrieve embeddings without a label in one anti-join query
+            embedding_rows = (
+                session.query(Embedding.embedding_id)
+                .outerjoin(EmbeddingLabel, EmbeddingLabel.embedding_id == Embedding.embedding_id)
+                .filter(EmbeddingLabel.embedding_id.is_(None))
+                .all()
+            )
+            if not embedding_rows:
+                print("No unlabeled embeddings found.")
+                return
+
+            embedding_ids, vectors = self._load_vectors(session, [embedding_id for (embedding_id,) in embedding_rows])
+            if not len(embedding_ids):
+                print("No valid unlabeled embeddings to assign.")
+                return
+
+            labels = session.query(
+                LabelName.label_id, LabelName.label_name, LabelName.centroid, LabelName.embedding_count
+            ).filter(LabelName.centroid.isnot(None)).all()
+            assigned = np.zeros(len(embedding_ids), dtype=bool)
+            embedding_labels = []
+
+            if labels:
+                centroids = decode_vectors([label.centroid for label in labels])
+                counts = np.array([label.embedding_count or 0 for label in labels], dtype=np.int64)
+
+                nearest, distances = nearest_centroids(vectors, centroids)
+                assigned = distances <= self.assignment_threshold
+
+                centroids, counts = merge_centroids(centroids, counts, nearest[assigned], vectors[assigned])
+                upsert_label_names(session, [
+                    {'label_name': labels[idx].label_name, 'centroid': centroids[idx].tobytes(), 'embedding_count': int(counts[idx])}
+                    for idx in np.unique(nearest[assigned])
+                ])
+
+                embedding_labels.extend(
+                    {'embedding_id': int(embedding_id), 'label_id': labels[idx].label_id}
+                    for embedding_id, idx in zip(embedding_ids[assigned], nearest[assigned])
+                )
+
+            # Embeddings far from every centroid open new speakers
+            new_speakers = 0
+            if (~assigned).any():
+                remaining_ids, remaining = embedding_ids[~assigned], vectors[~assigned]
+                clusters = ward_clusters(remaining, self.distance_threshold)
+                cluster_nums, new_centroids, new_counts = cluster_centroids(remaining, clusters)
+                speaker_number = self._next_speaker_number(session)
+
+                label_names = [f"Speaker {speaker_number + i}" for i in range(len(cluster_nums))]
+                label_ids = upsert_label_names(session, [
+                    {'label_name': label_name, 'centroid': centroid.tobytes(), 'embedding_count': int(count)}
+                    for label_name, centroid, count in zip(label_names, new_centroids, new_counts)
+                ])
+                new_speakers = len(cluster_nums)
+
+                members = np.split(np.argsort(clusters, kind='stable'), np.cumsum(new_counts)[:-1])
+                embedding_labels.extend(
+                    {'embedding_id': int(embedding_id), 'label_id': label_ids[label_name]}
+                    for label_name, member_idx in zip(label_names, members)
+                    for embedding_id in remaining_ids[member_idx]
+                )
+
+            insert_embedding_labels(session, embedding_labels)
+            session.commit()
+            print(f"Assigned {int(assigned.sum())} embeddings to existing speakers and "
+                  f"{int((~assigned).sum())} to {new_speakers} new speakers.")
+
+        except Exception as e:
+            session.rollback()
+            print(f"An error occurred during incremental labeling: {e}")
+        finally:
+            session.close()
@@ -0,0 +1,44 @@
+from logging.config import fileConfig
+from alembic import context
+from yttrackmyvoice.database import engine
+from yttrackmyvoice.database.models import Base
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # init_db passes its own connection; the alembic command line connects with the app engine
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        _run_with(connection)
+        return
+    with engine.connect() as connection:
+        _run_with(connection)
+
+
+def _run_with(connection):
+    # Batch mode lets SQLite recreate tables for ALTERs it does not support
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,108 @@
+"""Initial schema, as created by the first releases
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'projects',
+        sa.Column('project_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('project_name', sa.String(255), nullable=False, unique=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('project_path', sa.String(255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_projects_project_id', 'projects', ['project_id'])
+
+    op.create_table(
+        'urls',
+        sa.Column('url_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('project_id', sa.Integer(), sa.ForeignKey('projects.project_id'), nullable=False),
+        sa.Column('url', sa.String(2083), nullable=False),
+        sa.Column('title', sa.String(255), nullable=True),
+        sa.Column('author', sa.String(255), nullable=True),
+        sa.Column('views', sa.Integer(), nullable=True),
+    )
+    op.create_index('ix_urls_url_id', 'urls', ['url_id'])
+
+    op.create_table(
+        'audio_files',
+        sa.Column('audio_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('audio_path', sa.String(500), nullable=False),
+        sa.Column('audio_folder_path', sa.String(500), nullable=False),
+        sa.Column('project_id', sa.Integer(), sa.ForeignKey('projects.project_id'), nullable=False),
+        sa.Column('url_id', sa.Integer(), sa.ForeignKey('urls.url_id'), nullable=False),
+        sa.Column('duration_seconds', sa.DECIMAL(10, 2), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_audio_files_audio_id', 'audio_files', ['audio_id'])
+
+    op.create_table(
+        'segments',
+        sa.Column('segment_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('audio_id', sa.Integer(), sa.ForeignKey('audio_files.audio_id', ondelete='CASCADE'), nullable=False),
+        sa.Column('start_time', sa.DECIMAL(10, 2), nullable=False),
+        sa.Column('end_time', sa.DECIMAL(10, 2), nullable=False),
+        sa.Column('duration', sa.DECIMAL(10, 2), nullable=False),
+        sa.Column('file_path', sa.String(500), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_segments_segment_id', 'segments', ['segment_id'])
+
+    op.create_table(
+        'embeddings',
+        sa.Column('embedding_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('segment_id', sa.Integer(), sa.ForeignKey('segments.segment_id', ondelete='CASCADE'), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_embeddings_embedding_id', 'embeddings', ['embedding_id'])
+
+    op.create_table(
+        'embedding_timestamps',
+        sa.Column('timestamp_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('embedding_id', sa.Integer(), sa.ForeignKey('embeddings.embedding_id', ondelete='CASCADE'), nullable=False),
+        sa.Column('start_time', sa.Float(), nullable=False),
+        sa.Column('end_time', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_embedding_timestamps_timestamp_id', 'embedding_timestamps', ['timestamp_id'])
+
+    op.create_table(
+        'label_names',
+        sa.Column('label_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('label_name', sa.String(255), nullable=False, unique=True),
+    )
+    op.create_index('ix_label_names_label_id', 'label_names', ['label_id'])
+
+    op.create_table(
+        'embedding_labels',
+        sa.Column('embedding_id', sa.Integer(), sa.ForeignKey('embeddings.embedding_id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('label_id', sa.Integer(), sa.ForeignKey('label_names.label_id', ondelete='CASCADE'), primary_key=True),
+    )
+
+    op.create_table(
+        'transcripts',
+        sa.Column('transcript_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('timestamp_id', sa.Integer(), sa.ForeignKey('embedding_timestamps.timestamp_id', ondelete='CASCADE'), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_transcripts_transcript_id', 'transcripts', ['transcript_id'])
+
+
+def downgrade():
+    for table in ('transcripts', 'embedding_labels', 'label_names', 'embedding_timestamps',
+                  'embeddings', 'segments', 'audio_files', 'urls', 'projects'):
+        op.drop_table(table)
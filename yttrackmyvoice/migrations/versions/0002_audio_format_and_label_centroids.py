@@ -0,0 +1,46 @@
+"""Audio format columns and speaker label centroids
+
+Adds audio_files.sample_rate and audio_files.channels, recorded when audio is downloaded, and
+label_names.centroid and label_names.embedding_count, used for incremental labeling.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = {
+    'audio_files': [
+        sa.Column('sample_rate', sa.Integer(), nullable=True),
+        sa.Column('channels', sa.Integer(), nullable=True),
+    ],
+    'label_names': [
+        sa.Column('centroid', sa.LargeBinary(), nullable=True),
+        sa.Column('embedding_count', sa.Integer(), nullable=False, server_default='0'),
+    ],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in NEW_COLUMNS.items():
+        # Databases created with create_all after these columns were added already have them
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                if column.name not in existing:
+                    batch_op.add_column(column)
+
+
+def downgrade():
+    for table, columns in NEW_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.drop_column(column.name)
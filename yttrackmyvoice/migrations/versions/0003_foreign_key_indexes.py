@@ -0,0 +1,63 @@
+"""Foreign-key indexes and uniqueness of URLs and transcripts
+
+Indexes every foreign key used by the pipeline's existence checks and joins, makes a URL
+unique within a project and allows one transcript per speaker turn. Duplicate transcripts
+are removed first, keeping the oldest.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+FOREIGN_KEY_INDEXES = [
+    ('ix_urls_project_id', 'urls', 'project_id'),
+    ('ix_audio_files_project_id', 'audio_files', 'project_id'),
+    ('ix_audio_files_url_id', 'audio_files', 'url_id'),
+    ('ix_segments_audio_id', 'segments', 'audio_id'),
+    ('ix_embeddings_segment_id', 'embeddings', 'segment_id'),
+    ('ix_embedding_timestamps_embedding_id', 'embedding_timestamps', 'embedding_id'),
+    ('ix_embedding_labels_label_id', 'embedding_labels', 'label_id'),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    for index_name, table, column in FOREIGN_KEY_INDEXES:
+        if index_name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(index_name, table, [column])
+
+    duplicate_urls = bind.execute(sa.text(
+        "SELECT project_id, url, COUNT(*) FROM urls GROUP BY project_id, url HAVING COUNT(*) > 1"
+    )).fetchall()
+    if duplicate_urls:
+        raise RuntimeError(
+            "Cannot make URLs unique per project; remove the duplicates first: "
+            + ", ".join(f"project {project_id}: {url} ({count}x)" for project_id, url, count in duplicate_urls)
+        )
+
+    op.execute(
+        "DELETE FROM transcripts WHERE transcript_id NOT IN "
+        "(SELECT MIN(transcript_id) FROM transcripts GROUP BY timestamp_id)"
+    )
+
+    with op.batch_alter_table('urls') as batch_op:
+        batch_op.create_unique_constraint('uq_urls_project_id_url', ['project_id', 'url'])
+    op.create_index('ix_transcripts_timestamp_id', 'transcripts', ['timestamp_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_transcripts_timestamp_id', table_name='transcripts')
+    with op.batch_alter_table('urls') as batch_op:
+        batch_op.drop_constraint('uq_urls_project_id_url', type_='unique')
+    for index_name, table, _ in reversed(FOREIGN_KEY_INDEXES):
+        op.drop_index(index_name, table_name=table)
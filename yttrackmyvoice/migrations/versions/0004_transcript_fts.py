@@ -0,0 +1,26 @@
+"""Full-text index over transcripts
+
+Adds the transcripts_fts FTS5 table on SQLite, an external-content index over transcripts.text
+kept up to date by insert, update and delete triggers, and indexes the existing transcripts.
+Other databases search transcripts with LIKE and are left unchanged.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+from yttrackmyvoice.database.fulltext import create_transcript_fts, drop_transcript_fts
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_transcript_fts(op.get_bind())
+
+
+def downgrade():
+    drop_transcript_fts(op.get_bind())
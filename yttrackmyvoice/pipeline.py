@@ -0,0 +1,264 @@
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+from .database import SessionLocal
+from .database.models import URL, AudioFile, Segment, Embedding
+from .download_audio import Downloader
+from .embed_audio import Embedder
+from .label_embeddings import EmbeddingLabeler
+from .segment_audio import Segmenter
+from .services.url.downloads import HostLimits, fetch_with_retries
+
+# Stages every URL flows through, in order
+STAGES = ("download", "convert", "segment", "embed", "label", "transcribe")
+
+# Default worker threads per stage. Labeling updates project-wide centroids and embedding appends to
+# the project's embedding store, so both always run on one.
+DEFAULT_WORKERS = {
+    'download': 4,
+    'convert': 2,
+    'segment': 2,
+    'embed': 1,
+    'label': 1,
+    'transcribe': 1
+}
+
+# Tells a stage worker that its upstream stage has finished
+_DONE = object()
+
+
+class PipelineRunner:
+    def __init__(self, project_id, workers=None, queue_size=2, max_in_flight=None,
+                 segment_length_ms=30 * 60 * 1000, downloader=None, segmenter=None, embedder=None,
+                 labeler=None, transcriber=None, per_host_limit=2, max_retries=3, backoff_seconds=2.0):
+        """
+        Runs every URL through download, conversion, segmentation, embedding, labeling and
+        transcription independently, so one video can be transcribing while another is still
+        downloading.
+
+        Stages are connected by bounded queues and each stage has its own worker threads. A full
+        queue blocks the stage feeding it, and at most max_in_flight URLs are between download and
+        the end of the pipeline at any time, which bounds the audio waiting on disk for a slower stage.
+
+        Parameters:
+        - project_id (int): The ID of the project.
+        - workers (Dict[str, int], optional): Worker threads per stage, overriding DEFAULT_WORKERS.
+          The embed and label stages always use one.
+        - queue_size (int): Capacity of the queue in front of each stage.
+        - max_in_flight (int, optional): Maximum number of URLs in the pipeline at once. Defaults to
+          the total capacity of the workers and queues.
+        - segment_length_ms (int): Length of each segment in milliseconds.
+        - downloader (Downloader, optional): Used by the download and convert stages.
+        - segmenter (Segmenter, optional): Used by the segment stage.
+        - embedder (Embedder, optional): Used by the embed stage.
+        - labeler (EmbeddingLabeler, optional): Labels new embeddings; pass False to skip labeling.
+        - transcriber (BatchTranscriber, optional): Transcribes new speaker turns; None skips transcription.
+        - per_host_limit (int): Maximum concurrent downloads against the same host.
+        - max_retries (int): Number of retries for a failed download.
+        - backoff_seconds (float): Base delay of the exponential backoff between retries.
+        """
+        self.project_id = project_id
+        self.workers = {**DEFAULT_WORKERS, **(workers or {})}
+        self.workers['embed'] = self.workers['label'] = 1
+        self.queue_size = queue_size
+        self.segment_length_ms = segment_length_ms
+        self.downloader = downloader or Downloader()
+        self.segmenter = segmenter or Segmenter()
+        self.embedder = embedder or Embedder()
+        self.labeler = EmbeddingLabeler() if labeler is None else labeler
+        self.transcriber = transcriber
+        self.host_limits = HostLimits(per_host_limit)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        self.stages = [
+            stage for stage in STAGES
+            if (stage != 'label' or self.labeler) and (stage != 'transcribe' or self.transcriber)
+        ]
+        self.max_in_flight = max_in_flight or sum(self.workers[stage] + queue_size for stage in self.stages)
+
+        self.results = {}  # url_id -> result dict, see _new_result
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+
+    @staticmethod
+    def _new_result(url_id):
+        return {
+            'url_id': url_id,
+            'status': 'queued',
+            'stage': None,
+            'attempts': 0,
+            'audio_id': None,
+            'error': None,
+            'seconds': {}  # Time spent in each stage
+        }
+
+    def _finish(self, result, status, error=None):
+        with self._lock:
+            result['status'] = status
+            result['error'] = error
+        self._slots.release()
+
+    # Stages. Each one takes the URL's result dict and raises to drop the URL from the pipeline.
+
+    def _download(self, result):
+        session = SessionLocal()
+        try:
+            url = session.query(URL.url).filter_by(url_id=result['url_id']).scalar()
+            row = session.query(AudioFile.audio_id).filter_by(url_id=result['url_id']).first()
+        finally:
+            session.close()
+
+        # URLs downloaded by an earlier run go straight to segmentation
+        if row:
+            result['audio_id'] = row.audio_id
+            return
+        if url is None:
+            raise LookupError("URL record not found")
+
+        def on_attempt(attempt):
+            result['attempts'] = attempt
+
+        result['job'] = fetch_with_retries(
+            self.downloader, result['url_id'], self.host_limits(urlparse(url).hostname or ""),
+            self.max_retries, self.backoff_seconds, on_attempt=on_attempt
+        )
+        if result['job'] is None:
+            raise LookupError("URL record not found")
+
+    def _convert(self, result):
+        job = result.pop('job', None)
+        if job is None:
+            return
+
+        # Conversions and cache restores rename complete files into place, so an existing .wav is whole
+        if not os.path.exists(job['wav_path']):
+            converted = self.downloader.convert_audio(job)
+            if not converted:
+                raise RuntimeError("ffmpeg conversion failed")
+        result['audio_id'] = self.downloader.register_audio_file(job)
+
+    def _segment(self, result):
+        session = SessionLocal()
+        try:
+            segmented = session.query(Segment.segment_id).filter_by(audio_id=result['audio_id']).first()
+        finally:
+            session.close()
+
+        if not segmented:
+            self.segmenter.split_audio_file(result['audio_id'], self.segment_length_ms)
+
+    def _embed(self, result):
+        session = SessionLocal()
+        try:
+            pending_segment_ids = [
+                segment_id for (segment_id,) in
+                session.query(Segment.segment_id)
+                .outerjoin(Embedding, Embedding.segment_id == Segment.segment_id)
+                .filter(Segment.audio_id == result['audio_id'], Embedding.embedding_id.is_(None))
+                .order_by(Segment.segment_id)
+                .all()
+            ]
+        finally:
+            session.close()
+
+        if pending_segment_ids:
+            self.embedder.embed_segments(pending_segment_ids)
+
+    def _label(self, result):
+        self.labeler.assign_new_embeddings()
+
+    def _transcribe(self, result):
+        session = SessionLocal()
+        try:
+            self.transcriber.transcribe_project(session, self.project_id, audio_ids=[result['audio_id']])
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    # Scheduling
+
+    def _worker(self, stage, inbox, outbox, remaining):
+        handler = getattr(self, f"_{stage}")
+        while True:
+            result = inbox.get()
+            if result is _DONE:
+                break
+
+            with self._lock:
+                result['status'] = 'running'
+                result['stage'] = stage
+            started = time.perf_counter()
+            try:
+                handler(result)
+            except Exception as e:
+                print(f"URL ID {result['url_id']} failed at the {stage} stage: {e}")
+                self._finish(result, 'failed', str(e))
+                continue
+            finally:
+                result['seconds'][stage] = time.perf_counter() - started
+
+            if outbox is None:
+                self._finish(result, 'done')
+            else:
+                with self._lock:
+                    result['status'] = 'queued'
+                outbox.put(result)  # Blocks while the next stage is saturated
+
+        # The last worker of a stage to exit tells every worker of the next stage to stop
+        with self._lock:
+            remaining[stage] -= 1
+            last = remaining[stage] == 0
+        if last and outbox is not None:
+            next_stage = self.stages[self.stages.index(stage) + 1]
+            for _ in range(self.workers[next_stage]):
+                outbox.put(_DONE)
+
+    def run(self, url_ids):
+        """
+        Runs the given URL records through every stage and waits for all of them.
+
+        Parameters:
+        - url_ids (List[int]): IDs of the URL records to process.
+
+        Returns:
+        - List[Dict]: One result per URL with 'url_id', 'status' ('done' or 'failed'), 'stage'
+          (the last stage reached), 'attempts', 'audio_id', 'error' and 'seconds' (time per stage).
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        remaining = {stage: self.workers[stage] for stage in self.stages}
+        threads = []
+        for i, stage in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            for n in range(self.workers[stage]):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(stage, queues[i], outbox, remaining),
+                    name=f"{stage}-{n}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        started = time.perf_counter()
+        for url_id in dict.fromkeys(url_ids):
+            # Wait for a URL to leave the pipeline before admitting another one
+            self._slots.acquire()
+            result = self._new_result(url_id)
+            with self._lock:
+                self.results[url_id] = result
+            queues[0].put(result)
+        for _ in range(self.workers[self.stages[0]]):
+            queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+
+        results = [dict(result) for result in self.results.values()]
+        done = sum(1 for result in results if result['status'] == 'done')
+        print(f"Pipeline processed {done} of {len(results)} URLs in {time.perf_counter() - started:.1f}s.")
+        return results
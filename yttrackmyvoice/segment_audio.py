@@ -1,14 +1,47 @@
 import os
+import wave
 from math import ceil
 from pydub import AudioSegment
 from .utils import create_directory_if_not_exists
 from .database import SessionLocal
-from .database.models import AudioFile, Segment
+from .database.models import AudioFile
+from .services.cache import resolve_cache
+from .services.persistence import insert_segments
 
 
 class Segmenter:
-    def __init__(self):
-        pass
+    def __init__(self, block_ms=10 * 1000, cache=None):
+        """
+        Initialize the Segmenter.
+
+        Parameters:
+        - block_ms (int): Size of the blocks, in milliseconds, read from the source file while splitting.
+          Bounds the memory used by split_audio_file regardless of the source length.
+        - cache (ArtifactCache, optional): Cache of segment files, keyed by the source audio and the
+          segment length. Defaults to the default cache; False disables it.
+        """
+        self.block_ms = block_ms
+        self.cache = resolve_cache(cache)
+
+    def _restore_segments(self, cache_key, segments_dir):
+        """
+        Copies the cached segment files of a split into segments_dir.
+
+        Returns:
+        - List[Tuple[int, int, str]]: (start_ms, end_ms, file_path) for every segment, or None on a miss.
+        """
+        manifest = self.cache.get_json("segments", cache_key)
+        if manifest is None:
+            return None
+
+        segment_bounds = []
+        for start_ms, end_ms, file_name, blob in manifest:
+            segment_file_path = os.path.join(segments_dir, file_name)
+            if not self.cache.restore_blob(blob, segment_file_path):
+                return None
+            segment_bounds.append((start_ms, end_ms, segment_file_path))
+        print(f"Restored {len(segment_bounds)} segments from the cache into {segments_dir}")
+        return segment_bounds
 
     def export_segment(self, input_file, start_ms, end_ms, output_file, format="wav"):
         """
@@ -36,10 +69,15 @@ class Segmenter:
             # Handle any error that occurs during the export process
             print(f"Error exporting segment: {e}")
 
+
     def split_audio_file(self, audio_id, segment_length_ms, format="wav"):
         """
         Split an audio file into fixed-length segments and store the segment details in the database.
 
+        WAV sources are streamed: the file is read once, block by block, and every segment is
+        written in the same pass, so memory stays bounded by the block size. Other formats fall
+        back to decoding the source once with pydub and slicing it in memory.
+
         Parameters:
         - audio_id (int): The ID of the audio file in the database.
         - segment_length_ms (int): Length of each segment in milliseconds.
@@ -66,50 +104,131 @@ class Segmenter:
             segments_dir = os.path.join(audio_folder_path, "segments")
             create_directory_if_not_exists(segments_dir)
 
-            # Load the audio file using pydub
-            audio = AudioSegment.from_file(audio_file_path)
-            total_length_ms = len(audio)  # Get the total length of the audio file in milliseconds
-
-            # Calculate the number of segments needed
-            num_segments = ceil(total_length_ms / segment_length_ms)
-
-            try:
-                # Loop over the number of segments and export each one
-                for i in range(num_segments):
-                    start_ms = i * segment_length_ms
-                    end_ms = min((i + 1) * segment_length_ms, total_length_ms)
-                    segment_file_name = f"segment_{i + 1}.{format}"
-                    segment_file_path = os.path.join(segments_dir, segment_file_name)
-
-                    # Export the segment
-                    self.export_segment(audio_file_path, start_ms, end_ms, segment_file_path, format=format)
-
-                    # Calculate the duration of the segment in seconds
-                    duration_seconds = (end_ms - start_ms) / 1000
-
-                    # Create a new Segment object and store it in the database
-                    new_segment = Segment(
-                        audio_id=audio_record.audio_id,
-                        start_time=start_ms,
-                        end_time=end_ms,
-                        duration=duration_seconds,
-                        file_path=segment_file_path
-                    )
-                    session.add(new_segment)
-                    session.commit()  # Commit the segment to the database
-
-            except Exception as e:
-                # Rollback the transaction in case of an error
-                session.rollback()
-                print(f"An error occurred while splitting the audio file: {e}")
-            finally:
-                # Close the session once finished
-                session.close()
-
-            print(f"Audio file '{audio_file_path}' has been split into {num_segments} segments.")
+            # The same audio split with the same length, in any project, is restored from the cache
+            cache_key = None
+            segment_bounds = None
+            if self.cache:
+                cache_key = self.cache.key(
+                    self.cache.file_hash(audio_file_path), "segments",
+                    segment_length_ms=segment_length_ms, format=format
+                )
+                segment_bounds = self._restore_segments(cache_key, segments_dir)
+
+            if segment_bounds is None:
+                if format == "wav":
+                    try:
+                        segment_bounds = self._stream_split_wav(audio_file_path, segments_dir, segment_length_ms)
+                    except (wave.Error, EOFError) as e:
+                        # Not a plain PCM WAV (e.g. compressed or extensible format), decode it instead
+                        print(f"Streaming split unavailable for '{audio_file_path}' ({e}). Falling back to pydub.")
+                        segment_bounds = self._decode_split(audio_file_path, segments_dir, segment_length_ms, format)
+                else:
+                    segment_bounds = self._decode_split(audio_file_path, segments_dir, segment_length_ms, format)
+
+                if cache_key:
+                    self.cache.put_json("segments", cache_key, [
+                        [start_ms, end_ms, os.path.basename(segment_file_path), self.cache.put_blob(segment_file_path)]
+                        for start_ms, end_ms, segment_file_path in segment_bounds
+                    ])
+
+            # Store every segment in bulk, in a single transaction
+            new_segments = insert_segments(session, [
+                {
+                    'audio_id': audio_record.audio_id,
+                    'start_time': start_ms,
+                    'end_time': end_ms,
+                    'duration': (end_ms - start_ms) / 1000,
+                    'file_path': segment_file_path
+                }
+                for start_ms, end_ms, segment_file_path in segment_bounds
+            ])
+            session.commit()
+
+            print(f"Audio file '{audio_file_path}' has been split into {len(new_segments)} segments.")
 
         except Exception as e:
-            # Handle any error that occurs during the process
+            # Rollback the transaction in case of an error
+            session.rollback()
             print(f"Error splitting audio file: {e}")
+        finally:
+            # Close the session once finished
             session.close()
-            return
+
+    def _stream_split_wav(self, input_file, segments_dir, segment_length_ms):
+        """
+        Split a PCM WAV file into fixed-length segment files in a single streaming pass.
+
+        Parameters:
+        - input_file (str): Path to the input WAV file.
+        - segments_dir (str): Directory the segment files are written to.
+        - segment_length_ms (int): Length of each segment in milliseconds.
+
+        Returns:
+        - List[Tuple[int, int, str]]: (start_ms, end_ms, file_path) for every segment written.
+        """
+        segment_bounds = []
+
+        with wave.open(input_file, "rb") as source:
+            params = source.getparams()
+            frame_rate = params.framerate
+            frame_size = params.nchannels * params.sampwidth
+            total_frames = params.nframes
+            total_length_ms = round(total_frames * 1000 / frame_rate)
+
+            frames_per_segment = max(1, round(frame_rate * segment_length_ms / 1000))
+            frames_per_block = max(1, round(frame_rate * self.block_ms / 1000))
+            num_segments = ceil(total_frames / frames_per_segment)
+
+            for i in range(num_segments):
+                segment_file_path = os.path.join(segments_dir, f"segment_{i + 1}.wav")
+                remaining = min(frames_per_segment, total_frames - i * frames_per_segment)
+
+                with wave.open(segment_file_path, "wb") as target:
+                    target.setnchannels(params.nchannels)
+                    target.setsampwidth(params.sampwidth)
+                    target.setframerate(frame_rate)
+
+                    # Copy the segment block by block; the header is patched on close
+                    while remaining > 0:
+                        data = source.readframes(min(frames_per_block, remaining))
+                        if not data:
+                            break
+                        target.writeframesraw(data)
+                        remaining -= len(data) // frame_size
+
+                start_ms = i * segment_length_ms
+                end_ms = min((i + 1) * segment_length_ms, total_length_ms)
+                segment_bounds.append((start_ms, end_ms, segment_file_path))
+                print(f"Exported segment to {segment_file_path} from {start_ms / 1000}s to {end_ms / 1000}s")
+
+        return segment_bounds
+
+    @staticmethod
+    def _decode_split(input_file, segments_dir, segment_length_ms, format="wav"):
+        """
+        Split an audio file by decoding it once with pydub and exporting each slice.
+
+        Parameters:
+        - input_file (str): Path to the input audio file.
+        - segments_dir (str): Directory the segment files are written to.
+        - segment_length_ms (int): Length of each segment in milliseconds.
+        - format (str): Audio format for the output segments.
+
+        Returns:
+        - List[Tuple[int, int, str]]: (start_ms, end_ms, file_path) for every segment written.
+        """
+        audio = AudioSegment.from_file(input_file)
+        total_length_ms = len(audio)  # Get the total length of the audio file in milliseconds
+        num_segments = ceil(total_length_ms / segment_length_ms)
+
+        segment_bounds = []
+        for i in range(num_segments):
+            start_ms = i * segment_length_ms
+            end_ms = min((i + 1) * segment_length_ms, total_length_ms)
+            segment_file_path = os.path.join(segments_dir, f"segment_{i + 1}.{format}")
+
+            audio[start_ms:end_ms].export(segment_file_path, format=format)
+            print(f"Exported segment to {segment_file_path} from {start_ms / 1000}s to {end_ms / 1000}s")
+            segment_bounds.append((start_ms, end_ms, segment_file_path))
+
+        return segment_bounds
@@ -0,0 +1,3 @@
+from .pcm import PcmInfo, PcmFormatError, read_pcm_info, open_pcm, write_pcm_wav
+from .slicer import TimestampSlicer, slice_parent_file
+from .clips import ClipReader
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+import numpy as np
+from scipy.signal import resample_poly
+from ...database.models import AudioFile, Segment, Embedding, EmbeddingTimestamp
+from .pcm import open_pcm, frame_range
+
+# NumPy dtype of a PCM sample for each sample width in bytes
+PCM_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+class ClipReader:
+    def __init__(self, max_open_files=8):
+        """
+        Lazily reads "virtual clips": sample ranges of parent segment files addressed by EmbeddingTimestamp,
+        without writing intermediate clip files.
+
+        Parameters:
+        - max_open_files (int): Number of parent files kept memory-mapped at once.
+        """
+        self.max_open_files = max_open_files
+        self._open_files = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def query_clips(session, project_id=None, timestamp_ids=None):
+        """
+        Builds the query resolving EmbeddingTimestamps to their parent segment file.
+
+        Parameters:
+        - session (Session): The active database session.
+        - project_id (int, optional): Restrict clips to one project.
+        - timestamp_ids (List[int], optional): Restrict clips to these timestamp IDs.
+
+        Returns:
+        - Query: Rows of (timestamp_id, start_time, end_time, file_path), ordered by parent file.
+        """
+        query = (
+            session.query(
+                EmbeddingTimestamp.timestamp_id,
+                EmbeddingTimestamp.start_time,
+                EmbeddingTimestamp.end_time,
+                Segment.file_path
+            )
+            .join(Embedding, Embedding.embedding_id == EmbeddingTimestamp.embedding_id)
+            .join(Segment, Segment.segment_id == Embedding.segment_id)
+        )
+        if project_id is not None:
+            query = query.join(AudioFile, AudioFile.audio_id == Segment.audio_id).filter(AudioFile.project_id == project_id)
+        if timestamp_ids is not None:
+            query = query.filter(EmbeddingTimestamp.timestamp_id.in_(timestamp_ids))
+        # Keep clips of the same parent together so each parent is mapped once
+        return query.order_by(Segment.file_path, EmbeddingTimestamp.start_time)
+
+    def _open(self, parent_path):
+        if parent_path in self._open_files:
+            self._open_files.move_to_end(parent_path)
+            return self._open_files[parent_path]
+
+        mapped, info = open_pcm(parent_path)
+        self._open_files[parent_path] = (mapped, info)
+
+        while len(self._open_files) > self.max_open_files:
+            _, (old_mapped, _) = self._open_files.popitem(last=False)
+            self._close_mapping(old_mapped)
+
+        return mapped, info
+
+    @staticmethod
+    def _close_mapping(mapped):
+        try:
+            mapped.close()
+        except BufferError:
+            # Views handed out to callers are still alive; the map is released once they are
+            pass
+
+    def read(self, parent_path, start_time, end_time):
+        """
+        Returns a sample range of a parent file as a read-only NumPy view over the mapped file.
+
+        Parameters:
+        - parent_path (str): Path to the parent PCM WAV file.
+        - start_time (float): Start time in seconds.
+        - end_time (float): End time in seconds.
+
+        Returns:
+        - Tuple[np.ndarray, int]: Array of shape (frames, channels) and the sample rate.
+        """
+        mapped, info = self._open(parent_path)
+        start_frame, end_frame = frame_range(info, start_time, end_time)
+        dtype = PCM_DTYPES[info.sample_width]
+
+        clip = np.frombuffer(
+            mapped,
+            dtype=dtype,
+            count=(end_frame - start_frame) * info.channels,
+            offset=info.data_offset + start_frame * info.channels * info.sample_width
+        )
+        return clip.reshape(-1, info.channels), info.sample_rate
+
+    def iter_clips(self, rows):
+        """
+        Yields clips for timestamp rows as NumPy views.
+
+        Parameters:
+        - rows (Iterable[Tuple[int, float, float, str]]): (timestamp_id, start_time, end_time, parent_path) rows,
+          e.g. from query_clips.
+
+        Yields:
+        - Tuple[int, np.ndarray, int]: timestamp_id, clip samples of shape (frames, channels), sample rate.
+        """
+        for timestamp_id, start_time, end_time, parent_path in rows:
+            try:
+                clip, sample_rate = self.read(parent_path, start_time, end_time)
+            except Exception as e:
+                print(f"Could not read clip for timestamp_id {timestamp_id} from '{parent_path}': {e}")
+                continue
+            yield timestamp_id, clip, sample_rate
+
+    def read_timestamp(self, session, timestamp_id):
+        """
+        Reads the clip of a single EmbeddingTimestamp.
+
+        Parameters:
+        - session (Session): The active database session.
+        - timestamp_id (int): The ID of the EmbeddingTimestamp.
+
+        Returns:
+        - Tuple[np.ndarray, int]: Clip samples of shape (frames, channels) and the sample rate, or (None, None).
+        """
+        row = self.query_clips(session, timestamp_ids=[timestamp_id]).first()
+        if not row:
+            return None, None
+        _, start_time, end_time, parent_path = row
+        return self.read(parent_path, start_time, end_time)
+
+    @staticmethod
+    def to_float32_mono(clip, sample_rate, target_rate=16000):
+        """
+        Converts integer PCM samples to the float32 mono waveform expected by Whisper and pyannote.
+
+        Parameters:
+        - clip (np.ndarray): Samples of shape (frames, channels).
+        - sample_rate (int): Sample rate of the clip.
+        - target_rate (int): Sample rate of the returned waveform.
+
+        Returns:
+        - np.ndarray: 1-D float32 waveform in [-1, 1].
+        """
+        if clip.dtype == np.uint8:
+            waveform = (clip.astype(np.float32) - 128.0) / 128.0
+        else:
+            waveform = clip.astype(np.float32) / float(np.iinfo(clip.dtype).max + 1)
+
+        waveform = waveform.mean(axis=1) if waveform.shape[1] > 1 else waveform[:, 0]
+
+        if sample_rate != target_rate and waveform.size:
+            divisor = np.gcd(sample_rate, target_rate)
+            waveform = resample_poly(waveform, target_rate // divisor, sample_rate // divisor).astype(np.float32)
+
+        return waveform
+
+    def close(self):
+        """
+        Releases every mapped parent file.
+        """
+        while self._open_files:
+            _, (mapped, _) = self._open_files.popitem()
+            self._close_mapping(mapped)
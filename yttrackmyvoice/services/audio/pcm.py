@@ -0,0 +1,153 @@
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+# Layout of the PCM payload of a WAV file
+PcmInfo = namedtuple(
+    "PcmInfo",
+    ["channels", "sample_rate", "sample_width", "data_offset", "data_size"]
+)
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class PcmFormatError(ValueError):
+    """Raised when a file is not an uncompressed PCM WAV file."""
+
+
+def read_pcm_info(file_path):
+    """
+    Parses the RIFF header of a WAV file and locates its PCM data chunk.
+
+    Parameters:
+    - file_path (str): Path to the WAV file.
+
+    Returns:
+    - PcmInfo: Channel count, sample rate, sample width in bytes, and the byte offset and size of the data chunk.
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise PcmFormatError(f"'{file_path}' is not a RIFF/WAVE file")
+
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise PcmFormatError(f"No data chunk found in '{file_path}'")
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+                if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                    # The real format code is the first two bytes of the SubFormat GUID
+                    audio_format = struct.unpack("<H", fmt[24:26])[0]
+                if audio_format != WAVE_FORMAT_PCM:
+                    raise PcmFormatError(f"'{file_path}' is not PCM encoded (format {audio_format:#x})")
+                if chunk_size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise PcmFormatError(f"Data chunk precedes fmt chunk in '{file_path}'")
+                data_offset = f.tell()
+                # Streamed writers leave the size unset; the data then runs to the end of the file
+                if chunk_size in (0, 0xFFFFFFFF) or data_offset + chunk_size > file_size:
+                    chunk_size = file_size - data_offset
+                return PcmInfo(channels, sample_rate, bits // 8, data_offset, chunk_size)
+            else:
+                f.seek(chunk_size + (chunk_size % 2), os.SEEK_CUR)
+
+
+def open_pcm(file_path):
+    """
+    Memory-maps a PCM WAV file read-only.
+
+    Parameters:
+    - file_path (str): Path to the WAV file.
+
+    Returns:
+    - Tuple[mmap.mmap, PcmInfo]: The mapped file and its PCM layout. The caller closes the map.
+    """
+    info = read_pcm_info(file_path)
+    with open(file_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mapped, info
+
+
+def frame_range(info, start_time, end_time):
+    """
+    Converts a time range in seconds into a clamped [start, end) frame range.
+
+    Parameters:
+    - info (PcmInfo): Layout of the PCM data.
+    - start_time (float): Start time in seconds.
+    - end_time (float): End time in seconds.
+
+    Returns:
+    - Tuple[int, int]: Start and end frame indices.
+    """
+    total_frames = info.data_size // (info.channels * info.sample_width)
+    start_frame = min(max(int(round(start_time * info.sample_rate)), 0), total_frames)
+    end_frame = min(max(int(round(end_time * info.sample_rate)), start_frame), total_frames)
+    return start_frame, end_frame
+
+
+def byte_range(info, start_time, end_time):
+    """
+    Converts a time range in seconds into absolute byte offsets within the WAV file.
+
+    Parameters:
+    - info (PcmInfo): Layout of the PCM data.
+    - start_time (float): Start time in seconds.
+    - end_time (float): End time in seconds.
+
+    Returns:
+    - Tuple[int, int]: Start and end byte offsets.
+    """
+    frame_size = info.channels * info.sample_width
+    start_frame, end_frame = frame_range(info, start_time, end_time)
+    return info.data_offset + start_frame * frame_size, info.data_offset + end_frame * frame_size
+
+
+def wav_header(channels, sample_rate, sample_width, data_size):
+    """
+    Builds a canonical 44-byte PCM WAV header.
+
+    Parameters:
+    - channels (int): Number of channels.
+    - sample_rate (int): Frames per second.
+    - sample_width (int): Bytes per sample.
+    - data_size (int): Size of the PCM payload in bytes.
+
+    Returns:
+    - bytes: The header.
+    """
+    block_align = channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, WAVE_FORMAT_PCM, channels, sample_rate,
+        sample_rate * block_align, block_align, sample_width * 8,
+        b"data", data_size
+    )
+
+
+def write_pcm_wav(output_file, info, data):
+    """
+    Writes raw PCM bytes to a new WAV file using the layout of the source.
+
+    Parameters:
+    - output_file (str): Path to the output WAV file.
+    - info (PcmInfo): Layout of the source PCM data.
+    - data (bytes-like): PCM payload, e.g. a memoryview over a mapped source file.
+
+    Returns:
+    - None
+    """
+    with open(output_file, "wb") as f:
+        f.write(wav_header(info.channels, info.sample_rate, info.sample_width, len(data)))
+        f.write(data)
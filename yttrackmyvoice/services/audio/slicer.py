@@ -0,0 +1,114 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pydub import AudioSegment
+from .pcm import PcmFormatError, open_pcm, byte_range, write_pcm_wav
+
+
+def slice_parent_file(parent_path, slices):
+    """
+    Writes every requested slice of one parent audio file.
+
+    The parent is opened once and memory-mapped; each slice is written as a direct byte-range
+    copy of its PCM data behind a fresh WAV header. Files that are not PCM WAV are decoded once
+    with pydub instead.
+
+    Parameters:
+    - parent_path (str): Path to the parent audio file.
+    - slices (List[Tuple[int, float, float, str]]): (timestamp_id, start_time, end_time, output_file)
+      tuples, with times in seconds relative to the parent file.
+
+    Returns:
+    - List[Tuple[int, str]]: (timestamp_id, output_file) for every slice written.
+    """
+    written = []
+    try:
+        mapped, info = open_pcm(parent_path)
+    except PcmFormatError:
+        audio = AudioSegment.from_file(parent_path)
+        for timestamp_id, start_time, end_time, output_file in slices:
+            audio[int(start_time * 1000):int(end_time * 1000)].export(output_file, format="wav")
+            written.append((timestamp_id, output_file))
+        return written
+
+    try:
+        with memoryview(mapped) as buffer:
+            for timestamp_id, start_time, end_time, output_file in slices:
+                start_byte, end_byte = byte_range(info, start_time, end_time)
+                with buffer[start_byte:end_byte] as pcm_bytes:
+                    write_pcm_wav(output_file, info, pcm_bytes)
+                written.append((timestamp_id, output_file))
+    finally:
+        mapped.close()
+
+    return written
+
+
+class TimestampSlicer:
+    def __init__(self, workers=None):
+        """
+        Initialize the slicer.
+
+        Parameters:
+        - workers (int, optional): Number of worker processes used to slice parent files in parallel.
+          None or 1 slices everything in the current process.
+        """
+        self.workers = workers
+
+    @staticmethod
+    def group_by_parent(rows, output_dir):
+        """
+        Groups timestamp rows by the segment file they belong to.
+
+        Parameters:
+        - rows (Iterable[Tuple[int, float, float, str]]): (timestamp_id, start_time, end_time, parent_path) rows.
+        - output_dir (str): Directory the slices are written to.
+
+        Returns:
+        - Dict[str, List[Tuple[int, float, float, str]]]: Slices to write, keyed by parent path.
+        """
+        groups = defaultdict(list)
+        for timestamp_id, start_time, end_time, parent_path in rows:
+            output_file = os.path.join(output_dir, f"segment_{timestamp_id}.wav")
+            groups[parent_path].append((timestamp_id, start_time, end_time, output_file))
+        return groups
+
+    def slice(self, groups):
+        """
+        Writes all slices, opening each parent file exactly once.
+
+        Parameters:
+        - groups (Dict[str, List[Tuple[int, float, float, str]]]): Slices keyed by parent path,
+          as returned by group_by_parent.
+
+        Returns:
+        - List[Tuple[int, str]]: (timestamp_id, output_file) for every slice written.
+        """
+        written = []
+
+        if not self.workers or self.workers <= 1 or len(groups) <= 1:
+            for parent_path, slices in groups.items():
+                written.extend(self._slice_safely(parent_path, slices))
+            return written
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(slice_parent_file, parent_path, slices): parent_path
+                for parent_path, slices in groups.items()
+            }
+            for future in as_completed(futures):
+                parent_path = futures[future]
+                try:
+                    written.extend(future.result())
+                except Exception as e:
+                    print(f"Error slicing '{parent_path}': {e}")
+
+        return written
+
+    @staticmethod
+    def _slice_safely(parent_path, slices):
+        try:
+            return slice_parent_file(parent_path, slices)
+        except Exception as e:
+            print(f"Error slicing '{parent_path}': {e}")
+            return []
@@ -0,0 +1,236 @@
+import os
+import time
+import numpy as np
+import torch
+from scipy.optimize import linear_sum_assignment
+from ..utils import get_key, create_directory_if_not_exists
+from .models import registry, _load_pyannote
+
+# Inference backends selectable from Embedder
+BACKENDS = ("fp32", "int8", "onnx")
+
+# Length of the dummy input used to trace models for ONNX export
+ONNX_TRACE_SECONDS = 10
+
+
+def quantize_dynamic_int8(model):
+    """
+    Applies dynamic int8 quantization to the Linear and LSTM layers of a model.
+
+    Parameters:
+    - model (torch.nn.Module): The fp32 model.
+
+    Returns:
+    - torch.nn.Module: The quantized model, for CPU inference.
+    """
+    return torch.ao.quantization.quantize_dynamic(
+        model.cpu().eval(),
+        {torch.nn.Linear, torch.nn.LSTM},
+        dtype=torch.qint8
+    )
+
+
+class OnnxModel:
+    def __init__(self, model, onnx_path, input_names, defaults=None):
+        """
+        Runs a model through ONNX Runtime while exposing the attributes of the original model
+        (specifications, example output, receptive field) that pyannote inference relies on.
+
+        Parameters:
+        - model (torch.nn.Module): The exported fp32 model.
+        - onnx_path (str): Path to the exported ONNX graph.
+        - input_names (List[str]): Names of the graph inputs, in call order.
+        - defaults (Dict[str, callable], optional): Builds an input the caller may omit, from the
+          inputs given before it. The exported graph requires every input, while the torch model
+          has optional ones (pyannote probes the embedding model without weights).
+        """
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The 'onnx' backend requires the onnxruntime package.") from e
+
+        self._model = model
+        self._input_names = input_names
+        self._defaults = defaults or {}
+        self._session = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+
+    def __call__(self, *args, **kwargs):
+        inputs = list(args)
+        for name in self._input_names[len(args):]:
+            if kwargs.get(name) is not None:
+                inputs.append(kwargs[name])
+            elif name in self._defaults:
+                inputs.append(self._defaults[name](*inputs))
+            else:
+                raise TypeError(f"Missing input '{name}' of the ONNX graph")
+        feeds = {
+            name: value.detach().cpu().numpy().astype(np.float32)
+            for name, value in zip(self._input_names, inputs)
+        }
+        return torch.from_numpy(self._session.run(None, feeds)[0])
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def eval(self):
+        return self
+
+    def __getattr__(self, name):
+        # Only called for attributes not set on the wrapper itself
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._model, name)
+
+
+def export_onnx(model, onnx_path, example_inputs, input_names):
+    """
+    Exports a model to ONNX with a dynamic batch and time axis, unless the file already exists.
+
+    Parameters:
+    - model (torch.nn.Module): The fp32 model.
+    - onnx_path (str): Path of the ONNX file.
+    - example_inputs (Tuple[torch.Tensor]): Inputs used to trace the model.
+    - input_names (List[str]): Names of the graph inputs.
+
+    Returns:
+    - str: Path of the ONNX file.
+    """
+    if not os.path.exists(onnx_path):
+        dynamic_axes = {
+            name: {0: "batch", example_inputs[i].dim() - 1: f"{name}_length"}
+            for i, name in enumerate(input_names)
+        }
+        dynamic_axes["output"] = {0: "batch"}
+        torch.onnx.export(
+            model.cpu().eval(),
+            example_inputs,
+            onnx_path,
+            input_names=input_names,
+            output_names=["output"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17
+        )
+        print(f"Exported ONNX graph to {onnx_path}")
+    return onnx_path
+
+
+def _onnx_directory(name, version):
+    base_dir = get_key('MODEL_CACHE_DIRECTORY') or os.path.join(get_key('DATA_DIRECTORY') or ".", "models")
+    directory = os.path.join(base_dir, name.replace("/", "_") + (f"@{version}" if version else ""))
+    create_directory_if_not_exists(directory)
+    return directory
+
+
+def _load_pyannote_int8(name, device, version):
+    pipeline = _load_pyannote(name, "cpu", version)
+    pipeline._segmentation.model = quantize_dynamic_int8(pipeline._segmentation.model)
+    if hasattr(pipeline._embedding, "model_"):
+        pipeline._embedding.model_ = quantize_dynamic_int8(pipeline._embedding.model_)
+    return pipeline
+
+
+def _load_pyannote_onnx(name, device, version):
+    pipeline = _load_pyannote(name, "cpu", version)
+    directory = _onnx_directory(name, version)
+
+    segmentation = pipeline._segmentation.model
+    num_samples = ONNX_TRACE_SECONDS * segmentation.hparams.sample_rate
+    waveforms = torch.randn(1, 1, num_samples)
+    path = export_onnx(segmentation, os.path.join(directory, "segmentation.onnx"), (waveforms,), ["waveforms"])
+    pipeline._segmentation.model = OnnxModel(segmentation, path, ["waveforms"])
+
+    if hasattr(pipeline._embedding, "model_"):
+        embedding = pipeline._embedding.model_
+        weights = torch.ones(1, segmentation.num_frames(num_samples))  # One weight per segmentation frame
+        path = export_onnx(embedding, os.path.join(directory, "embedding.onnx"), (waveforms, weights), ["waveforms", "weights"])
+        pipeline._embedding.model_ = OnnxModel(embedding, path, ["waveforms", "weights"], defaults={
+            # Uniform weights, which is what the torch model's weights=None pooling computes
+            'weights': lambda waveforms: torch.ones(waveforms.shape[0], segmentation.num_frames(waveforms.shape[-1]))
+        })
+
+    return pipeline
+
+
+registry.register_loader('pyannote-int8', _load_pyannote_int8)
+registry.register_loader('pyannote-onnx', _load_pyannote_onnx)
+
+
+def _to_annotation(result):
+    from pyannote.core import Annotation, Segment
+
+    annotation = Annotation()
+    for i, (speaker, start, end) in enumerate(zip(result['speakers'], result['starts'], result['ends'])):
+        annotation[Segment(start, end), i] = int(speaker)
+    return annotation
+
+
+def _boundary_error(reference, candidate):
+    reference_boundaries = np.concatenate([reference['starts'], reference['ends']])
+    candidate_boundaries = np.concatenate([candidate['starts'], candidate['ends']])
+    if not len(reference_boundaries) or not len(candidate_boundaries):
+        return float('nan')
+    distances = np.abs(candidate_boundaries[:, None] - reference_boundaries[None, :])
+    return float(distances.min(axis=1).mean())
+
+
+def _matched_similarity(reference, candidate):
+    def normalize(matrix):
+        matrix = np.nan_to_num(matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    if not len(reference['embeddings']) or not len(candidate['embeddings']):
+        return float('nan')
+    similarity = normalize(reference['embeddings']) @ normalize(candidate['embeddings']).T
+    rows, cols = linear_sum_assignment(-similarity)
+    return float(similarity[rows, cols].mean())
+
+
+def check_parity(reference, candidate, file_paths):
+    """
+    Compares the output of two Embedders, typically the fp32 pipeline against a faster backend.
+
+    Speakers are matched between both runs by optimal assignment on cosine similarity.
+
+    Parameters:
+    - reference (Embedder): The reference Embedder (usually backend="fp32").
+    - candidate (Embedder): The Embedder under test.
+    - file_paths (List[str]): Audio files to diarize with both.
+
+    Returns:
+    - Dict: Per-file results and means of 'cosine_similarity' (matched speaker embeddings),
+      'diarization_error_rate' (candidate turns against reference turns), 'boundary_error_seconds'
+      (mean distance from a candidate turn boundary to the nearest reference boundary),
+      'speaker_count_delta', and 'speedup' (reference time over candidate time).
+    """
+    from pyannote.metrics.diarization import DiarizationErrorRate
+
+    metric = DiarizationErrorRate()
+    files = []
+    for file_path in file_paths:
+        audio = reference.load_audio(file_path)
+
+        started = time.perf_counter()
+        reference_result = reference.diarize(audio)
+        reference_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        candidate_result = candidate.diarize(audio)
+        candidate_seconds = time.perf_counter() - started
+
+        files.append({
+            'file_path': file_path,
+            'cosine_similarity': _matched_similarity(reference_result, candidate_result),
+            'diarization_error_rate': float(metric(_to_annotation(reference_result), _to_annotation(candidate_result))),
+            'boundary_error_seconds': _boundary_error(reference_result, candidate_result),
+            'speaker_count_delta': len(candidate_result['embeddings']) - len(reference_result['embeddings']),
+            'speedup': reference_seconds / candidate_seconds if candidate_seconds else float('nan')
+        })
+        print(f"{file_path}: cosine={files[-1]['cosine_similarity']:.4f}, "
+              f"DER={files[-1]['diarization_error_rate']:.4f}, "
+              f"boundary error={files[-1]['boundary_error_seconds']:.3f}s, speedup={files[-1]['speedup']:.2f}x")
+
+    keys = ['cosine_similarity', 'diarization_error_rate', 'boundary_error_seconds', 'speaker_count_delta', 'speedup']
+    summary = {key: float(np.nanmean([f[key] for f in files])) if files else float('nan') for key in keys}
+    summary['files'] = files
+    return summary
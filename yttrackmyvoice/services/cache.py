@@ -0,0 +1,311 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from ..utils import create_directory_if_not_exists, get_key
+
+# Bumped when the layout of cached artifacts changes, so old entries are no longer matched
+CACHE_VERSION = 1
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Default size cap of the cache; ARTIFACT_CACHE_MAX_BYTES overrides it and 0 removes the cap
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+
+# Eviction frees space down to this fraction of the cap, so it does not run on every write
+EVICTION_TARGET = 0.9
+
+# Folders never evicted: content hash memos are tiny and only save re-reading files
+EVICTION_EXEMPT = ("hashes",)
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """
+    Returns the process-wide artifact cache, stored in ARTIFACT_CACHE_DIRECTORY or in
+    <DATA_DIRECTORY>/cache and capped at ARTIFACT_CACHE_MAX_BYTES. Returns None when ARTIFACT_CACHE
+    is set to 0, off or false, or when neither directory is configured.
+    """
+    global _default_cache
+    if (get_key('ARTIFACT_CACHE') or "").lower() in ("0", "off", "false"):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            directory = get_key('ARTIFACT_CACHE_DIRECTORY')
+            if not directory and get_key('DATA_DIRECTORY'):
+                directory = os.path.join(get_key('DATA_DIRECTORY'), "cache")
+            if not directory:
+                return None
+            max_bytes = get_key('ARTIFACT_CACHE_MAX_BYTES')
+            _default_cache = ArtifactCache(directory, int(max_bytes) if max_bytes else DEFAULT_MAX_BYTES)
+        return _default_cache
+
+
+def resolve_cache(cache):
+    """
+    Resolves the cache argument of the pipeline stages: None selects the default cache,
+    False disables caching, and an ArtifactCache is used as is.
+    """
+    if cache is None:
+        return default_cache()
+    return cache or None
+
+
+class ArtifactCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Content-addressed cache of pipeline artifacts, shared by every project.
+
+        Files (source audio, converted audio, segment files) are stored once as blobs named by the
+        SHA-256 of their content. Stage results (converted audio and segment manifests, diarization
+        arrays, transcripts) are stored under a key hashed from the content hash of their input, the
+        stage name and every parameter and model identifier that affects the output, so changing
+        any of them is a cache miss rather than a stale hit.
+
+        Blobs are copied in and out rather than hard-linked, because the pipeline rewrites some
+        output files in place. Reads refresh an entry's modification time, and once the cache grows
+        past max_bytes the least recently used blobs and stage results are evicted. Every reader
+        treats an evicted entry as a miss.
+
+        Parameters:
+        - directory (str): Root directory of the cache.
+        - max_bytes (int, optional): Size cap of the cache; None or 0 disables eviction.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes or None
+        self._lock = threading.RLock()  # Reentrant: update_json writes through put_json
+        self._size = None  # Bytes on disk, measured on the first write
+        create_directory_if_not_exists(directory)
+
+    @staticmethod
+    def key(content_hash, stage, **params):
+        """
+        Derives the key of a stage result.
+
+        Parameters:
+        - content_hash (str): Content hash of the stage input, or another stable identifier of it.
+        - stage (str): Name of the stage.
+        - **params: Stage parameters and model identifiers; must be JSON serializable.
+
+        Returns:
+        - str: Hex SHA-256 key.
+        """
+        payload = json.dumps(
+            {'version': CACHE_VERSION, 'input': content_hash, 'stage': stage, 'params': params},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, kind, name, suffix=""):
+        return os.path.join(self.directory, kind, name[:2], name + suffix)
+
+    @staticmethod
+    def _write_atomic(path, write):
+        # Write next to the target and rename, so readers never see a partial entry
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # Eviction
+
+    @staticmethod
+    def _touch(path):
+        # Marks an entry as recently used; atime is not reliable (noatime mounts)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _entries(self):
+        for kind in os.listdir(self.directory):
+            if kind in EVICTION_EXEMPT:
+                continue
+            for root, _, files in os.walk(os.path.join(self.directory, kind)):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue  # Entries being written by another thread or process
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    @staticmethod
+    def _size_of(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _stored(self, path, replaced_size=0):
+        """
+        Accounts for a newly written entry and evicts least recently used entries when the
+        cache has grown past max_bytes.
+
+        Parameters:
+        - path (str): The entry just written.
+        - replaced_size (int): Size of the entry it replaced, e.g. a stage result rewritten by update_json.
+        """
+        if not self.max_bytes:
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += self._size_of(path) - replaced_size
+            if self._size <= self.max_bytes:
+                return
+
+            # Re-measured from disk, since other processes share the directory
+            entries = sorted(self._entries())
+            self._size = sum(size for _, size, _ in entries)
+            target = self.max_bytes * EVICTION_TARGET
+            evicted = 0
+            for _, size, entry_path in entries:
+                if self._size <= target:
+                    break
+                if entry_path == path:
+                    continue
+                try:
+                    os.remove(entry_path)
+                except OSError:
+                    continue
+                self._size -= size
+                evicted += 1
+            if evicted:
+                print(f"Evicted {evicted} entries from the artifact cache ({self._size / 1024 ** 3:.1f} GiB kept).")
+
+    # Content hashes
+
+    def file_hash(self, path):
+        """
+        Returns the SHA-256 of a file's content. Hashes are remembered by path, size and
+        modification time, so an unchanged file is only read once.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        memo_path = self._path("hashes", hashlib.sha256(path.encode()).hexdigest(), ".json")
+        try:
+            with open(memo_path) as f:
+                memo = json.load(f)
+            if memo['size'] == stat.st_size and memo['mtime_ns'] == stat.st_mtime_ns:
+                return memo['hash']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        self._remember_hash(path, content_hash)
+        return content_hash
+
+    def _remember_hash(self, path, content_hash):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        memo = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': content_hash}
+        memo_path = self._path("hashes", hashlib.sha256(path.encode()).hexdigest(), ".json")
+        self._write_atomic(memo_path, lambda f: f.write(json.dumps(memo).encode()))
+
+    # Blobs
+
+    def put_blob(self, path):
+        """
+        Stores a copy of a file in the cache.
+
+        Returns:
+        - str: The content hash naming the blob.
+        """
+        content_hash = self.file_hash(path)
+        blob_path = self._path("blobs", content_hash)
+        if os.path.exists(blob_path):
+            self._touch(blob_path)
+        else:
+            with open(path, "rb") as source:
+                self._write_atomic(blob_path, lambda f: shutil.copyfileobj(source, f, HASH_CHUNK_SIZE))
+            self._stored(blob_path)
+        return content_hash
+
+    def restore_blob(self, content_hash, target_path):
+        """
+        Copies a blob to target_path.
+
+        Returns:
+        - bool: Whether the blob was in the cache.
+        """
+        blob_path = self._path("blobs", content_hash)
+        try:
+            source = open(blob_path, "rb")
+        except FileNotFoundError:
+            return False  # Never stored, or evicted
+        with source:
+            self._write_atomic(target_path, lambda f: shutil.copyfileobj(source, f, HASH_CHUNK_SIZE))
+        self._touch(blob_path)
+        self._remember_hash(target_path, content_hash)
+        return True
+
+    def has_blob(self, content_hash):
+        return os.path.exists(self._path("blobs", content_hash))
+
+    # Stage results
+
+    def get_json(self, stage, key):
+        """
+        Returns a JSON stage result, or None on a miss.
+        """
+        path = self._path(stage, key, ".json")
+        try:
+            with open(path) as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        return value
+
+    def put_json(self, stage, key, value):
+        path = self._path(stage, key, ".json")
+        replaced_size = self._size_of(path)
+        self._write_atomic(path, lambda f: f.write(json.dumps(value).encode()))
+        self._stored(path, replaced_size)
+
+    def update_json(self, stage, key, values):
+        """
+        Merges a dict into a JSON stage result, e.g. transcripts added clip by clip.
+        """
+        with self._lock:
+            merged = self.get_json(stage, key) or {}
+            merged.update(values)
+            self.put_json(stage, key, merged)
+
+    def get_arrays(self, stage, key):
+        """
+        Returns a stage result made of numpy arrays as a dict, or None on a miss.
+        """
+        path = self._path(stage, key, ".npz")
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                value = {name: arrays[name] for name in arrays.files}
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        return value
+
+    def put_arrays(self, stage, key, arrays):
+        path = self._path(stage, key, ".npz")
+        replaced_size = self._size_of(path)
+        self._write_atomic(path, lambda f: np.savez(f, **arrays))
+        self._stored(path, replaced_size)
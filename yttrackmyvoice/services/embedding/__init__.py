@@ -0,0 +1,4 @@
+from .worker_pool import EmbeddingWorkerPool
+from .search import SpeakerSearchIndex
+from .store import EmbeddingStore, load_vectors, append_to_stores
+from .retrieval import EmbeddingSet, fetch_embeddings
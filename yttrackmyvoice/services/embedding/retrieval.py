@@ -0,0 +1,154 @@
+import numpy as np
+from ...database.models import Project, AudioFile, Segment, Embedding, EmbeddingTimestamp
+from .store import read_vectors
+
+
+class EmbeddingSet:
+    def __init__(self, embedding_ids, segment_ids, audio_ids, created_at, vectors,
+                 timestamp_offsets, start_times, end_times, timestamp_created_at):
+        """
+        Columnar set of embeddings and their speaker turns.
+
+        Row i of every per-embedding array describes the same embedding. Its speaker turns are
+        start_times[timestamp_offsets[i]:timestamp_offsets[i + 1]] (and likewise end_times).
+
+        Parameters:
+        - embedding_ids (np.ndarray): int64 embedding IDs, ascending.
+        - segment_ids (np.ndarray): int64 segment ID of every embedding.
+        - audio_ids (np.ndarray): int64 audio file ID of every embedding.
+        - created_at (np.ndarray): Creation time of every embedding (object array).
+        - vectors (np.ndarray): (n, d) float32 embedding matrix.
+        - timestamp_offsets (np.ndarray): int64 array of n + 1 offsets into the turn arrays.
+        - start_times (np.ndarray): float64 start of every speaker turn, in seconds.
+        - end_times (np.ndarray): float64 end of every speaker turn, in seconds.
+        - timestamp_created_at (np.ndarray): Creation time of every speaker turn (object array).
+        """
+        self.embedding_ids = embedding_ids
+        self.segment_ids = segment_ids
+        self.audio_ids = audio_ids
+        self.created_at = created_at
+        self.vectors = vectors
+        self.timestamp_offsets = timestamp_offsets
+        self.start_times = start_times
+        self.end_times = end_times
+        self.timestamp_created_at = timestamp_created_at
+
+    def __len__(self):
+        return len(self.embedding_ids)
+
+    def turns(self, i):
+        """
+        Returns the (start_times, end_times) arrays of the i-th embedding's speaker turns.
+        """
+        start, end = self.timestamp_offsets[i], self.timestamp_offsets[i + 1]
+        return self.start_times[start:end], self.end_times[start:end]
+
+    def to_dataframe(self):
+        """
+        Returns one row per speaker turn, with 'embedding_index' pointing into self.vectors.
+
+        Returns:
+        - pandas.DataFrame: Columns 'embedding_index', 'embedding_id', 'segment_id', 'audio_id',
+          'start_time' and 'end_time'.
+        """
+        import pandas as pd
+
+        embedding_index = np.repeat(np.arange(len(self)), np.diff(self.timestamp_offsets))
+        return pd.DataFrame({
+            'embedding_index': embedding_index,
+            'embedding_id': self.embedding_ids[embedding_index],
+            'segment_id': self.segment_ids[embedding_index],
+            'audio_id': self.audio_ids[embedding_index],
+            'start_time': self.start_times,
+            'end_time': self.end_times
+        })
+
+    def to_records(self):
+        """
+        Converts the set to the list-of-dicts shape of the original retrieval methods.
+
+        Returns:
+        - List[Dict]: 'embedding_id', 'segment_id', 'audio_file_id', 'vector', 'timestamps'
+          (list of dicts with 'start_time', 'end_time' and 'created_at') and 'created_at', per embedding.
+        """
+        records = []
+        for i in range(len(self)):
+            start, end = self.timestamp_offsets[i], self.timestamp_offsets[i + 1]
+            records.append({
+                'embedding_id': int(self.embedding_ids[i]),
+                'segment_id': int(self.segment_ids[i]),
+                'audio_file_id': int(self.audio_ids[i]),
+                'vector': self.vectors[i],
+                'timestamps': [
+                    {'start_time': float(start_time), 'end_time': float(end_time), 'created_at': created_at}
+                    for start_time, end_time, created_at in zip(
+                        self.start_times[start:end], self.end_times[start:end], self.timestamp_created_at[start:end]
+                    )
+                ],
+                'created_at': self.created_at[i]
+            })
+        return records
+
+
+def _apply_filters(query, project_id, audio_ids, segment_ids):
+    if project_id is not None:
+        query = query.filter(AudioFile.project_id == project_id)
+    if audio_ids is not None:
+        query = query.filter(Segment.audio_id.in_(list(audio_ids)))
+    if segment_ids is not None:
+        query = query.filter(Embedding.segment_id.in_(list(segment_ids)))
+    return query
+
+
+def fetch_embeddings(session, project_id=None, audio_ids=None, segment_ids=None):
+    """
+    Fetches embeddings with their segment and audio IDs and speaker turns in two joined
+    queries, reading the vectors from the memory-mapped embedding stores.
+
+    Parameters:
+    - session (Session): The active database session.
+    - project_id (int, optional): Only embeddings of this project.
+    - audio_ids (List[int], optional): Only embeddings of these audio files.
+    - segment_ids (List[int], optional): Only embeddings of these segments.
+
+    Returns:
+    - EmbeddingSet: The embeddings, ordered by embedding ID.
+    """
+    rows = _apply_filters(
+        session.query(
+            Embedding.embedding_id, Embedding.segment_id, Segment.audio_id, Embedding.created_at, Project.project_path
+        )
+        .join(Segment, Segment.segment_id == Embedding.segment_id)
+        .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+        .join(Project, Project.project_id == AudioFile.project_id),
+        project_id, audio_ids, segment_ids
+    ).order_by(Embedding.embedding_id).all()
+
+    turns = _apply_filters(
+        session.query(
+            EmbeddingTimestamp.embedding_id, EmbeddingTimestamp.start_time,
+            EmbeddingTimestamp.end_time, EmbeddingTimestamp.created_at
+        )
+        .join(Embedding, Embedding.embedding_id == EmbeddingTimestamp.embedding_id)
+        .join(Segment, Segment.segment_id == Embedding.segment_id)
+        .join(AudioFile, AudioFile.audio_id == Segment.audio_id),
+        project_id, audio_ids, segment_ids
+    ).order_by(EmbeddingTimestamp.embedding_id, EmbeddingTimestamp.start_time).all()
+
+    embedding_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    turn_embedding_ids = np.array([turn[0] for turn in turns], dtype=np.int64)
+
+    # Both queries are ordered by embedding ID, so each embedding's turns are one contiguous run
+    offsets = np.append(np.searchsorted(turn_embedding_ids, embedding_ids, side='left'), len(turns)).astype(np.int64)
+
+    return EmbeddingSet(
+        embedding_ids=embedding_ids,
+        segment_ids=np.array([row[1] for row in rows], dtype=np.int64),
+        audio_ids=np.array([row[2] for row in rows], dtype=np.int64),
+        created_at=np.array([row[3] for row in rows], dtype=object),
+        vectors=read_vectors(session, embedding_ids, {row[0]: row[4] for row in rows}),
+        timestamp_offsets=offsets,
+        start_times=np.array([turn[1] for turn in turns], dtype=np.float64),
+        end_times=np.array([turn[2] for turn in turns], dtype=np.float64),
+        timestamp_created_at=np.array([turn[3] for turn in turns], dtype=object)
+    )
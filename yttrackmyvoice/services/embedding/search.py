@@ -0,0 +1,172 @@
+import os
+import numpy as np
+from ...database.models import Project
+from ..label import finite_rows
+from .store import EmbeddingStore, load_vectors
+
+# Corpus size from which an approximate nearest-neighbour index is built, when hnswlib is installed
+ANN_MIN_EMBEDDINGS = 50000
+
+# HNSW index persisted next to a project's embedding store
+ANN_INDEX_FILE = "hnsw.bin"
+
+
+def normalize_rows(vectors):
+    """
+    Scales every row to unit length so dot products are cosine similarities.
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class SpeakerSearchIndex:
+    def __init__(self, embedding_ids, vectors, ann_min_embeddings=ANN_MIN_EMBEDDINGS, ann_path=None):
+        """
+        Cosine-similarity index over stored speaker embeddings.
+
+        Small corpora are scored exactly with one matrix-vector product. Once the corpus reaches
+        ann_min_embeddings and hnswlib is available, an HNSW approximate nearest-neighbour index
+        is used instead. With ann_path the HNSW index is loaded from that file, only embeddings it
+        does not hold yet are added, and it is saved back, so it is built once rather than per query.
+
+        Parameters:
+        - embedding_ids (np.ndarray): ID of every embedding.
+        - vectors (np.ndarray): (n, d) float32 embedding matrix.
+        - ann_min_embeddings (int): Corpus size from which the approximate index is built.
+        - ann_path (str, optional): File the HNSW index is persisted to.
+        """
+        valid = finite_rows(vectors)
+        self.embedding_ids = np.asarray(embedding_ids, dtype=np.int64)[valid]
+        self.vectors = normalize_rows(np.asarray(vectors)[valid].astype(np.float32))
+        self.ann_index = None
+
+        if len(self.embedding_ids) >= ann_min_embeddings:
+            self.ann_index = self._build_ann_index(ann_path)
+
+    def _load_ann_index(self, hnswlib, ann_path):
+        # A missing, unreadable or stale file (embeddings removed, e.g. by a store rebuild) starts over
+        if not ann_path or not os.path.exists(ann_path):
+            return None, np.empty(0, dtype=np.int64)
+        index = hnswlib.Index(space='cosine', dim=self.vectors.shape[1])
+        try:
+            index.load_index(ann_path, max_elements=len(self.vectors))
+        except RuntimeError as e:
+            print(f"Could not load the search index '{ann_path}' ({e}); rebuilding it.")
+            return None, np.empty(0, dtype=np.int64)
+        indexed = np.asarray(index.get_ids_list(), dtype=np.int64)
+        if index.dim != self.vectors.shape[1] or not np.isin(indexed, self.embedding_ids).all():
+            return None, np.empty(0, dtype=np.int64)
+        return index, indexed
+
+    def _build_ann_index(self, ann_path=None):
+        try:
+            import hnswlib
+        except ImportError:
+            print("hnswlib is not installed; using exact search.")
+            return None
+
+        index, indexed = self._load_ann_index(hnswlib, ann_path)
+        if index is None:
+            index = hnswlib.Index(space='cosine', dim=self.vectors.shape[1])
+            index.init_index(max_elements=len(self.vectors), ef_construction=200, M=16)
+
+        # Embedding IDs are the HNSW labels, so only the embeddings added since the last save are inserted
+        missing = ~np.isin(self.embedding_ids, indexed)
+        if missing.any():
+            index.resize_index(max(index.get_max_elements(), len(indexed) + int(missing.sum())))
+            index.add_items(self.vectors[missing], self.embedding_ids[missing])
+            if ann_path:
+                temp_path = ann_path + ".tmp"
+                index.save_index(temp_path)
+                os.replace(temp_path, ann_path)
+        index.set_ef(100)
+        return index
+
+    @classmethod
+    def from_database(cls, session, project_id=None, **kwargs):
+        """
+        Builds the index from the embeddings of the database, read from the memory-mapped
+        per-project embedding stores. A project's HNSW index is persisted next to its store.
+        Without project_id, each project is indexed separately and queries merge their results.
+
+        Parameters:
+        - session (Session): The active database session.
+        - project_id (int, optional): Only index embeddings of this project.
+
+        Returns:
+        - SpeakerSearchIndex | ShardedSearchIndex: The index.
+        """
+        if project_id is None:
+            return ShardedSearchIndex([
+                cls.from_database(session, project_id=project_id, **kwargs)
+                for (project_id,) in session.query(Project.project_id).order_by(Project.project_id)
+            ])
+
+        project_path = session.query(Project.project_path).filter_by(project_id=project_id).scalar()
+        ann_path = None
+        if project_path:
+            store = EmbeddingStore.for_project(project_path)
+            if os.path.isdir(store.directory):
+                ann_path = os.path.join(store.directory, ANN_INDEX_FILE)
+
+        embedding_ids, vectors = load_vectors(session, project_id=project_id)
+        return cls(embedding_ids, vectors, ann_path=ann_path, **kwargs)
+
+    def __len__(self):
+        return len(self.embedding_ids)
+
+    def query(self, vector, top_k=10):
+        """
+        Finds the embeddings most similar to a query vector.
+
+        Parameters:
+        - vector (np.ndarray): The query embedding.
+        - top_k (int): Number of results.
+
+        Returns:
+        - Tuple[np.ndarray, np.ndarray]: Embedding IDs and cosine similarities, best match first.
+        """
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = normalize_rows(np.asarray(vector, dtype=np.float32).reshape(1, -1))
+        top_k = min(top_k, len(self))
+
+        if self.ann_index is not None:
+            labels, distances = self.ann_index.knn_query(query, k=top_k)
+            return labels[0].astype(np.int64), 1.0 - distances[0]
+
+        scores = self.vectors @ query[0]
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return self.embedding_ids[top], scores[top]
+
+
+class ShardedSearchIndex:
+    def __init__(self, indexes):
+        """
+        Searches several SpeakerSearchIndex shards (one per project) as one index.
+
+        Parameters:
+        - indexes (List[SpeakerSearchIndex]): The shards.
+        """
+        self.indexes = [index for index in indexes if len(index)]
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes)
+
+    def query(self, vector, top_k=10):
+        """
+        Finds the embeddings most similar to a query vector across every shard.
+
+        Returns:
+        - Tuple[np.ndarray, np.ndarray]: Embedding IDs and cosine similarities, best match first.
+        """
+        results = [index.query(vector, top_k=top_k) for index in self.indexes]
+        if not results:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        embedding_ids = np.concatenate([ids for ids, _ in results])
+        scores = np.concatenate([scores for _, scores in results])
+        top = np.argsort(-scores, kind="stable")[:top_k]
+        return embedding_ids[top], scores[top]
@@ -0,0 +1,383 @@
+import os
+import struct
+import threading
+from collections import defaultdict
+import numpy as np
+from ...database.models import Project, AudioFile, Segment, Embedding
+from ...utils import create_directory_if_not_exists, iter_chunks
+from ..label import decode_vectors
+
+# Fixed .npy header size, so the shape can be rewritten in place when rows are appended
+NPY_HEADER_SIZE = 128
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+# Appends read the header, write rows and rewrite the header, so concurrent appends must not interleave
+_append_lock = threading.Lock()
+
+
+def _write_npy_header(f, dtype, shape):
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': tuple(shape)})
+    header_len = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2
+    f.seek(0)
+    f.write(NPY_MAGIC + struct.pack("<H", header_len) + header.encode("latin1").ljust(header_len - 1) + b"\n")
+
+
+def _append_npy(path, rows, dtype):
+    rows = np.ascontiguousarray(rows, dtype=dtype)
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            _write_npy_header(f, dtype, rows.shape)
+            f.write(rows.tobytes())
+        return
+
+    with open(path, "r+b") as f:
+        np.lib.format.read_magic(f)
+        shape, _, _ = np.lib.format.read_array_header_1_0(f)
+        if shape[1:] != rows.shape[1:]:
+            raise ValueError(f"Cannot append rows of shape {rows.shape[1:]} to '{path}' with rows of shape {shape[1:]}")
+        f.seek(NPY_HEADER_SIZE + int(np.prod(shape)) * rows.itemsize)
+        f.write(rows.tobytes())
+        _write_npy_header(f, dtype, (shape[0] + len(rows),) + tuple(shape[1:]))
+
+
+def _npy_shape(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        np.lib.format.read_magic(f)
+        shape, _, _ = np.lib.format.read_array_header_1_0(f)
+    return shape
+
+
+def _truncate_npy(path, length, dtype):
+    # Drops every row past length, including bytes written after the header was last updated
+    with open(path, "r+b") as f:
+        np.lib.format.read_magic(f)
+        shape, _, _ = np.lib.format.read_array_header_1_0(f)
+        row_size = int(np.prod(shape[1:])) * np.dtype(dtype).itemsize
+        f.truncate(NPY_HEADER_SIZE + length * row_size)
+        _write_npy_header(f, dtype, (length,) + tuple(shape[1:]))
+
+
+class EmbeddingStore:
+    VECTORS_FILE = "embeddings.npy"
+    IDS_FILE = "embedding_ids.npy"
+
+    def __init__(self, directory):
+        """
+        Per-project store keeping every embedding vector in one contiguous memory-mapped .npy
+        matrix, next to an array of the matching embedding IDs.
+
+        Parameters:
+        - directory (str): Directory holding the store files.
+        """
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, self.VECTORS_FILE)
+        self.ids_path = os.path.join(directory, self.IDS_FILE)
+        self._sorted = None
+
+    @classmethod
+    def for_project(cls, project_path):
+        """
+        Returns the store of a project, kept in the 'embeddings' folder of the project path.
+        """
+        return cls(os.path.join(project_path, "embeddings"))
+
+    def exists(self):
+        return os.path.exists(self.vectors_path) and os.path.exists(self.ids_path)
+
+    def load(self):
+        """
+        Memory-maps the store.
+
+        Returns:
+        - Tuple[np.ndarray, np.ndarray]: Embedding IDs and the (n, d) float32 matrix, both read-only
+          memory maps. Empty arrays if the store does not exist yet.
+        """
+        if not self.exists():
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+        embedding_ids = np.load(self.ids_path, mmap_mode="r")
+        vectors = np.load(self.vectors_path, mmap_mode="r")
+        # A crash between the two appends leaves one file longer; only complete rows count
+        n = min(len(embedding_ids), len(vectors))
+        return embedding_ids[:n], vectors[:n]
+
+    def __len__(self):
+        return len(self.load()[0])
+
+    def append(self, embedding_ids, vectors):
+        """
+        Appends vectors after their rows have been committed to the database.
+
+        Parameters:
+        - embedding_ids (np.ndarray): IDs of the new embeddings.
+        - vectors (np.ndarray): (n, d) float32 matrix of the new embeddings.
+        """
+        if not len(embedding_ids):
+            return
+        create_directory_if_not_exists(self.directory)
+        with _append_lock:
+            self._align()
+            # IDs first: a crash in between leaves an ID without a vector, which load() drops
+            _append_npy(self.ids_path, np.asarray(embedding_ids), np.int64)
+            _append_npy(self.vectors_path, np.asarray(vectors).reshape(len(embedding_ids), -1), np.float32)
+        self._sorted = None
+
+    def _align(self):
+        """
+        Cuts both files to the shorter length after a crash between the two appends. Each file
+        appends at the end its own header records, so without this every later ID would be
+        paired with the wrong vector.
+        """
+        ids_shape = _npy_shape(self.ids_path)
+        vectors_shape = _npy_shape(self.vectors_path)
+        ids_length = ids_shape[0] if ids_shape else 0
+        vectors_length = vectors_shape[0] if vectors_shape else 0
+        if ids_length == vectors_length:
+            return
+
+        length = min(ids_length, vectors_length)
+        print(f"Embedding store '{self.directory}' has {ids_length} IDs and {vectors_length} vectors; "
+              f"truncating both to {length}.")
+        if ids_shape:
+            _truncate_npy(self.ids_path, length, np.int64)
+        if vectors_shape:
+            _truncate_npy(self.vectors_path, length, np.float32)
+
+    def get(self, embedding_ids):
+        """
+        Looks up vectors by embedding ID.
+
+        Parameters:
+        - embedding_ids (np.ndarray): IDs to look up.
+
+        Returns:
+        - Tuple[np.ndarray, np.ndarray]: Boolean mask of the IDs found, and their vectors in request order.
+        """
+        stored_ids, vectors = self.load()
+        embedding_ids = np.asarray(embedding_ids, dtype=np.int64)
+        if not len(stored_ids):
+            return np.zeros(len(embedding_ids), dtype=bool), np.empty((0, 0), dtype=np.float32)
+
+        if self._sorted is None:
+            order = np.argsort(stored_ids, kind="stable")
+            self._sorted = (np.asarray(stored_ids)[order], order)
+        sorted_ids, order = self._sorted
+
+        positions = np.clip(np.searchsorted(sorted_ids, embedding_ids), 0, len(sorted_ids) - 1)
+        found = sorted_ids[positions] == embedding_ids
+        return found, np.asarray(vectors[order[positions[found]]])
+
+    def rebuild(self, session, project_id, chunk_size=1000):
+        """
+        Regenerates the store from the database, streaming embeddings in chunks.
+
+        Parameters:
+        - session (Session): The active database session.
+        - project_id (int): The ID of the project.
+        - chunk_size (int): Number of rows fetched per round-trip.
+
+        Returns:
+        - int: Number of embeddings written.
+        """
+        create_directory_if_not_exists(self.directory)
+        temp_store = EmbeddingStore(self.directory + ".rebuild")
+        for path in (temp_store.vectors_path, temp_store.ids_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+        query = (
+            session.query(Embedding.embedding_id, Embedding.vector)
+            .join(Segment, Segment.segment_id == Embedding.segment_id)
+            .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+            .filter(AudioFile.project_id == project_id)
+            .order_by(Embedding.embedding_id)
+            .yield_per(chunk_size)
+        )
+
+        written = 0
+        for rows in iter_chunks(query, chunk_size):
+            temp_store.append(
+                np.array([embedding_id for embedding_id, _ in rows], dtype=np.int64),
+                decode_vectors([vector for _, vector in rows])
+            )
+            written += len(rows)
+
+        if written:
+            os.replace(temp_store.vectors_path, self.vectors_path)
+            os.replace(temp_store.ids_path, self.ids_path)
+        else:
+            for path in (self.vectors_path, self.ids_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        if os.path.isdir(temp_store.directory):
+            os.rmdir(temp_store.directory)
+
+        self._sorted = None
+        return written
+
+
+def project_paths_for_segments(session, segment_ids):
+    """
+    Maps segment IDs to the path of the project they belong to, in one query.
+    """
+    return dict(
+        session.query(Segment.segment_id, Project.project_path)
+        .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+        .join(Project, Project.project_id == AudioFile.project_id)
+        .filter(Segment.segment_id.in_(list(segment_ids)))
+        .all()
+    )
+
+
+def load_vectors(session, embedding_ids=None, project_id=None, chunk_size=500):
+    """
+    Loads embedding vectors, reading each project's memory-mapped store and falling back to
+    the database only for embeddings a store does not hold (e.g. before its first rebuild).
+
+    Parameters:
+    - session (Session): The active database session.
+    - embedding_ids (np.ndarray, optional): IDs of the embeddings to load; all embeddings if omitted.
+    - project_id (int, optional): Only load embeddings of this project.
+    - chunk_size (int): Number of IDs per IN clause when embedding_ids is given.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: Embedding IDs and their (n, d) float32 matrix, in the order
+      of embedding_ids (or by embedding ID when loading all; in store order for a whole project).
+    """
+    if embedding_ids is None and project_id is not None:
+        return load_project_vectors(session, project_id, chunk_size)
+
+    query = (
+        session.query(Embedding.embedding_id, Project.project_path)
+        .join(Segment, Segment.segment_id == Embedding.segment_id)
+        .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+        .join(Project, Project.project_id == AudioFile.project_id)
+    )
+    if project_id is not None:
+        query = query.filter(AudioFile.project_id == project_id)
+
+    if embedding_ids is None:
+        rows = query.order_by(Embedding.embedding_id).all()
+        embedding_ids = np.array([embedding_id for embedding_id, _ in rows], dtype=np.int64)
+        project_paths = dict(rows)
+    else:
+        embedding_ids = np.asarray(embedding_ids, dtype=np.int64)
+        project_paths = {}
+        for chunk in iter_chunks(embedding_ids.tolist(), chunk_size):
+            project_paths.update(query.filter(Embedding.embedding_id.in_(chunk)).all())
+        # Drop IDs that do not exist (or belong to another project)
+        embedding_ids = embedding_ids[[int(embedding_id) in project_paths for embedding_id in embedding_ids]]
+
+    return embedding_ids, read_vectors(session, embedding_ids, project_paths, chunk_size)
+
+
+def load_project_vectors(session, project_id, chunk_size=500):
+    """
+    Loads every embedding of a project. The project store's memory maps are returned as they are
+    when the store matches the database; the database only supplies vectors the store lacks.
+
+    Parameters:
+    - session (Session): The active database session.
+    - project_id (int): The ID of the project.
+    - chunk_size (int): Number of IDs per IN clause of the database fallback.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: Embedding IDs and their (n, d) float32 matrix, in store order
+      followed by the embeddings read from the database.
+    """
+    project_path = session.query(Project.project_path).filter_by(project_id=project_id).scalar()
+    if project_path is None:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    stored_ids, stored_vectors = EmbeddingStore.for_project(project_path).load()
+
+    # One ID-only query tells which stored rows still exist and which rows the store lacks
+    project_ids = np.fromiter(
+        (embedding_id for (embedding_id,) in
+         session.query(Embedding.embedding_id)
+         .join(Segment, Segment.segment_id == Embedding.segment_id)
+         .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+         .filter(AudioFile.project_id == project_id)
+         .order_by(Embedding.embedding_id)),
+        dtype=np.int64
+    )
+    current = np.isin(stored_ids, project_ids)
+    missing_ids = project_ids[~np.isin(project_ids, stored_ids)]
+
+    if not current.all():
+        stored_ids, stored_vectors = stored_ids[current], stored_vectors[current]
+    if not len(missing_ids):
+        return stored_ids, stored_vectors
+
+    print(f"{len(missing_ids)} embeddings are not in the embedding store yet; reading them from the database. "
+          f"Rebuild the store to avoid this.")
+    blobs = {}
+    for chunk in iter_chunks(missing_ids.tolist(), chunk_size):
+        blobs.update(session.query(Embedding.embedding_id, Embedding.vector).filter(Embedding.embedding_id.in_(chunk)).all())
+    missing_vectors = decode_vectors([blobs[int(embedding_id)] for embedding_id in missing_ids])
+    if not len(stored_ids):
+        return missing_ids, missing_vectors
+    return np.concatenate([stored_ids, missing_ids]), np.concatenate([stored_vectors, missing_vectors])
+
+
+def read_vectors(session, embedding_ids, project_paths, chunk_size=500):
+    """
+    Reads the vectors of embeddings whose project is already known, from the project stores,
+    falling back to the database for embeddings a store does not hold.
+
+    Parameters:
+    - session (Session): The active database session.
+    - embedding_ids (np.ndarray): IDs of the embeddings to read.
+    - project_paths (Dict[int, str]): Project path of every embedding ID.
+    - chunk_size (int): Number of IDs per IN clause of the database fallback.
+
+    Returns:
+    - np.ndarray: (n, d) float32 matrix in the order of embedding_ids.
+    """
+    if not len(embedding_ids):
+        return np.empty((0, 0), dtype=np.float32)
+
+    positions_by_project = defaultdict(list)
+    for position, embedding_id in enumerate(embedding_ids):
+        positions_by_project[project_paths[int(embedding_id)]].append(position)
+
+    vectors = None
+    missing = []
+    for project_path, positions in positions_by_project.items():
+        positions = np.array(positions)
+        found, found_vectors = EmbeddingStore.for_project(project_path).get(embedding_ids[positions])
+        if found.any():
+            if vectors is None:
+                vectors = np.empty((len(embedding_ids), found_vectors.shape[1]), dtype=np.float32)
+            vectors[positions[found]] = found_vectors
+        missing.extend(positions[~found].tolist())
+
+    if missing:
+        print(f"{len(missing)} embeddings are not in the embedding store yet; reading them from the database. "
+              f"Rebuild the store to avoid this.")
+        missing = np.array(sorted(missing))
+        blobs = {}
+        for chunk in iter_chunks(embedding_ids[missing].tolist(), chunk_size):
+            blobs.update(session.query(Embedding.embedding_id, Embedding.vector).filter(Embedding.embedding_id.in_(chunk)).all())
+        missing_vectors = decode_vectors([blobs[int(embedding_id)] for embedding_id in embedding_ids[missing]])
+        if vectors is None:
+            vectors = np.empty((len(embedding_ids), missing_vectors.shape[1]), dtype=np.float32)
+        vectors[missing] = missing_vectors
+
+    return vectors
+
+
+def append_to_stores(embedding_ids, vectors, project_paths):
+    """
+    Appends committed embeddings to the stores of the projects they belong to.
+
+    Parameters:
+    - embedding_ids (np.ndarray): IDs of the new embeddings.
+    - vectors (np.ndarray): (n, d) float32 matrix of the new embeddings.
+    - project_paths (List[str]): Project path of every embedding.
+    """
+    project_paths = np.array(project_paths)
+    for project_path in dict.fromkeys(project_paths.tolist()):
+        in_project = project_paths == project_path
+        EmbeddingStore.for_project(project_path).append(embedding_ids[in_project], vectors[in_project])
@@ -0,0 +1,146 @@
+import os
+import time
+import multiprocessing
+import torch
+from ...database import SessionLocal
+from ...database.models import Segment
+# Module import: embed_audio itself imports from this package
+from ... import embed_audio
+from .store import append_to_stores, project_paths_for_segments
+
+# Diarization pipeline of the current worker process, loaded once by _init_worker
+_worker_embedder = None
+
+# Error raised while loading it. A raising Pool initializer makes the pool respawn workers
+# forever, so the error is kept and reported by every task instead.
+_worker_init_error = None
+
+
+def _init_worker(num_threads, segmentation_batch_size, embedding_batch_size, backend):
+    global _worker_embedder, _worker_init_error
+    try:
+        torch.set_num_threads(num_threads)
+        torch.set_num_interop_threads(1)
+        _worker_embedder = embed_audio.Embedder(backend=backend)
+        _worker_embedder.configure(segmentation_batch_size, embedding_batch_size)
+    except Exception as e:
+        _worker_init_error = f"{type(e).__name__}: {e}"
+
+
+def _embed_in_worker(task):
+    segment_id, file_path = task
+    if _worker_init_error is not None:
+        # A None segment ID tells the parent that the worker could not start
+        return None, None, 0.0, _worker_init_error
+    try:
+        result, seconds = _worker_embedder.diarize_file(file_path)
+        return segment_id, result, seconds, None
+    except Exception as e:
+        return segment_id, None, 0.0, str(e)
+
+
+class EmbeddingWorkerPool:
+    def __init__(self, workers=None, threads_per_worker=None, commit_every=16, min_duration=1.0,
+                 segmentation_batch_size=32, embedding_batch_size=32, backend="fp32"):
+        """
+        Diarizes segments on a pool of worker processes, each loading the pipeline once.
+        Workers pull segment IDs from a shared queue and return embeddings and turn boundaries
+        as plain arrays; the parent process is the only database writer and commits in batches.
+
+        Parameters:
+        - workers (int, optional): Number of worker processes; defaults to the CPU count.
+        - threads_per_worker (int, optional): Torch intra-op threads per worker; defaults to
+          an even split of the CPU count so workers do not oversubscribe the cores.
+        - commit_every (int): Number of segments written per commit.
+        - min_duration (float): Minimum duration in seconds for a valid timestamp.
+        - segmentation_batch_size (int): Batch size of the segmentation model.
+        - embedding_batch_size (int): Batch size of the speaker embedding model.
+        - backend (str): Inference backend of each worker's Embedder ("fp32", "int8" or "onnx").
+        """
+        cpu_count = os.cpu_count() or 1
+        self.workers = workers or cpu_count
+        self.threads_per_worker = threads_per_worker or max(1, cpu_count // self.workers)
+        self.commit_every = commit_every
+        self.min_duration = min_duration
+        self.segmentation_batch_size = segmentation_batch_size
+        self.embedding_batch_size = embedding_batch_size
+        self.backend = backend
+
+    def _commit(self, session, uncommitted, project_paths):
+        # Insert the whole batch in bulk, commit, then append the committed vectors to each project's store
+        embedding_ids, vectors, segment_ids = embed_audio.Embedder.store_diarizations(session, uncommitted, self.min_duration)
+        session.commit()
+        append_to_stores(embedding_ids, vectors, [project_paths[segment_id] for segment_id in segment_ids.tolist()])
+
+    def run(self, segment_ids):
+        """
+        Diarizes the given segments and stores their embeddings and timestamps.
+
+        Parameters:
+        - segment_ids (List[int]): IDs of the segments to process.
+
+        Returns:
+        - Dict: 'segments', 'audio_seconds', 'wall_seconds' and 'throughput' (audio seconds per second).
+        """
+        session = SessionLocal()
+        try:
+            tasks = session.query(Segment.segment_id, Segment.file_path).filter(
+                Segment.segment_id.in_(segment_ids)
+            ).all()
+            project_paths = project_paths_for_segments(session, segment_ids)
+        finally:
+            session.close()
+
+        print(f"Embedding {len(tasks)} segments on {self.workers} workers "
+              f"with {self.threads_per_worker} torch threads each.")
+
+        started = time.perf_counter()
+        audio_seconds = 0.0
+        processed = 0
+        uncommitted = []
+
+        # Spawned workers do not inherit torch's thread pools or open database connections
+        context = multiprocessing.get_context("spawn")
+        session = SessionLocal()
+        try:
+            with context.Pool(
+                processes=self.workers,
+                initializer=_init_worker,
+                initargs=(self.threads_per_worker, self.segmentation_batch_size, self.embedding_batch_size, self.backend)
+            ) as pool:
+                for segment_id, result, seconds, error in pool.imap_unordered(_embed_in_worker, tasks):
+                    if segment_id is None:
+                        print(f"An embedding worker failed to load the diarization pipeline: {error}")
+                        break
+                    if error:
+                        print(f"An error occurred while embedding Segment ID {segment_id}: {error}")
+                        continue
+
+                    uncommitted.append((segment_id, result))
+                    processed += 1
+                    audio_seconds += seconds
+
+                    if len(uncommitted) >= self.commit_every:
+                        self._commit(session, uncommitted, project_paths)
+                        uncommitted = []
+                        elapsed = time.perf_counter() - started
+                        print(f"Embedded {processed}/{len(tasks)} segments, "
+                              f"{audio_seconds / elapsed:.1f} audio seconds per second.")
+
+            self._commit(session, uncommitted, project_paths)
+        except Exception as e:
+            session.rollback()
+            print(f"An error occurred in the embedding worker pool: {e}")
+        finally:
+            session.close()
+
+        wall_seconds = time.perf_counter() - started
+        stats = {
+            'segments': processed,
+            'audio_seconds': audio_seconds,
+            'wall_seconds': wall_seconds,
+            'throughput': audio_seconds / wall_seconds if wall_seconds else 0.0
+        }
+        print(f"Embedded {processed} segments ({audio_seconds:.0f}s of audio) in {wall_seconds:.1f}s: "
+              f"{stats['throughput']:.1f} audio seconds per second.")
+        return stats
@@ -0,0 +1,292 @@
+import os
+import csv
+import gzip
+import json
+import zipfile
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select, func, cast, Float, or_
+from ..database.models import (
+    Project, URL, AudioFile, Segment, Embedding, EmbeddingTimestamp, EmbeddingLabel, LabelName, Transcript
+)
+from ..utils import create_directory_if_not_exists
+from .embedding.store import read_vectors
+
+EXPORT_FORMATS = ("parquet", "npz")
+
+# Columns of the speaker turn table, in file order
+TURN_COLUMNS = [
+    'timestamp_id', 'embedding_id', 'label', 'title', 'url', 'audio_id', 'segment_id',
+    'start_time', 'end_time', 'text', 'created_at'
+]
+
+# Watermarks of the last export, kept next to the exported files
+STATE_FILE = "export_state.json"
+
+
+def _turn_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('timestamp_id', pa.int64()), ('embedding_id', pa.int64()), ('label', pa.string()),
+        ('title', pa.string()), ('url', pa.string()), ('audio_id', pa.int64()), ('segment_id', pa.int64()),
+        ('start_time', pa.float64()), ('end_time', pa.float64()), ('text', pa.string()),
+        ('created_at', pa.timestamp('us'))
+    ])
+
+
+class ProjectExporter:
+    def __init__(self, project_id, output_dir, format="parquet", chunk_size=10000):
+        """
+        Streams a project's speaker turns and embedding matrix to files, reading the database in
+        chunks through server-side cursors so memory stays flat regardless of the project size.
+
+        Formats:
+        - "parquet": turns.parquet and embeddings.parquet (requires pyarrow).
+        - "npz": turns.csv.gz and embeddings.npz ('embedding_ids' and 'vectors' arrays).
+
+        Parameters:
+        - project_id (int): The ID of the project.
+        - output_dir (str): Directory receiving the files.
+        - format (str): "parquet" or "npz".
+        - chunk_size (int): Rows fetched and written per chunk.
+        """
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{format}'. Choose one of {', '.join(EXPORT_FORMATS)}.")
+        if format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise ImportError("Parquet export requires the pyarrow package; use format='npz' instead.") from e
+
+        self.project_id = project_id
+        self.output_dir = output_dir
+        self.format = format
+        self.chunk_size = chunk_size
+
+    def _load_state(self):
+        path = os.path.join(self.output_dir, STATE_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return {key: datetime.fromisoformat(value) for key, value in json.load(f).items()}
+
+    def _save_state(self, state):
+        with open(os.path.join(self.output_dir, STATE_FILE), "w") as f:
+            json.dump({key: value.isoformat() for key, value in state.items()}, f, indent=2)
+
+    def _turns_query(self, since=None):
+        # Turn times are stored relative to their segment, whose start is in milliseconds
+        segment_start = cast(Segment.start_time, Float) / 1000.0
+        query = (
+            select(
+                EmbeddingTimestamp.timestamp_id,
+                EmbeddingTimestamp.embedding_id,
+                LabelName.label_name,
+                URL.title,
+                URL.url,
+                AudioFile.audio_id,
+                Segment.segment_id,
+                (segment_start + EmbeddingTimestamp.start_time).label('start_time'),
+                (segment_start + EmbeddingTimestamp.end_time).label('end_time'),
+                Transcript.text,
+                EmbeddingTimestamp.created_at,
+                Transcript.created_at.label('transcript_created_at')
+            )
+            .join(Embedding, Embedding.embedding_id == EmbeddingTimestamp.embedding_id)
+            .join(Segment, Segment.segment_id == Embedding.segment_id)
+            .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+            .join(URL, URL.url_id == AudioFile.url_id)
+            .outerjoin(EmbeddingLabel, EmbeddingLabel.embedding_id == Embedding.embedding_id)
+            .outerjoin(LabelName, LabelName.label_id == EmbeddingLabel.label_id)
+            .outerjoin(Transcript, Transcript.timestamp_id == EmbeddingTimestamp.timestamp_id)
+            .where(AudioFile.project_id == self.project_id)
+            .order_by(EmbeddingTimestamp.timestamp_id)
+        )
+        if since is not None:
+            # A turn is exported again when its transcript arrived after the last export
+            query = query.where(or_(EmbeddingTimestamp.created_at > since, Transcript.created_at > since))
+        return query
+
+    def _embeddings_filter(self, query, since=None):
+        query = (
+            query.join(Segment, Segment.segment_id == Embedding.segment_id)
+            .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+            .where(AudioFile.project_id == self.project_id)
+        )
+        if since is not None:
+            query = query.where(Embedding.created_at > since)
+        return query
+
+    def _stream(self, session, query):
+        result = session.execute(query.execution_options(stream_results=True, yield_per=self.chunk_size))
+        for partition in result.partitions():
+            yield partition
+
+    def export_turns(self, session, path, since=None):
+        """
+        Writes one row per speaker turn: label, video title and URL, audio and segment IDs,
+        start/end in seconds from the start of the video, and transcript text.
+
+        Returns:
+        - Tuple[int, datetime]: Number of rows written and the latest creation time seen.
+        """
+        written = 0
+        latest = since
+        writer = None
+        csv_file = None
+        try:
+            for rows in self._stream(session, self._turns_query(since)):
+                columns = {name: [row[i] for row in rows] for i, name in enumerate(TURN_COLUMNS)}
+                for row in rows:
+                    for created_at in (row.created_at, row.transcript_created_at):
+                        if created_at is not None and (latest is None or created_at > latest):
+                            latest = created_at
+
+                if self.format == "parquet":
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+
+                    # An explicit schema keeps chunks consistent when a column is empty in one of them
+                    table = pa.Table.from_pydict(columns, schema=_turn_schema())
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema, compression="zstd")
+                    writer.write_table(table)
+                else:
+                    if writer is None:
+                        csv_file = gzip.open(path, "wt", newline="")
+                        writer = csv.writer(csv_file)
+                        writer.writerow(TURN_COLUMNS)
+                    writer.writerows(zip(*columns.values()))
+                written += len(rows)
+        finally:
+            if self.format == "parquet" and writer is not None:
+                writer.close()
+            if csv_file is not None:
+                csv_file.close()
+        return written, latest
+
+    def export_embeddings(self, session, path, since=None):
+        """
+        Writes the embedding matrix with its embedding IDs, reading vectors from the
+        memory-mapped embedding stores chunk by chunk.
+
+        Returns:
+        - Tuple[int, datetime]: Number of embeddings written and the latest creation time seen.
+        """
+        # The count and the highest ID are read together and the stream is bounded by both, so
+        # embeddings committed while exporting cannot overflow the row count of the .npy header
+        total, max_id = session.execute(self._embeddings_filter(
+            select(func.count(Embedding.embedding_id), func.max(Embedding.embedding_id)), since
+        )).one()
+        if not total:
+            return 0, since
+
+        project_path = session.execute(
+            select(Project.project_path).where(Project.project_id == self.project_id)
+        ).scalar()
+        query = self._embeddings_filter(
+            select(Embedding.embedding_id, Embedding.created_at), since
+        ).where(Embedding.embedding_id <= max_id).order_by(Embedding.embedding_id).limit(total)
+
+        written = 0
+        latest = since
+        ids = []
+        writer = None
+        archive = None
+        vectors_entry = None
+        try:
+            for rows in self._stream(session, query):
+                embedding_ids = np.array([row[0] for row in rows], dtype=np.int64)
+                vectors = read_vectors(session, embedding_ids, dict.fromkeys(embedding_ids.tolist(), project_path))
+                created = [row[1] for row in rows if row[1] is not None]
+                if created and (latest is None or max(created) > latest):
+                    latest = max(created)
+
+                if self.format == "parquet":
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+
+                    flat = pa.array(vectors.reshape(-1), type=pa.float32())
+                    table = pa.table({
+                        'embedding_id': embedding_ids,
+                        'vector': pa.FixedSizeListArray.from_arrays(flat, vectors.shape[1])
+                    })
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema, compression="zstd")
+                    writer.write_table(table)
+                else:
+                    if vectors_entry is None:
+                        # The row count is known upfront, so the .npy header is written before the data
+                        archive = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+                        vectors_entry = archive.open("vectors.npy", "w", force_zip64=True)
+                        np.lib.format.write_array_header_1_0(vectors_entry, {
+                            'descr': np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                            'fortran_order': False,
+                            'shape': (total, vectors.shape[1])
+                        })
+                    vectors_entry.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                    ids.append(embedding_ids)
+                written += len(rows)
+
+            if vectors_entry is not None:
+                if written != total:
+                    # Embeddings deleted mid-export leave fewer rows than the header promised
+                    raise RuntimeError(
+                        f"Expected {total} embeddings but read {written}; they changed during the export."
+                    )
+                vectors_entry.close()
+                vectors_entry = None
+                with archive.open("embedding_ids.npy", "w", force_zip64=True) as ids_entry:
+                    np.lib.format.write_array(ids_entry, np.concatenate(ids))
+        except BaseException:
+            if vectors_entry is not None:
+                vectors_entry.close()
+                vectors_entry = None
+            if archive is not None:
+                archive.close()
+                archive = None
+                os.remove(path)
+            raise
+        finally:
+            if writer is not None:
+                writer.close()
+            if vectors_entry is not None:
+                vectors_entry.close()
+            if archive is not None:
+                archive.close()
+        return written, latest
+
+    def export(self, session, incremental=False):
+        """
+        Exports the project's speaker turns and embeddings.
+
+        With incremental=True only rows created since the previous export of this output
+        directory are written, to files suffixed with the export time, and the watermarks of
+        that export are advanced. Otherwise the full project is written to turns.* and embeddings.*.
+
+        Parameters:
+        - session (Session): The active database session.
+        - incremental (bool): Only export rows created since the last export.
+
+        Returns:
+        - Dict: 'turns' and 'embeddings' (rows written) and 'files' (paths written).
+        """
+        create_directory_if_not_exists(self.output_dir)
+        state = self._load_state() if incremental else {}
+        suffix = f"_{datetime.now().strftime('%Y%m%dT%H%M%S')}" if incremental else ""
+
+        if self.format == "parquet":
+            turns_path = os.path.join(self.output_dir, f"turns{suffix}.parquet")
+            embeddings_path = os.path.join(self.output_dir, f"embeddings{suffix}.parquet")
+        else:
+            turns_path = os.path.join(self.output_dir, f"turns{suffix}.csv.gz")
+            embeddings_path = os.path.join(self.output_dir, f"embeddings{suffix}.npz")
+
+        turns, state['turns'] = self.export_turns(session, turns_path, state.get('turns'))
+        embeddings, state['embeddings'] = self.export_embeddings(session, embeddings_path, state.get('embeddings'))
+        self._save_state({key: value for key, value in state.items() if value is not None})
+
+        files = [path for path in (turns_path, embeddings_path) if os.path.exists(path)]
+        print(f"Exported {turns} speaker turns and {embeddings} embeddings to {self.output_dir}.")
+        return {'turns': turns, 'embeddings': embeddings, 'files': files}
@@ -0,0 +1 @@
+from .centroids import decode_vectors, finite_rows, nearest_centroids, ward_clusters, merge_centroids, cluster_centroids
@@ -0,0 +1,101 @@
+import numpy as np
+from scipy.cluster.hierarchy import linkage, fcluster
+
+
+def decode_vectors(blobs):
+    """
+    Stacks binary float32 vectors into a matrix.
+
+    Parameters:
+    - blobs (List[bytes]): Vectors as stored in Embedding.vector or LabelName.centroid.
+
+    Returns:
+    - np.ndarray: float32 matrix with one row per vector.
+    """
+    if not blobs:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.vstack([np.frombuffer(blob, dtype=np.float32) for blob in blobs])
+
+
+def finite_rows(vectors):
+    """
+    Returns a boolean mask of rows without NaN or infinite values. pyannote returns NaN
+    embeddings for speakers with too little clean speech; they cannot be clustered.
+    """
+    return np.isfinite(vectors).all(axis=1) if vectors.size else np.zeros(len(vectors), dtype=bool)
+
+
+def nearest_centroids(vectors, centroids):
+    """
+    Finds the nearest centroid of every vector in one vectorized pass.
+
+    Parameters:
+    - vectors (np.ndarray): (n, d) matrix.
+    - centroids (np.ndarray): (k, d) matrix.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: Index of the nearest centroid and the Euclidean distance to it, per vector.
+    """
+    squared = (
+        np.einsum('ij,ij->i', vectors, vectors)[:, None]
+        + np.einsum('ij,ij->i', centroids, centroids)[None, :]
+        - 2.0 * vectors @ centroids.T
+    )
+    nearest = squared.argmin(axis=1)
+    distances = np.sqrt(np.maximum(squared[np.arange(len(vectors)), nearest], 0.0))
+    return nearest, distances
+
+
+def ward_clusters(vectors, distance_threshold):
+    """
+    Clusters vectors with Ward's method and cuts the tree at distance_threshold.
+
+    Parameters:
+    - vectors (np.ndarray): (n, d) matrix.
+    - distance_threshold (float): The distance threshold for hierarchical clustering.
+
+    Returns:
+    - np.ndarray: Cluster number (starting at 1) of every vector.
+    """
+    if len(vectors) == 1:
+        return np.ones(1, dtype=int)
+    return fcluster(linkage(vectors, method='ward'), distance_threshold, criterion='distance')
+
+
+def merge_centroids(centroids, counts, assignments, vectors):
+    """
+    Folds newly assigned vectors into running-mean centroids.
+
+    Parameters:
+    - centroids (np.ndarray): (k, d) current centroids.
+    - counts (np.ndarray): (k,) number of vectors behind each centroid.
+    - assignments (np.ndarray): Centroid index of every new vector.
+    - vectors (np.ndarray): (n, d) new vectors.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: Updated centroids and counts.
+    """
+    sums = centroids.astype(np.float64) * counts[:, None]
+    np.add.at(sums, assignments, vectors)
+    new_counts = counts + np.bincount(assignments, minlength=len(counts))
+    new_centroids = sums / np.maximum(new_counts, 1)[:, None]
+    return new_centroids.astype(np.float32), new_counts
+
+
+def cluster_centroids(vectors, clusters):
+    """
+    Computes the centroid and size of every cluster in one pass.
+
+    Parameters:
+    - vectors (np.ndarray): (n, d) matrix.
+    - clusters (np.ndarray): Cluster number of every vector.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray, np.ndarray]: Sorted cluster numbers, their (k, d) float32
+      centroids, and the number of vectors in each.
+    """
+    cluster_nums, inverse = np.unique(clusters, return_inverse=True)
+    sums = np.zeros((len(cluster_nums), vectors.shape[1]), dtype=np.float64)
+    np.add.at(sums, inverse, vectors)
+    counts = np.bincount(inverse, minlength=len(cluster_nums))
+    return cluster_nums, (sums / counts[:, None]).astype(np.float32), counts
@@ -0,0 +1,153 @@
+import gc
+import os
+import threading
+import torch
+from ..utils import get_key
+
+DIARIZATION_MODEL = 'pyannote/speaker-diarization-3.1'
+
+
+def default_device():
+    """
+    Returns the torch device models are placed on when none is requested.
+    """
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _load_pyannote(name, device, version):
+    from pyannote.audio import Pipeline
+
+    # pyannote resolves "name@revision" to a specific Hugging Face revision
+    pipeline = Pipeline.from_pretrained(
+        f"{name}@{version}" if version else name,
+        use_auth_token=get_key('SECRET_KEY_PYANNOTE')
+    )
+    return pipeline.to(torch.device(device))
+
+
+def pyannote_revision(name, version=None):
+    """
+    Identifies the pyannote weights and code a model name and version resolve to, so results
+    cached under it are invalidated when either changes. An explicit version is used as is;
+    otherwise the commit of the locally downloaded Hugging Face snapshot is read.
+
+    Parameters:
+    - name (str): Hugging Face name of the pipeline.
+    - version (str, optional): Model revision.
+
+    Returns:
+    - str: The revision and the pyannote.audio version, or None if the pipeline has not been
+      downloaded yet and no version was given.
+    """
+    import pyannote.audio
+
+    if not version:
+        try:
+            from huggingface_hub import constants
+        except ImportError:
+            return None
+        hub_cache = getattr(constants, 'HF_HUB_CACHE', None) or constants.HUGGINGFACE_HUB_CACHE
+        ref_path = os.path.join(hub_cache, "models--" + name.replace("/", "--"), "refs", "main")
+        try:
+            with open(ref_path) as f:
+                version = f.read().strip()
+        except OSError:
+            return None
+    return f"{version}+pyannote.audio-{pyannote.audio.__version__}"
+
+
+def _load_whisper(name, device, version):
+    import whisper
+
+    # Whisper encodes the checkpoint version in the model name (e.g. "large-v3")
+    return whisper.load_model(name, device=device)
+
+
+class ModelRegistry:
+    def __init__(self):
+        """
+        Process-wide cache of loaded models, keyed by kind, name, device and version.
+        Models are loaded on first use and stay resident until released.
+        """
+        self._loaders = {
+            'pyannote': _load_pyannote,
+            'whisper': _load_whisper
+        }
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def register_loader(self, kind, loader):
+        """
+        Registers a loader for a new kind of model.
+
+        Parameters:
+        - kind (str): Name of the model family.
+        - loader (callable): Called as loader(name, device, version) and returns the model.
+        """
+        self._loaders[kind] = loader
+
+    @staticmethod
+    def _key(kind, name, device, version):
+        return kind, name, str(device or default_device()), version
+
+    def get(self, kind, name, device=None, version=None):
+        """
+        Returns a cached model, loading it first if needed.
+
+        Parameters:
+        - kind (str): Model family, e.g. 'pyannote' or 'whisper'.
+        - name (str): Model name, e.g. 'pyannote/speaker-diarization-3.1' or 'base'.
+        - device (str, optional): Torch device; defaults to CUDA when available.
+        - version (str, optional): Model revision.
+
+        Returns:
+        - The loaded model.
+        """
+        key = self._key(kind, name, device, version)
+        with self._lock:
+            if key not in self._models:
+                print(f"Loading {kind} model '{name}' on {key[2]}...")
+                self._models[key] = self._loaders[kind](name, key[2], version)
+                print(f"{kind.capitalize()} model '{name}' loaded.")
+            return self._models[key]
+
+    def warm_up(self, kind, name, device=None, version=None):
+        """
+        Loads a model ahead of the first work item so later calls do not pay the loading cost.
+        Takes the same parameters as get.
+        """
+        return self.get(kind, name, device, version)
+
+    def is_loaded(self, kind, name, device=None, version=None):
+        """
+        Returns True if the model is already resident.
+        """
+        return self._key(kind, name, device, version) in self._models
+
+    def release(self, kind=None, name=None):
+        """
+        Drops cached models so their memory can be reclaimed.
+
+        Parameters:
+        - kind (str, optional): Only release models of this family.
+        - name (str, optional): Only release models with this name.
+
+        Returns:
+        - int: Number of models released.
+        """
+        with self._lock:
+            keys = [
+                key for key in self._models
+                if (kind is None or key[0] == kind) and (name is None or key[1] == name)
+            ]
+            for key in keys:
+                del self._models[key]
+
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return len(keys)
+
+
+# Shared registry of the current process
+registry = ModelRegistry()
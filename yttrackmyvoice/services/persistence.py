@@ -0,0 +1,164 @@
+from sqlalchemy import select, insert, update, bindparam, tuple_
+from ..database.models import Segment, Embedding, EmbeddingTimestamp, EmbeddingLabel, LabelName, Transcript
+from ..utils import iter_chunks
+
+# Rows per executemany batch; also bounds the keys per IN clause of the upsert lookups
+BATCH_SIZE = 500
+
+
+def insert_rows(session, model, rows, batch_size=BATCH_SIZE, return_ids=False):
+    """
+    Inserts rows with one executemany round-trip per batch, bypassing the ORM unit of work.
+    Python-side column defaults (e.g. created_at) still apply.
+
+    Parameters:
+    - session (Session): The active database session. The caller commits.
+    - model (Base): The mapped class to insert into.
+    - rows (Iterable[Dict]): Column values of every row.
+    - batch_size (int): Number of rows per round-trip.
+    - return_ids (bool): Return the generated primary keys, in row order.
+
+    Returns:
+    - List[int] | int: The primary keys of the new rows if return_ids, otherwise the number of rows.
+    """
+    primary_key = model.__mapper__.primary_key[0]
+    inserted = [] if return_ids else 0
+    for batch in iter_chunks(rows, batch_size):
+        if return_ids:
+            statement = insert(model).returning(primary_key, sort_by_parameter_order=True)
+            inserted.extend(session.scalars(statement, batch).all())
+        else:
+            session.execute(insert(model), batch)
+            inserted += len(batch)
+    return inserted
+
+
+def upsert_rows(session, model, rows, key, batch_size=BATCH_SIZE):
+    """
+    Inserts rows or updates the existing rows with the same key, with one lookup, one insert
+    and one update round-trip per batch. Works without a unique constraint on the key and on
+    any dialect.
+
+    Parameters:
+    - session (Session): The active database session. The caller commits.
+    - model (Base): The mapped class to upsert into.
+    - rows (Iterable[Dict]): Column values of every row, all with the same columns, including the key.
+    - key (Tuple[str]): Names of the columns identifying a row.
+    - batch_size (int): Number of rows per round-trip.
+
+    Returns:
+    - Dict[Tuple, int]: Primary key of every upserted row, by key values.
+    """
+    primary_key = model.__mapper__.primary_key[0]
+    key_columns = [getattr(model, name) for name in key]
+    ids = {}
+
+    for batch in iter_chunks(rows, batch_size):
+        # Later rows win when a batch repeats a key
+        by_key = {tuple(row[name] for name in key): row for row in batch}
+        if len(key) > 1:
+            condition = tuple_(*key_columns).in_(list(by_key))
+        else:
+            condition = key_columns[0].in_([row_key[0] for row_key in by_key])
+        existing = {
+            tuple(found[:-1]): found[-1]
+            for found in session.execute(select(*key_columns, primary_key).where(condition))
+        }
+
+        updates = [
+            {**{f"b_{name}": value for name, value in row.items()}, "b_pk": existing[row_key]}
+            for row_key, row in by_key.items()
+            if row_key in existing
+        ]
+        if updates:
+            columns = [name for name in updates[0] if name != "b_pk"]
+            statement = (
+                update(model.__table__)
+                .where(primary_key == bindparam("b_pk"))
+                .values({name[2:]: bindparam(name) for name in columns})
+            )
+            session.execute(statement, updates)
+        ids.update((row_key, existing[row_key]) for row_key in by_key if row_key in existing)
+
+        new_keys = [row_key for row_key in by_key if row_key not in existing]
+        if new_keys:
+            new_ids = insert_rows(session, model, [by_key[row_key] for row_key in new_keys], batch_size, return_ids=True)
+            ids.update(zip(new_keys, new_ids))
+
+    return ids
+
+
+def insert_segments(session, rows):
+    """
+    Inserts Segment rows ('audio_id', 'start_time', 'end_time', 'duration', 'file_path').
+
+    Returns:
+    - List[int]: The new segment IDs.
+    """
+    return insert_rows(session, Segment, rows, return_ids=True)
+
+
+def insert_embeddings(session, rows):
+    """
+    Inserts Embedding rows together with their EmbeddingTimestamp rows.
+
+    Parameters:
+    - session (Session): The active database session. The caller commits.
+    - rows (List[Dict]): 'segment_id', 'vector' and 'timestamps', a list of (start_time, end_time)
+      tuples in seconds, per embedding.
+
+    Returns:
+    - List[int]: The new embedding IDs, in row order.
+    """
+    embedding_ids = insert_rows(
+        session, Embedding,
+        ({'segment_id': row['segment_id'], 'vector': row['vector']} for row in rows),
+        return_ids=True
+    )
+    insert_embedding_timestamps(session, (
+        {'embedding_id': embedding_id, 'start_time': float(start), 'end_time': float(end)}
+        for embedding_id, row in zip(embedding_ids, rows)
+        for start, end in row['timestamps']
+    ))
+    return embedding_ids
+
+
+def insert_embedding_timestamps(session, rows):
+    """
+    Inserts EmbeddingTimestamp rows ('embedding_id', 'start_time', 'end_time').
+
+    Returns:
+    - int: Number of rows inserted.
+    """
+    return insert_rows(session, EmbeddingTimestamp, rows)
+
+
+def insert_embedding_labels(session, rows):
+    """
+    Inserts EmbeddingLabel rows ('embedding_id', 'label_id').
+
+    Returns:
+    - int: Number of rows inserted.
+    """
+    return insert_rows(session, EmbeddingLabel, rows)
+
+
+def upsert_label_names(session, rows):
+    """
+    Inserts or updates LabelName rows by label_name ('label_name', 'centroid', 'embedding_count').
+
+    Returns:
+    - Dict[str, int]: label_id of every upserted label, by label name.
+    """
+    return {label_name: label_id for (label_name,), label_id in upsert_rows(session, LabelName, rows, ('label_name',)).items()}
+
+
+def upsert_transcripts(session, rows):
+    """
+    Inserts Transcript rows, or replaces the text of an existing transcript of the same
+    speaker turn ('timestamp_id', 'text').
+
+    Returns:
+    - int: Number of transcripts stored.
+    """
+    return len(upsert_rows(session, Transcript, rows, ('timestamp_id',)))
@@ -0,0 +1,2 @@
+from .batch import BatchTranscriber
+from .whole_file import WholeFileTranscriber
@@ -0,0 +1,69 @@
+from bisect import bisect_left
+
+
+class IntervalIndex:
+    def __init__(self, intervals):
+        """
+        Sorted index over time intervals, answering overlap queries with a binary search.
+
+        Parameters:
+        - intervals (Iterable[Tuple[Any, float, float]]): (key, start, end) tuples, times in seconds.
+        """
+        self.intervals = sorted(intervals, key=lambda interval: interval[1])
+        self.starts = [start for _, start, _ in self.intervals]
+        # Longest interval bounds how far left of a query an overlapping interval can start
+        self.max_length = max((end - start for _, start, end in self.intervals), default=0.0)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def overlapping(self, start, end):
+        """
+        Finds every interval overlapping [start, end).
+
+        Parameters:
+        - start (float): Query start in seconds.
+        - end (float): Query end in seconds.
+
+        Returns:
+        - List[Tuple[Any, float]]: (key, overlap in seconds) for each overlapping interval.
+        """
+        lo = bisect_left(self.starts, start - self.max_length)
+        hi = bisect_left(self.starts, end)
+
+        matches = []
+        for key, interval_start, interval_end in self.intervals[lo:hi]:
+            overlap = min(end, interval_end) - max(start, interval_start)
+            if overlap > 0 or (start == end and interval_start <= start < interval_end):
+                matches.append((key, max(overlap, 0.0)))
+        return matches
+
+    def best_match(self, start, end):
+        """
+        Returns the key of the interval with the largest overlap with [start, end), or None.
+        """
+        matches = self.overlapping(start, end)
+        if not matches:
+            return None
+        return max(matches, key=lambda match: match[1])[0]
+
+
+def assign_words_to_intervals(words, index):
+    """
+    Distributes timed words onto the intervals they overlap most.
+
+    Parameters:
+    - words (Iterable[Dict]): Whisper word dicts with 'word', 'start' and 'end' keys.
+    - index (IntervalIndex): Index of the target intervals.
+
+    Returns:
+    - Dict[Any, str]: Text per interval key; intervals without words map to an empty string.
+    """
+    assigned = {key: [] for key, _, _ in index.intervals}
+    for word in words:
+        key = index.best_match(word['start'], word['end'])
+        if key is not None:
+            assigned[key].append(word['word'])
+
+    # Whisper words carry their own leading whitespace
+    return {key: "".join(parts).strip() for key, parts in assigned.items()}
@@ -0,0 +1,268 @@
+import os
+import time
+from collections import defaultdict
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import torch
+import whisper
+from ...database.models import EmbeddingTimestamp, Segment, Transcript
+from ..audio import ClipReader
+from ..cache import resolve_cache
+from ..models import registry
+from ..persistence import upsert_transcripts
+
+# Longest clip that fits a single 30-second Whisper window
+MAX_WINDOW_SECONDS = whisper.audio.CHUNK_LENGTH
+
+# Whisper model of the current worker process, loaded once by _init_worker
+_worker_transcriber = None
+
+
+def _init_worker(model_name, language, num_threads):
+    global _worker_transcriber
+    torch.set_num_threads(num_threads)
+    _worker_transcriber = BatchTranscriber(model_name=model_name, language=language, device="cpu", cache=False)
+    registry.warm_up('whisper', model_name, "cpu")
+
+
+def _transcribe_in_worker(timestamp_ids, waveforms):
+    return list(zip(timestamp_ids, _worker_transcriber.transcribe_waveforms(waveforms)))
+
+
+class BatchTranscriber:
+    def __init__(self, model_name="base", batch_size=16, device=None, language=None, workers=None, cache=None):
+        """
+        Transcribes many short clips by decoding their 30-second log-mel windows together.
+
+        Parameters:
+        - model_name (str): Whisper model size (tiny, base, small, medium, large).
+        - batch_size (int): Number of clips decoded in one forward pass.
+        - device (str, optional): Torch device; defaults to CUDA when available.
+        - language (str, optional): Spoken language; detected per clip when None.
+        - workers (int, optional): Number of CPU worker processes, each holding its own model.
+          None or 1 transcribes in the current process.
+        - cache (ArtifactCache, optional): Cache of transcripts, keyed by the parent segment audio,
+          the clip bounds, the model and the language. Defaults to the default cache; False disables it.
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.language = language
+        self.workers = workers
+        self.cache = resolve_cache(cache)
+
+    @property
+    def model(self):
+        # Loaded on first use and shared with later runs in the same process
+        return registry.get('whisper', self.model_name, self.device)
+
+    @staticmethod
+    def pending_clips(session, project_id, audio_ids=None):
+        """
+        Selects every speaker turn of a project that has no transcript yet, in one anti-join query.
+
+        Parameters:
+        - session (Session): The active database session.
+        - project_id (int): The ID of the project.
+        - audio_ids (List[int], optional): Only turns of these audio files.
+
+        Returns:
+        - List[Tuple[int, float, float, str]]: (timestamp_id, start_time, end_time, parent_path) rows.
+        """
+        query = (
+            ClipReader.query_clips(session, project_id=project_id)
+            .outerjoin(Transcript, Transcript.timestamp_id == EmbeddingTimestamp.timestamp_id)
+            .filter(Transcript.transcript_id.is_(None))
+        )
+        if audio_ids is not None:
+            query = query.filter(Segment.audio_id.in_(list(audio_ids)))
+        return query.all()
+
+    def _cache_key(self, stage, parent_path):
+        return self.cache.key(self.cache.file_hash(parent_path), stage, model=self.model_name, language=self.language)
+
+    @staticmethod
+    def _clip_name(start_time, end_time):
+        return f"{start_time:.3f}-{end_time:.3f}"
+
+    def cached_transcripts(self, clip_rows):
+        """
+        Splits pending clips into those with a cached transcript and those still to transcribe.
+
+        Parameters:
+        - clip_rows (List[Tuple[int, float, float, str]]): Rows from pending_clips, ordered by parent file.
+
+        Returns:
+        - Tuple[List[Tuple[int, str]], List[Tuple]]: (timestamp_id, text) of the cached clips,
+          and the remaining clip rows.
+        """
+        if not self.cache:
+            return [], clip_rows
+
+        hits, misses = [], []
+        for parent_path, rows in groupby(clip_rows, key=lambda row: row[3]):
+            rows = list(rows)
+            try:
+                cached = self.cache.get_json("transcripts", self._cache_key("transcripts", parent_path)) or {}
+            except OSError:
+                cached = {}
+            for row in rows:
+                text = cached.get(self._clip_name(row[1], row[2]))
+                if text is None:
+                    misses.append(row)
+                else:
+                    hits.append((row[0], text))
+        return hits, misses
+
+    def cache_transcripts(self, rows_by_id, batch):
+        """
+        Adds a batch of (timestamp_id, text) results to the cache of their parent files.
+        """
+        if not self.cache:
+            return
+
+        texts_by_parent = defaultdict(dict)
+        for timestamp_id, text in batch:
+            _, start_time, end_time, parent_path = rows_by_id[timestamp_id]
+            texts_by_parent[parent_path][self._clip_name(start_time, end_time)] = text
+        for parent_path, texts in texts_by_parent.items():
+            self.cache.update_json("transcripts", self._cache_key("transcripts", parent_path), texts)
+
+    def transcribe_waveforms(self, waveforms):
+        """
+        Transcribes a batch of 16 kHz mono waveforms.
+
+        Clips that fit a single 30-second window are decoded together in one batch; longer clips
+        go through the regular sliding-window transcription.
+
+        Parameters:
+        - waveforms (List[np.ndarray]): float32 mono waveforms sampled at 16 kHz.
+
+        Returns:
+        - List[str]: One transcription per waveform.
+        """
+        model = self.model
+        texts = [None] * len(waveforms)
+        short_indices = []
+
+        for i, waveform in enumerate(waveforms):
+            if len(waveform) > MAX_WINDOW_SECONDS * whisper.audio.SAMPLE_RATE:
+                texts[i] = model.transcribe(waveform, language=self.language, fp16=self.device == "cuda")["text"].strip()
+            else:
+                short_indices.append(i)
+
+        if short_indices:
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(
+                    whisper.pad_or_trim(torch.from_numpy(waveforms[i])),
+                    n_mels=model.dims.n_mels
+                )
+                for i in short_indices
+            ]).to(model.device)
+
+            options = whisper.DecodingOptions(
+                language=self.language,
+                without_timestamps=True,
+                fp16=self.device == "cuda"
+            )
+            results = whisper.decode(model, mels, options)
+
+            for i, result in zip(short_indices, results):
+                texts[i] = result.text.strip()
+
+        return texts
+
+    def _iter_batches(self, clip_rows, clip_reader):
+        timestamp_ids, waveforms = [], []
+        for timestamp_id, clip, sample_rate in clip_reader.iter_clips(clip_rows):
+            timestamp_ids.append(timestamp_id)
+            waveforms.append(ClipReader.to_float32_mono(clip, sample_rate, target_rate=whisper.audio.SAMPLE_RATE))
+            if len(timestamp_ids) == self.batch_size:
+                yield timestamp_ids, waveforms
+                timestamp_ids, waveforms = [], []
+        if timestamp_ids:
+            yield timestamp_ids, waveforms
+
+    def _iter_results(self, clip_rows):
+        with ClipReader() as clip_reader:
+            batches = self._iter_batches(clip_rows, clip_reader)
+
+            if not self.workers or self.workers <= 1:
+                for timestamp_ids, waveforms in batches:
+                    try:
+                        yield list(zip(timestamp_ids, self.transcribe_waveforms(waveforms)))
+                    except Exception as e:
+                        print(f"An error occurred while transcribing timestamp_ids {timestamp_ids[0]}-{timestamp_ids[-1]}: {e}")
+                return
+
+            num_threads = max(1, (os.cpu_count() or 1) // self.workers)
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.language, num_threads)
+            ) as executor:
+                # Keep a bounded number of batches in flight so decoded audio does not pile up
+                in_flight = set()
+                for timestamp_ids, waveforms in batches:
+                    in_flight.add(executor.submit(_transcribe_in_worker, timestamp_ids, waveforms))
+                    if len(in_flight) >= 2 * self.workers:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        yield from self._collect(done)
+                done, _ = wait(in_flight)
+                yield from self._collect(done)
+
+    @staticmethod
+    def _collect(futures):
+        for future in futures:
+            try:
+                yield future.result()
+            except Exception as e:
+                print(f"An error occurred in a transcription worker: {e}")
+
+    def transcribe_project(self, session, project_id, audio_ids=None):
+        """
+        Transcribes every pending speaker turn of a project and stores the transcripts in bulk.
+
+        Parameters:
+        - session (Session): The active database session.
+        - project_id (int): The ID of the project.
+        - audio_ids (List[int], optional): Only transcribe turns of these audio files.
+
+        Returns:
+        - int: Number of transcripts stored.
+        """
+        clip_rows = self.pending_clips(session, project_id, audio_ids)
+        if not clip_rows:
+            print("No pending speaker turns to transcribe.")
+            return 0
+
+        total = len(clip_rows)
+        started = time.perf_counter()
+        stored = 0
+
+        # Turns already transcribed from the same audio, in any project, are taken from the cache
+        cached, clip_rows = self.cached_transcripts(clip_rows)
+        if cached:
+            upsert_transcripts(session, [
+                {'timestamp_id': timestamp_id, 'text': text}
+                for timestamp_id, text in cached
+            ])
+            session.commit()
+            stored += len(cached)
+            print(f"Stored {stored}/{total} transcripts from the cache.")
+
+        if clip_rows:
+            print(f"Transcribing {len(clip_rows)} speaker turns in batches of {self.batch_size}.")
+        rows_by_id = {row[0]: row for row in clip_rows}
+
+        for batch in self._iter_results(clip_rows):
+            upsert_transcripts(session, [
+                {'timestamp_id': timestamp_id, 'text': text}
+                for timestamp_id, text in batch
+            ])
+            session.commit()
+            self.cache_transcripts(rows_by_id, batch)
+            stored += len(batch)
+            print(f"Stored {stored}/{total} transcripts ({time.perf_counter() - started:.1f}s elapsed).")
+
+        return stored
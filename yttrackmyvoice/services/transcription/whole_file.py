@@ -0,0 +1,99 @@
+import time
+from itertools import groupby
+from ..persistence import upsert_transcripts
+from .alignment import IntervalIndex, assign_words_to_intervals
+from .batch import BatchTranscriber
+
+
+class WholeFileTranscriber(BatchTranscriber):
+    """
+    Transcribes each parent segment file once with word-level timestamps and splits the words
+    onto the speaker turns they overlap, instead of running Whisper once per turn.
+    """
+
+    def __init__(self, model_name="base", batch_size=16, device=None, language=None, workers=None, cache=None):
+        """
+        Parameters are those of BatchTranscriber. Each parent file is transcribed in a single
+        sliding-window Whisper pass in the current process, so batch_size and workers are
+        accepted for interface compatibility but ignored.
+        """
+        if workers and workers > 1:
+            print(f"Whole-file transcription runs in the current process; ignoring workers={workers}.")
+        super().__init__(model_name=model_name, batch_size=batch_size, device=device, language=language,
+                         workers=None, cache=cache)
+
+    def transcribe_file(self, file_path):
+        """
+        Transcribes an audio file with word-level timestamps. The words are cached by the file's
+        content, the model and the language, so the same audio is only transcribed once.
+
+        Parameters:
+        - file_path (str): Path to the audio file.
+
+        Returns:
+        - List[Dict]: Words with 'word', 'start' and 'end' keys, times in seconds.
+        """
+        cache_key = self._cache_key("words", file_path) if self.cache else None
+        if cache_key:
+            words = self.cache.get_json("words", cache_key)
+            if words is not None:
+                return words
+
+        result = self.model.transcribe(
+            file_path,
+            language=self.language,
+            word_timestamps=True,
+            fp16=self.device == "cuda"
+        )
+        words = [
+            {'word': word['word'], 'start': float(word['start']), 'end': float(word['end'])}
+            for segment in result["segments"] for word in segment.get("words", [])
+        ]
+        if cache_key:
+            self.cache.put_json("words", cache_key, words)
+        return words
+
+    def transcribe_project(self, session, project_id, audio_ids=None):
+        """
+        Transcribes every pending speaker turn of a project, one Whisper pass per parent segment file.
+
+        Parameters:
+        - session (Session): The active database session.
+        - project_id (int): The ID of the project.
+        - audio_ids (List[int], optional): Only transcribe turns of these audio files.
+
+        Returns:
+        - int: Number of transcripts stored.
+        """
+        clip_rows = self.pending_clips(session, project_id, audio_ids)
+        if not clip_rows:
+            print("No pending speaker turns to transcribe.")
+            return 0
+
+        started = time.perf_counter()
+        stored = 0
+
+        # pending_clips orders rows by parent file, so each group is one parent
+        for parent_path, rows in groupby(clip_rows, key=lambda row: row[3]):
+            index = IntervalIndex(
+                (timestamp_id, start_time, end_time)
+                for timestamp_id, start_time, end_time, _ in rows
+            )
+
+            print(f"Transcribing '{parent_path}' for {len(index)} speaker turns...")
+            try:
+                words = self.transcribe_file(parent_path)
+            except Exception as e:
+                print(f"An error occurred while transcribing '{parent_path}': {e}")
+                continue
+
+            texts = assign_words_to_intervals(words, index)
+            upsert_transcripts(session, [
+                {'timestamp_id': timestamp_id, 'text': text}
+                for timestamp_id, text in texts.items()
+            ])
+            session.commit()
+            stored += len(texts)
+            print(f"Stored {stored}/{len(clip_rows)} transcripts ({time.perf_counter() - started:.1f}s elapsed).")
+
+        return stored
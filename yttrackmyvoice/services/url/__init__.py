@@ -0,0 +1,2 @@
+from .downloads import DownloadScheduler
+from .metadata import fetch_video_metadata, fetch_metadata_concurrently
@@ -0,0 +1,222 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+from ...database import SessionLocal
+from ...database.models import URL
+from ...download_audio import Downloader
+
+
+class HostLimits:
+    def __init__(self, per_host_limit):
+        """
+        Hands out one semaphore per host, bounding the concurrent downloads against each host.
+
+        Parameters:
+        - per_host_limit (int): Maximum concurrent downloads against the same host.
+        """
+        self.per_host_limit = per_host_limit
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, host):
+        # Created under the lock so two threads never get different semaphores for one host
+        with self._lock:
+            if host not in self._limits:
+                self._limits[host] = threading.Semaphore(self.per_host_limit)
+            return self._limits[host]
+
+
+def fetch_with_retries(downloader, url_id, host_limit, max_retries=3, backoff_seconds=2.0,
+                       on_attempt=None, on_retry=None):
+    """
+    Downloads the audio stream of a URL record, retrying failures with jittered exponential
+    backoff. Each attempt holds the host's semaphore; the backoff sleep does not.
+
+    Parameters:
+    - downloader (Downloader): Downloader whose fetch_audio_stream is called.
+    - url_id (int): The ID of the URL record.
+    - host_limit (Semaphore): Semaphore of the URL's host, see HostLimits.
+    - max_retries (int): Number of retries for a failed download.
+    - backoff_seconds (float): Base delay of the exponential backoff between retries.
+    - on_attempt (callable, optional): Called with the attempt number before each attempt.
+    - on_retry (callable, optional): Called with the exception of a failed attempt that will be retried.
+
+    Returns:
+    - Dict: The download job, or None if the URL record does not exist. The error of the last
+      attempt is raised once the retries are exhausted.
+    """
+    for attempt in range(1, max_retries + 2):
+        if on_attempt:
+            on_attempt(attempt)
+        try:
+            with host_limit:
+                return downloader.fetch_audio_stream(url_id, on_progress_callback=None)
+        except Exception as e:
+            if attempt > max_retries:
+                raise
+            if on_retry:
+                on_retry(e)
+            time.sleep(backoff_seconds * (2 ** (attempt - 1)) * (1 + random.random()))
+
+
+class DownloadScheduler:
+    def __init__(self, downloader=None, io_workers=4, cpu_workers=None, per_host_limit=2,
+                 max_retries=3, backoff_seconds=2.0):
+        """
+        Schedules downloads on a bounded I/O pool and ffmpeg conversions on a separate pool,
+        so fetching the next video overlaps with transcoding the previous one.
+
+        Parameters:
+        - downloader (Downloader, optional): Downloader used for the individual stages.
+        - io_workers (int): Number of concurrent stream downloads.
+        - cpu_workers (int, optional): Number of concurrent ffmpeg conversions; defaults to the CPU count.
+          Each conversion runs in its own ffmpeg process, so threads are enough to drive them.
+        - per_host_limit (int): Maximum concurrent downloads against the same host.
+        - max_retries (int): Number of retries for a failed download.
+        - backoff_seconds (float): Base delay of the exponential backoff between retries.
+        """
+        self.downloader = downloader or Downloader()
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        self.results = {}  # url_id -> result dict, see _set_status
+        self._lock = threading.Lock()
+        self._register_lock = threading.Lock()  # Serializes AudioFile inserts
+        self._host_limits = HostLimits(per_host_limit)
+        self._io_pool = None
+        self._cpu_pool = None
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _set_status(self, url_id, status, **fields):
+        with self._lock:
+            result = self.results.setdefault(url_id, {
+                'url_id': url_id,
+                'status': 'queued',
+                'attempts': 0,
+                'wav_path': None,
+                'audio_id': None,
+                'error': None
+            })
+            result['status'] = status
+            result.update(fields)
+
+    def submit(self, url_ids):
+        """
+        Queues URL records for download and conversion without waiting for them.
+
+        Parameters:
+        - url_ids (List[int]): IDs of the URL records to process.
+
+        Returns:
+        - None
+        """
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="download")
+            self._cpu_pool = ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix="convert")
+
+        session = SessionLocal()
+        try:
+            rows = session.query(URL.url_id, URL.url).filter(URL.url_id.in_(url_ids)).all()
+        finally:
+            session.close()
+
+        found = {url_id for url_id, _ in rows}
+        for url_id in url_ids:
+            if url_id not in found:
+                self._set_status(url_id, 'failed', error="URL record not found")
+
+        for url_id, url in rows:
+            self._set_status(url_id, 'queued')
+            host = urlparse(url).hostname or ""
+            with self._lock:
+                self._futures.append(self._io_pool.submit(self._fetch, url_id, host))
+
+    def _fetch(self, url_id, host):
+        try:
+            job = fetch_with_retries(
+                self.downloader, url_id, self._host_limits(host), self.max_retries, self.backoff_seconds,
+                on_attempt=lambda attempt: self._set_status(url_id, 'downloading', attempts=attempt),
+                on_retry=lambda e: self._set_status(url_id, 'retrying', error=str(e))
+            )
+        except Exception as e:
+            self._set_status(url_id, 'failed', error=str(e))
+            return
+
+        if job is None:
+            self._set_status(url_id, 'failed', error="URL record not found")
+            return
+
+        if os.path.exists(job['wav_path']):
+            self._set_status(url_id, 'skipped', wav_path=job['wav_path'])
+            return
+
+        self._set_status(url_id, 'converting')
+        with self._lock:
+            self._futures.append(self._cpu_pool.submit(self._convert, job))
+
+    def _convert(self, job):
+        url_id = job['url_id']
+        try:
+            converted = self.downloader.convert_audio(job)
+            if not converted:
+                self._set_status(url_id, 'failed', error="ffmpeg conversion failed")
+                return
+
+            with self._register_lock:
+                audio_id = self.downloader.register_audio_file(job)
+            self._set_status(url_id, 'done', wav_path=job['wav_path'], audio_id=audio_id, error=None)
+        except Exception as e:
+            self._set_status(url_id, 'failed', error=str(e))
+
+    def wait(self):
+        """
+        Blocks until every submitted URL has been downloaded, converted or has failed.
+
+        Returns:
+        - List[Dict]: One result per URL with 'url_id', 'status' ('done', 'skipped' or 'failed'),
+          'attempts', 'wav_path', 'audio_id' and 'error'.
+        """
+        while True:
+            with self._lock:
+                pending = [future for future in self._futures if not future.done()]
+            if not pending:
+                break
+            wait(pending)
+
+        with self._lock:
+            return [dict(result) for result in self.results.values()]
+
+    def run(self, url_ids):
+        """
+        Downloads and converts the given URL records and waits for all of them.
+
+        Parameters:
+        - url_ids (List[int]): IDs of the URL records to process.
+
+        Returns:
+        - List[Dict]: Per-URL results, see wait.
+        """
+        self.submit(url_ids)
+        return self.wait()
+
+    def shutdown(self):
+        """
+        Waits for outstanding work and releases the worker pools.
+        """
+        if self._io_pool is not None:
+            self.wait()
+            self._io_pool.shutdown()
+            self._cpu_pool.shutdown()
+            self._io_pool = self._cpu_pool = None
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+from pytubefix import YouTube
+
+
+def fetch_video_metadata(url):
+    """
+    Fetches the title, author and view count of a YouTube video.
+
+    Parameters:
+    - url (str): The YouTube video URL.
+
+    Returns:
+    - Dict: 'title', 'author' and 'views' of the video.
+    """
+    yt = YouTube(url)
+    return {
+        'title': yt.title,
+        'author': yt.author,
+        'views': yt.views
+    }
+
+
+def fetch_metadata_concurrently(urls, max_workers=8):
+    """
+    Fetches metadata for many videos on a bounded thread pool.
+
+    Parameters:
+    - urls (List[str]): YouTube video URLs.
+    - max_workers (int): Maximum number of concurrent requests.
+
+    Returns:
+    - Dict[str, Dict | Exception]: Metadata per URL, or the exception raised while fetching it.
+    """
+    def fetch(url):
+        try:
+            return fetch_video_metadata(url)
+        except Exception as e:
+            return e
+
+    if not urls:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+        return dict(zip(urls, executor.map(fetch, urls)))
@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from .database.models import AudioFile
 from sqlalchemy.exc import SQLAlchemyError
 import os
+from itertools import islice
 
 def create_directory_if_not_exists(directory_path):
     """
@@ -27,29 +28,59 @@ def create_directory_if_not_exists(directory_path):
         return False  # Return False indicating the directory already existed
 
 
-def extract_video_urls_from_playlist(playlist_url):
+def iter_video_urls_from_playlist(playlist_url):
     """
-    Given a YouTube playlist URL, this function returns a list of video URLs.
+    Lazily yields the video URLs of a YouTube playlist, page by page, without building a
+    YouTube object per video.
 
     Args:
         playlist_url (str): The URL of the YouTube playlist.
 
-    Returns:
-        list: A list of video URLs from the playlist.
+    Yields:
+        str: The watch URL of each video in the playlist.
     """
     try:
         # Create a Playlist object using pytubefix
         playlist = Playlist(playlist_url)
 
-        # Extract all video URLs from the playlist
-        video_urls = [video.watch_url for video in playlist.videos]
+        # url_generator fetches the next page only when the current one is exhausted
+        yield from playlist.url_generator()
 
-        return video_urls
-    
     except Exception as e:
         # Handle any error that occurs during the playlist extraction
         print(f"An error occurred: {e}")
-        return []
+
+
+def extract_video_urls_from_playlist(playlist_url):
+    """
+    Given a YouTube playlist URL, this function returns a list of video URLs.
+
+    Args:
+        playlist_url (str): The URL of the YouTube playlist.
+
+    Returns:
+        list: A list of video URLs from the playlist.
+    """
+    return list(iter_video_urls_from_playlist(playlist_url))
+
+
+def iter_chunks(iterable, chunk_size):
+    """
+    Splits an iterable into lists of at most chunk_size items without materializing it.
+
+    Args:
+        iterable (Iterable): The items to split.
+        chunk_size (int): The maximum number of items per chunk.
+
+    Yields:
+        list: The next chunk of items.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
 
 
 def get_key(secret_key):
@@ -1,24 +1,34 @@
 import os
+import threading
 import numpy as np
-import whisper
-from pytubefix import YouTube
 from sqlalchemy.exc import SQLAlchemyError
-from .database import SessionLocal
+from .database import SessionLocal, init_db
+from .database.fulltext import search_transcripts
 from .database.models import (
-    Project, URL, AudioFile, Segment, Embedding, EmbeddingTimestamp, LabelName, EmbeddingLabel, Transcript
+    Project, URL, AudioFile, Segment, Embedding, EmbeddingTimestamp, LabelName, EmbeddingLabel
 )
-from .download_audio import Downloader
 from .embed_audio import Embedder
 from .label_embeddings import EmbeddingLabeler
+from .pipeline import PipelineRunner
 from .segment_audio import Segmenter
+from .services.audio import ClipReader, TimestampSlicer
+from .services.embedding import EmbeddingStore, EmbeddingWorkerPool, SpeakerSearchIndex, fetch_embeddings
+from .services.export import ProjectExporter
+from .services.models import DIARIZATION_MODEL, registry
+from .services.url import DownloadScheduler, fetch_metadata_concurrently
+from .services.transcription import BatchTranscriber, WholeFileTranscriber
 from .utils import (
     create_directory_if_not_exists,
-    extract_video_urls_from_playlist,
     get_key,
+    iter_chunks,
+    iter_video_urls_from_playlist,
     get_url_title
 )
 import simpleaudio as sa
 
+# Maximum number of URLs checked per IN query, below SQLite's bound-parameter limit
+URL_LOOKUP_CHUNK_SIZE = 500
+
 class Yyt:
     def __init__(self, project_name):
         """
@@ -27,12 +37,14 @@ class Yyt:
         Parameters:
         - project_name: The name of the project to create or retrieve.
         """
-        # Ensure the data directory exists
+        # Ensure the data directory and the database schema exist
         create_directory_if_not_exists(get_key('DATA_DIRECTORY'))
+        init_db()
 
         # Replace spaces in the project name with underscores
         self.project_name = project_name.replace(" ", "_")
         self.project = None  # Will hold the Project instance
+        self._metadata_threads = []  # Background metadata fetches started by add_urls
 
         # Create or get the project upon initialization
         self._create_or_get_project()
@@ -73,12 +85,22 @@ class Yyt:
         finally:
             session.close()
 
-    def add_urls(self, url_list):
+    def add_urls(self, url_list, max_workers=8, defer_metadata=False, show_existing=True):
         """
         Add new URLs to the project and display existing ones.
 
+        Existing URLs are looked up with one query for the whole list, video metadata is fetched
+        concurrently, and the new rows are inserted in a single transaction.
+
         Parameters:
         - url_list: A list of YouTube URLs to add to the project.
+        - max_workers (int): Maximum number of concurrent metadata requests.
+        - defer_metadata (bool): Insert the rows right away and fill in title, author and views
+          in a background thread. Call wait_for_metadata() to block until it has finished.
+        - show_existing (bool): Print the URLs already saved in the project.
+
+        Returns:
+        - List[int]: IDs of the newly added URL records.
         """
         session = SessionLocal()
         try:
@@ -87,61 +109,157 @@ class Yyt:
             session.refresh(self.project)
 
             # Display existing URLs
-            urls = session.query(URL).filter_by(project_id=self.project.project_id).all()
-            if urls:
-                print(f"The project '{self.project_name}' contains the following URLs:\n")
-                for url_entry in urls:
-                    print(f"- {url_entry.url}")
+            if show_existing:
+                urls = session.query(URL).filter_by(project_id=self.project.project_id).all()
+                if urls:
+                    print(f"The project '{self.project_name}' contains the following URLs:\n")
+                    for url_entry in urls:
+                        print(f"- {url_entry.url}")
+                else:
+                    print(f"The project '{self.project_name}' has no saved URLs.")
+
+            # Look up which of the requested URLs already exist, in one query per chunk of IN parameters
+            requested = list(dict.fromkeys(url_list))
+            existing = set()
+            for start in range(0, len(requested), URL_LOOKUP_CHUNK_SIZE):
+                chunk = requested[start:start + URL_LOOKUP_CHUNK_SIZE]
+                existing.update(
+                    url for (url,) in session.query(URL.url).filter(
+                        URL.project_id == self.project.project_id,
+                        URL.url.in_(chunk)
+                    )
+                )
+            for url in existing:
+                print(f"URL already exists: {url}")
+
+            new_urls = [url for url in requested if url not in existing]
+            if defer_metadata:
+                new_records = [URL(project_id=self.project.project_id, url=url) for url in new_urls]
             else:
-                print(f"The project '{self.project_name}' has no saved URLs.")
+                metadata = fetch_metadata_concurrently(new_urls, max_workers=max_workers)
+                new_records = []
+                for url in new_urls:
+                    if isinstance(metadata[url], Exception):
+                        print(f"Failed to process the YouTube URL '{url}'. Error details: {metadata[url]}.")
+                        continue
+                    new_records.append(URL(project_id=self.project.project_id, url=url, **metadata[url]))
 
-            # Add new URLs
-            for url in url_list:
-                existing_url = session.query(URL).filter_by(url=url, project_id=self.project.project_id).first()
-                if existing_url:
-                    print(f"URL already exists: {url}")
-                    continue
+            session.add_all(new_records)
+            session.flush()  # Assign url_ids in one batched insert
 
-                try:
-                    yt = YouTube(url)
-                except Exception as e:
-                    print(f"Failed to process the YouTube URL '{url}'. Error details: {e}.")
-                    continue
+            urls_by_id = {record.url_id: record.url for record in new_records}
+            session.commit()
 
-                new_url = URL(
-                    project_id=self.project.project_id,
-                    url=url,
-                    title=yt.title,
-                    author=yt.author,
-                    views=yt.views
-                )
-                session.add(new_url)
+            for url in urls_by_id.values():
                 print(f"Added new URL: {url}")
-
-            session.commit()
             print(f"URLs successfully updated for project '{self.project_name}'.")
+
+            if defer_metadata and urls_by_id:
+                thread = threading.Thread(
+                    target=self._fill_url_metadata,
+                    args=(urls_by_id, max_workers),
+                    daemon=True
+                )
+                thread.start()
+                self._metadata_threads.append(thread)
+
+            return list(urls_by_id)
         except Exception as e:
             session.rollback()
             print(f"An error occurred while managing URLs: {e}")
+            return []
         finally:
             session.close()
 
-    def add_playlists(self, playlist_list):
+    def _fill_url_metadata(self, urls_by_id, max_workers):
+        """
+        Fetches metadata for already inserted URL records and updates them in one transaction.
+
+        Parameters:
+        - urls_by_id (Dict[int, str]): URLs keyed by their url_id.
+        - max_workers (int): Maximum number of concurrent metadata requests.
+        """
+        metadata = fetch_metadata_concurrently(list(urls_by_id.values()), max_workers=max_workers)
+
+        updates = []
+        for url_id, url in urls_by_id.items():
+            if isinstance(metadata[url], Exception):
+                print(f"Failed to fetch metadata for '{url}'. Error details: {metadata[url]}.")
+                continue
+            updates.append({'url_id': url_id, **metadata[url]})
+
+        session = SessionLocal()
+        try:
+            session.bulk_update_mappings(URL, updates)
+            session.commit()
+            print(f"Metadata filled in for {len(updates)} URLs.")
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Database error occurred while storing URL metadata: {e}")
+        finally:
+            session.close()
+
+    def wait_for_metadata(self):
+        """
+        Blocks until every background metadata fetch started by add_urls has finished.
+        """
+        while self._metadata_threads:
+            self._metadata_threads.pop().join()
+
+    def add_playlists(self, playlist_list, chunk_size=50, download=False, max_workers=8):
         """
         Extracts video URLs from YouTube playlists and adds them to the project.
 
+        Playlists are expanded lazily and registered chunk by chunk. With download=True each
+        registered chunk is handed to a download scheduler right away, so downloads start while
+        the rest of the playlist is still being listed.
+
         Parameters:
         - playlist_list: A list of playlist URLs.
+        - chunk_size (int): Number of video URLs registered at a time.
+        - download (bool): Download the audio of newly added videos while expanding.
+        - max_workers (int): Maximum number of concurrent metadata requests.
+
+        Returns:
+        - List[int]: IDs of the newly added URL records.
         """
-        playlist_urls = []
-        for playlist in playlist_list:
-            playlist_urls.extend(extract_video_urls_from_playlist(playlist))
+        scheduler = DownloadScheduler() if download else None
+        new_url_ids = []
+        try:
+            for playlist in playlist_list:
+                for chunk in iter_chunks(iter_video_urls_from_playlist(playlist), chunk_size):
+                    chunk_ids = self.add_urls(chunk, max_workers=max_workers, show_existing=False)
+                    new_url_ids.extend(chunk_ids)
+                    if scheduler and chunk_ids:
+                        scheduler.submit(chunk_ids)
+
+            if scheduler:
+                results = scheduler.wait()
+                failed = [result for result in results if result['status'] == 'failed']
+                print(f"Downloaded {len(results) - len(failed)} of {len(results)} new videos.")
+                for result in failed:
+                    print(f"- URL ID {result['url_id']} failed: {result['error']}")
+        finally:
+            if scheduler:
+                scheduler.shutdown()
 
-        self.add_urls(playlist_urls)
+        return new_url_ids
 
-    def download_all_audio(self):
+    def download_all_audio(self, io_workers=4, cpu_workers=None, per_host_limit=2, max_retries=3):
         """
         Downloads audio for all URLs associated with the project.
+
+        Downloads run on a bounded I/O pool and ffmpeg conversions on a separate pool, so the
+        next video downloads while the previous one is being converted.
+
+        Parameters:
+        - io_workers (int): Number of concurrent downloads.
+        - cpu_workers (int, optional): Number of concurrent conversions; defaults to the CPU count.
+        - per_host_limit (int): Maximum concurrent downloads against the same host.
+        - max_retries (int): Number of retries, with exponential backoff, for a failed download.
+
+        Returns:
+        - List[Dict]: One result per URL with 'url_id', 'status', 'attempts', 'wav_path', 'audio_id' and 'error'.
         """
         session = SessionLocal()
         try:
@@ -149,19 +267,33 @@ class Yyt:
             session.add(self.project)
             session.refresh(self.project)
 
-            urls = session.query(URL).filter_by(project_id=self.project.project_id).all()
+            url_ids = [
+                url_id for (url_id,) in
+                session.query(URL.url_id).filter_by(project_id=self.project.project_id).all()
+            ]
+        finally:
+            session.close()
 
-            if not urls:
-                print(f"No URLs found for project '{self.project_name}'. Please add URLs first.")
-                return
+        if not url_ids:
+            print(f"No URLs found for project '{self.project_name}'. Please add URLs first.")
+            return []
 
-            downloader = Downloader()
+        with DownloadScheduler(
+            io_workers=io_workers,
+            cpu_workers=cpu_workers,
+            per_host_limit=per_host_limit,
+            max_retries=max_retries
+        ) as scheduler:
+            results = scheduler.run(url_ids)
 
-            for url_record in urls:
-                url_id = url_record.url_id
-                downloader.download_youtube_audio(url_id)
-        finally:
-            session.close()
+        for status in ('done', 'skipped', 'failed'):
+            count = sum(1 for result in results if result['status'] == status)
+            print(f"{status.capitalize()}: {count}")
+        for result in results:
+            if result['status'] == 'failed':
+                print(f"- URL ID {result['url_id']} failed after {result['attempts']} attempt(s): {result['error']}")
+
+        return results
 
     def segment_all_audio(self, segment_length_ms=2 * 60 * 1000):
         """
@@ -197,9 +329,25 @@ class Yyt:
         finally:
             session.close()
 
-    def embed_all_audio(self):
+    def embed_all_audio(self, segmentation_batch_size=32, embedding_batch_size=32, num_threads=None,
+                        num_interop_threads=None, workers=None, backend="fp32"):
         """
         Generates embeddings for all audio segments associated with the project.
+
+        With workers > 1, segments are diarized on a pool of processes that each load the pipeline
+        once, while this process writes the results to the database in batches.
+
+        Parameters:
+        - segmentation_batch_size (int): Batch size of the segmentation model.
+        - embedding_batch_size (int): Batch size of the speaker embedding model.
+        - num_threads (int, optional): Torch intra-op thread count; defaults to torch's own setting.
+        - num_interop_threads (int, optional): Torch inter-op thread count.
+        - workers (int, optional): Number of worker processes. num_threads then applies per worker.
+        - backend (str): Inference backend: "fp32", "int8" (quantized) or "onnx" (ONNX Runtime).
+
+        Returns:
+        - Dict: Throughput statistics ('segments', 'audio_seconds', 'wall_seconds', 'throughput'),
+          or None if nothing was embedded.
         """
         session = SessionLocal()
         try:
@@ -211,34 +359,96 @@ class Yyt:
 
             if not audio_files:
                 print(f"No audio files found for project '{self.project_name}'. Please add audio files first.")
-                return
-
-            embedder = Embedder()  # Create an instance of the Embedder class
+                return None
+
+            # Select every segment of the project that has no embeddings yet, in one query
+            pending_segment_ids = [
+                segment_id for (segment_id,) in
+                session.query(Segment.segment_id)
+                .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+                .outerjoin(Embedding, Embedding.segment_id == Segment.segment_id)
+                .filter(AudioFile.project_id == self.project.project_id, Embedding.embedding_id.is_(None))
+                .order_by(Segment.segment_id)
+                .all()
+            ]
+        finally:
+            session.close()
 
-            for audio_file in audio_files:
-                segment_files = session.query(Segment).filter_by(audio_id=audio_file.audio_id).all()
-                for segment_file in segment_files:
-                    segment_id = segment_file.segment_id
-                    segment_file_path = segment_file.file_path
-                    segment_embeddings = session.query(Embedding).filter_by(segment_id=segment_id).first()
-
-                    if segment_embeddings:
-                        print(f"Embeddings already exist for '{segment_file_path}'")
-                        continue
+        if not pending_segment_ids:
+            print("Embeddings already exist for every segment.")
+            return None
+
+        if workers and workers > 1:
+            pool = EmbeddingWorkerPool(
+                workers=workers,
+                threads_per_worker=num_threads,
+                segmentation_batch_size=segmentation_batch_size,
+                embedding_batch_size=embedding_batch_size,
+                backend=backend
+            )
+            return pool.run(pending_segment_ids)
+
+        embedder = Embedder(backend=backend)  # Create an instance of the Embedder class
+        return embedder.embed_segments(
+            pending_segment_ids,
+            segmentation_batch_size=segmentation_batch_size,
+            embedding_batch_size=embedding_batch_size,
+            num_threads=num_threads,
+            num_interop_threads=num_interop_threads
+        )
+
+    def rebuild_embedding_store(self):
+        """
+        Regenerates the project's memory-mapped embedding store from the database, e.g. for
+        embeddings stored before the store existed or after an interrupted run.
 
-                    embedder.store_embedding_and_timestamp(segment_id)
+        Returns:
+        - int: Number of embeddings in the rebuilt store.
+        """
+        session = SessionLocal()
+        try:
+            store = EmbeddingStore.for_project(self.project.project_path)
+            written = store.rebuild(session, self.project.project_id)
+            print(f"Rebuilt the embedding store of project '{self.project_name}' with {written} embeddings.")
+            return written
+        except Exception as e:
+            print(f"An error occurred while rebuilding the embedding store: {e}")
+            return 0
         finally:
             session.close()
 
-    def cluster_and_label_embeddings(self, distance_threshold=1):
+    def cluster_and_label_embeddings(self, distance_threshold=1, full=False, assignment_threshold=None,
+                                     hierarchical=False, link_threshold=None, workers=None):
         """
         Clusters and labels embeddings for the project.
 
+        By default only unlabeled embeddings are labeled, by assigning them to the nearest
+        speaker centroid or opening new speakers. With full=True every embedding is re-clustered
+        and the previous labels are replaced. With hierarchical=True the re-cluster runs in two
+        stages, per video and then across videos, which scales to large playlists.
+
         Parameters:
-        - distance_threshold: The distance threshold for clustering (default is 5).
+        - distance_threshold: The distance threshold for clustering (default is 1).
+        - full (bool): Re-cluster all embeddings from scratch.
+        - assignment_threshold (float, optional): Maximum distance to a speaker centroid for a new
+          embedding to join that speaker. Defaults to distance_threshold.
+        - hierarchical (bool): Re-cluster all embeddings per video first, then link the per-video
+          speakers across videos.
+        - link_threshold (float, optional): Distance threshold of the cross-video stage.
+          Defaults to distance_threshold.
+        - workers (int, optional): Number of processes for the per-video stage.
         """
-        labeler = EmbeddingLabeler(distance_threshold=distance_threshold)
-        labeler.cluster_and_label_embeddings()
+        labeler = EmbeddingLabeler(
+            distance_threshold=distance_threshold,
+            assignment_threshold=assignment_threshold,
+            link_threshold=link_threshold
+        )
+        if hierarchical:
+            labeler.cluster_hierarchically(workers=workers)
+        elif full:
+            labeler.cluster_and_label_embeddings()
+        else:
+            labeler.assign_new_embeddings()
 
     def list_labels(self):
         """
@@ -354,72 +564,179 @@ class Yyt:
         finally:
             session.close()
 
-    def retrieve_embeddings_for_audio_files(self, audio_file_ids):
+    def search_speaker(self, query_file, top_k=10, min_similarity=None, all_projects=False):
         """
-        Retrieves embeddings associated with the specified audio file IDs.
+        Finds where the speaker of a query clip talks, by comparing the clip's speaker embedding
+        with every stored embedding.
 
-        Args:
-        - audio_file_ids (List[int]): A list of audio file IDs.
+        The query is embedded with the same diarization pipeline as the corpus; if it contains
+        several speakers, the one speaking the longest is used.
+
+        Parameters:
+        - query_file (str): Path to a WAV file of the person to look for.
+        - top_k (int): Number of embeddings to return.
+        - min_similarity (float, optional): Drop results below this cosine similarity.
+        - all_projects (bool): Search every project instead of only this one.
 
         Returns:
-        - embeddings_list (List[np.ndarray]): A list of embedding vectors.
-        - labels_list (List[Dict]): A list of dictionaries containing metadata, including audio_file_id.
+        - List[Dict]: Ranked results with 'embedding_id', 'score', 'title', 'url', 'audio_id',
+          'segment_id' and 'timestamps' (list of (start_time, end_time) tuples).
         """
+        result = Embedder().diarize(query_file)
+        if not len(result['embeddings']):
+            print(f"No speech found in '{query_file}'.")
+            return []
+
+        # Use the speaker with the most speech in the query clip
+        speech = np.bincount(result['speakers'], weights=result['ends'] - result['starts'],
+                             minlength=len(result['embeddings']))
+        query_vector = result['embeddings'][int(speech.argmax())]
+
         session = SessionLocal()
         try:
-            print("Retrieving embeddings for specified audio files from the database.")
+            index = SpeakerSearchIndex.from_database(
+                session, project_id=None if all_projects else self.project.project_id
+            )
+            embedding_ids, scores = index.query(query_vector, top_k=top_k)
+            if min_similarity is not None:
+                keep = scores >= min_similarity
+                embedding_ids, scores = embedding_ids[keep], scores[keep]
+            if not len(embedding_ids):
+                print("No matching speakers found.")
+                return []
+
+            # Fetch titles and speaking turns of every hit in one joined query
+            rows = (
+                session.query(
+                    Embedding.embedding_id, Segment.segment_id, Segment.audio_id, URL.title, URL.url,
+                    EmbeddingTimestamp.start_time, EmbeddingTimestamp.end_time
+                )
+                .join(Segment, Segment.segment_id == Embedding.segment_id)
+                .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+                .join(URL, URL.url_id == AudioFile.url_id)
+                .join(EmbeddingTimestamp, EmbeddingTimestamp.embedding_id == Embedding.embedding_id)
+                .filter(Embedding.embedding_id.in_(embedding_ids.tolist()))
+                .order_by(EmbeddingTimestamp.start_time)
+                .all()
+            )
 
-            # Retrieve segments associated with the specified audio files
-            segments = session.query(Segment).filter(Segment.audio_id.in_(audio_file_ids)).all()
+            hits = {
+                int(embedding_id): {'embedding_id': int(embedding_id), 'score': float(score), 'timestamps': []}
+                for embedding_id, score in zip(embedding_ids, scores)
+            }
+            for embedding_id, segment_id, audio_id, title, url, start_time, end_time in rows:
+                hit = hits[embedding_id]
+                hit.update(title=title, url=url, audio_id=audio_id, segment_id=segment_id)
+                hit['timestamps'].append((start_time, end_time))
+
+            results = [hit for hit in hits.values() if hit['timestamps']]
+            for hit in results:
+                print(f"{hit['score']:.3f}  {hit['title']} (Audio ID {hit['audio_id']}, Segment ID {hit['segment_id']}): "
+                      + ", ".join(f"{start:.1f}s-{end:.1f}s" for start, end in hit['timestamps']))
+            return results
+        except SQLAlchemyError as e:
+            print(f"Database error occurred during speaker search: {e}")
+            return []
+        finally:
+            session.close()
 
-            if not segments:
-                print("No segments found for the specified audio files.")
-                return [], []
+    def fetch_embeddings(self, audio_file_ids=None):
+        """
+        Retrieves the project's embeddings in columnar form, in a fixed number of joined queries.
 
-            # Create a mapping from segment_id to audio_file_id for quick lookup
-            segment_id_map = {segment.segment_id: segment.audio_id for segment in segments}
+        Parameters:
+        - audio_file_ids (List[int], optional): Only embeddings of these audio files.
 
-            segment_ids = [segment.segment_id for segment in segments]
+        Returns:
+        - EmbeddingSet: (n, d) float32 'vectors', ID arrays ('embedding_ids', 'segment_ids',
+          'audio_ids') and flat 'start_times' / 'end_times' arrays indexed by 'timestamp_offsets'.
+          Use to_dataframe() for a pandas DataFrame with one row per speaker turn.
+        """
+        session = SessionLocal()
+        try:
+            return fetch_embeddings(session, project_id=self.project.project_id, audio_ids=audio_file_ids)
+        finally:
+            session.close()
 
-            # Now retrieve embeddings for these segments
-            embeddings = session.query(Embedding).filter(Embedding.segment_id.in_(segment_ids)).all()
+    def export_project(self, output_dir=None, format="parquet", incremental=False, chunk_size=10000):
+        """
+        Streams the project's speaker turns (label, video title, audio ID, start/end and
+        transcript text) and its embedding matrix to files, chunk by chunk.
 
-            if not embeddings:
-                print("No embeddings found for the specified segments.")
-                return [], []
+        Parameters:
+        - output_dir (str, optional): Destination directory; defaults to the project's 'exports' folder.
+        - format (str): "parquet" (requires pyarrow) or "npz" (turns as gzipped CSV, embeddings as NPZ).
+        - incremental (bool): Only export rows created since the last export to output_dir.
+        - chunk_size (int): Rows fetched and written per chunk.
 
-            embeddings_list = []
-            labels_list = []
+        Returns:
+        - Dict: 'turns' and 'embeddings' (rows written) and 'files' (paths written), or None on error.
+        """
+        output_dir = output_dir or os.path.join(self.project.project_path, "exports")
+        session = SessionLocal()
+        try:
+            exporter = ProjectExporter(self.project.project_id, output_dir, format=format, chunk_size=chunk_size)
+            return exporter.export(session, incremental=incremental)
+        except (ImportError, ValueError) as e:
+            print(e)
+            return None
+        except SQLAlchemyError as e:
+            print(f"Database error occurred during export: {e}")
+            return None
+        finally:
+            session.close()
 
-            for embedding in embeddings:
-                # Deserialize the embedding vector
-                embedding_vector = np.frombuffer(embedding.vector, dtype=np.float32)
+    def search_transcripts(self, query, limit=20, offset=0, raw=False, all_projects=False):
+        """
+        Searches the project's transcripts, best match first, with the speaker label, video title
+        and time of every hit. On SQLite hits are ranked by BM25 over the full-text index; other
+        databases fall back to an unranked LIKE search.
 
-                # Retrieve timestamps associated with the embedding
-                timestamps = session.query(EmbeddingTimestamp).filter_by(embedding_id=embedding.embedding_id).all()
+        Parameters:
+        - query (str): Words to search for (all must match).
+        - limit (int): Number of hits per page.
+        - offset (int): Number of hits to skip, e.g. page * limit.
+        - raw (bool): Pass query to FTS5 unchanged, to use phrases, OR, NEAR or prefix* queries.
+        - all_projects (bool): Search every project instead of this one.
 
-                timestamp_list = []
-                for ts in timestamps:
-                    timestamp_info = { 
-                        'start_time': ts.start_time,
-                        'end_time': ts.end_time,
-                        'created_at': ts.created_at
-                    }
-                    timestamp_list.append(timestamp_info)
+        Returns:
+        - List[Dict]: 'transcript_id', 'timestamp_id', 'snippet' (matches wrapped in [ ]), 'score',
+          'label', 'title', 'url', 'audio_id', and 'start_time' / 'end_time' in seconds from the
+          start of the video. Empty on error.
+        """
+        session = SessionLocal()
+        try:
+            project_id = None if all_projects else self.project.project_id
+            return search_transcripts(session, query, project_id=project_id, limit=limit, offset=offset, raw=raw)
+        except SQLAlchemyError as e:
+            print(f"Database error occurred during transcript search: {e}")
+            return []
+        finally:
+            session.close()
+
+    def retrieve_embeddings_for_audio_files(self, audio_file_ids):
+        """
+        Retrieves embeddings associated with the specified audio file IDs.
+        Adapter over fetch_embeddings, which returns the same data in columnar form.
+
+        Args:
+        - audio_file_ids (List[int]): A list of audio file IDs.
 
-                # Get the audio_file_id from the segment_id_map
-                audio_file_id = segment_id_map.get(embedding.segment_id, None)
+        Returns:
+        - embeddings_list (List[np.ndarray]): A list of embedding vectors.
+        - labels_list (List[Dict]): A list of dictionaries containing metadata, including audio_file_id.
+        """
+        session = SessionLocal()
+        try:
+            print("Retrieving embeddings for specified audio files from the database.")
 
-                embedding_info = {
-                    'embedding_id': embedding.embedding_id,
-                    'segment_id': embedding.segment_id,
-                    'audio_file_id': audio_file_id,
-                    'timestamps': timestamp_list,
-                    'created_at': embedding.created_at
-                }
+            embedding_set = fetch_embeddings(session, audio_ids=audio_file_ids)
+            if not len(embedding_set):
+                print("No embeddings found for the specified audio files.")
+                return [], []
 
-                embeddings_list.append(embedding_vector)
-                labels_list.append(embedding_info)
+            labels_list = embedding_set.to_records()
+            embeddings_list = [record.pop('vector') for record in labels_list]
 
             print(f"Total embeddings retrieved: {len(embeddings_list)}")
             return embeddings_list, labels_list
@@ -432,67 +749,53 @@ class Yyt:
         finally:
             session.close()
 
-    def segment_audio_using_embeddings_timestamps(self):
+    def segment_audio_using_embeddings_timestamps(self, workers=None):
         """
-        Segments audio files based on the EmbeddingTimestamps table.
+        Materializes speaker turns as WAV files based on the EmbeddingTimestamps table.
+        This export is optional: transcription and playback read turns as virtual clips.
         Each segment is saved with a filename corresponding to its timestamp ID
         in a separate 'segments' directory at the same level as the audio folders.
+
+        Timestamps are grouped by their parent segment file so each parent is opened once,
+        memory-mapped, and sliced with direct byte-range copies.
+
+        Parameters:
+        - workers (int, optional): Number of processes used to slice parent files in parallel.
         """
         session = SessionLocal()
         try:
             print("Starting audio segmentation using EmbeddingTimestamps.")
 
-            # Retrieve all EmbeddingTimestamps
-            embedding_timestamps = session.query(EmbeddingTimestamp).all()
-            if not embedding_timestamps:
+            # Retrieve the project's EmbeddingTimestamps together with their parent segment file
+            rows = (
+                session.query(
+                    EmbeddingTimestamp.timestamp_id,
+                    EmbeddingTimestamp.start_time,
+                    EmbeddingTimestamp.end_time,
+                    Segment.file_path
+                )
+                .join(Embedding, Embedding.embedding_id == EmbeddingTimestamp.embedding_id)
+                .join(Segment, Segment.segment_id == Embedding.segment_id)
+                .join(AudioFile, AudioFile.audio_id == Segment.audio_id)
+                .filter(AudioFile.project_id == self.project.project_id)
+                .all()
+            )
+            if not rows:
                 print("No EmbeddingTimestamps found in the database.")
                 return
 
-            segmenter = Segmenter()  # Utilize the existing Segmenter class
-
             # Define a top-level 'segments' directory within the project path
             project_path = self.project.project_path
             segments_dir = os.path.join(project_path, "FinalSegments")
             create_directory_if_not_exists(segments_dir)
             print(f"Segments directory ready: {segments_dir}")
 
-            for et in embedding_timestamps:
-                embedding_id = et.embedding_id
-                timestamp_id = et.timestamp_id
-                start_time = et.start_time
-                end_time = et.end_time
-
-                # Retrieve the associated embedding and segment to get the audio file path
-                embedding = session.query(Embedding).filter_by(embedding_id=embedding_id).first()
-                if not embedding:
-                    print(f"Embedding with ID {embedding_id} not found.")
-                    continue
-
-                segment = embedding.segment
-                if not segment:
-                    print(f"Segment associated with Embedding ID {embedding_id} not found.")
-                    continue
-
-                audio_file_path = segment.file_path
-
-                # Define output file path using timestamp_id within the top-level 'segments' directory
-                output_filename = f"segment_{timestamp_id}.wav"
-                output_file_path = os.path.join(segments_dir, output_filename)
-
-                # Convert start_time and end_time from seconds to milliseconds
-                start_ms = int(start_time * 1000)
-                end_ms = int(end_time * 1000)
-
-                # Export the segment
-                segmenter.export_segment(
-                    input_file=audio_file_path,
-                    start_ms=start_ms,
-                    end_ms=end_ms,
-                    output_file=output_file_path,
-                    format="wav"
-                )
+            slicer = TimestampSlicer(workers=workers)
+            groups = slicer.group_by_parent(rows, segments_dir)
+            print(f"Slicing {len(rows)} timestamps from {len(groups)} parent files.")
 
-                print(f"Segmented audio saved as {output_file_path}")
+            written = slicer.slice(groups)
+            print(f"Segmented {len(written)} audio clips into {segments_dir}")
 
         except Exception as e:
             session.rollback()
@@ -500,65 +803,41 @@ class Yyt:
         finally:
             session.close()
 
-    def transcribe_final_segments(self):
+    def transcribe_final_segments(self, model_name="base", batch_size=16, workers=None, language=None, mode="clips"):
         """
-        Transcribes audio segments in the 'FinalSegments' directory using Whisper
-        and stores the transcriptions in the database linked to their timestamp IDs.
+        Transcribes the project's speaker turns using Whisper and stores the transcriptions
+        in the database linked to their timestamp IDs.
+
+        Turns are read as virtual clips straight from their parent segment files, so
+        segment_audio_using_embeddings_timestamps is not required beforehand. Pending turns are
+        selected in one query and decoded in batches; transcripts are written once per batch.
+
+        With mode="whole_file", each parent segment file is transcribed once with word-level
+        timestamps and the words are split onto the overlapping speaker turns instead.
+
+        Parameters:
+        - model_name (str): Whisper model size (tiny, base, small, medium, large).
+        - batch_size (int): Number of clips decoded together.
+        - workers (int, optional): Number of CPU worker processes, each loading its own model.
+        - language (str, optional): Spoken language; detected per clip when None.
+        - mode (str): "clips" to transcribe each turn separately, "whole_file" to transcribe each
+          segment file once and align words to turns.
         """
         session = SessionLocal()
         try:
-            # Initialize the Whisper model (you can choose different model sizes)
-            print("Loading Whisper model...")
-            model = whisper.load_model("base")  # Options: tiny, base, small, medium, large
-            print("Whisper model loaded.")
-
-            # Define the path to the FinalSegments directory
-            project_path = self.project.project_path
-            final_segments_dir = os.path.join(project_path, "FinalSegments")
-
-            if not os.path.isdir(final_segments_dir):
-                print(f"FinalSegments directory not found at path: {final_segments_dir}")
+            if mode not in ("clips", "whole_file"):
+                print(f"Unknown transcription mode '{mode}'. Use 'clips' or 'whole_file'.")
                 return
 
-            # Iterate over all audio files in FinalSegments
-            for filename in os.listdir(final_segments_dir):
-                if filename.endswith(".wav"):
-                    file_path = os.path.join(final_segments_dir, filename)
-
-                    # Extract timestamp_id from filename (assuming format: segment_{timestamp_id}.wav)
-                    try:
-                        timestamp_id_str = filename.split("_")[1].split(".")[0]
-                        timestamp_id = int(timestamp_id_str)
-                    except (IndexError, ValueError):
-                        print(f"Filename '{filename}' does not match the expected format. Skipping.")
-                        continue
-
-                    # Check if transcription already exists for this timestamp_id
-                    existing_transcript = session.query(Transcript).filter_by(timestamp_id=timestamp_id).first()
-                    if existing_transcript:
-                        print(f"Transcript already exists for timestamp_id {timestamp_id}. Skipping.")
-                        continue
-
-                    # Transcribe the audio file using Whisper
-                    print(f"Transcribing '{filename}'...")
-                    try:
-                        result = model.transcribe(file_path)
-                        transcription = result["text"].strip()
-                        print(f"Transcription for timestamp_id {timestamp_id}: {transcription}")
-                    except Exception as e:
-                        print(f"An error occurred while transcribing '{filename}': {e}")
-                        continue
-
-                    # Create a new Transcript record
-                    new_transcript = Transcript(
-                        timestamp_id=timestamp_id,
-                        text=transcription
-                    )
-                    session.add(new_transcript)
-                    session.commit()
-                    print(f"Transcription stored for timestamp_id {timestamp_id}.")
-
-            print("All eligible audio segments have been transcribed and stored.")
+            transcriber_class = WholeFileTranscriber if mode == "whole_file" else BatchTranscriber
+            transcriber = transcriber_class(
+                model_name=model_name,
+                batch_size=batch_size,
+                language=language,
+                workers=workers
+            )
+            stored = transcriber.transcribe_project(session, self.project.project_id)
+            print(f"All eligible audio segments have been transcribed and stored ({stored} new transcripts).")
 
         except Exception as e:
             session.rollback()
@@ -566,6 +845,93 @@ class Yyt:
         finally:
             session.close()
 
+    def run_pipeline(self, url_ids=None, workers=None, queue_size=2, max_in_flight=None,
+                     segment_length_ms=30 * 60 * 1000, label=True, transcribe=True, model_name="base",
+                     language=None, mode="clips", backend="fp32"):
+        """
+        Downloads, segments, embeds, labels and transcribes the project's URLs as a streaming
+        pipeline: each URL moves to the next stage as soon as it is done with the previous one,
+        instead of every stage waiting for the whole project. URLs already processed by an earlier
+        run skip the stages they have completed.
+
+        Parameters:
+        - url_ids (List[int], optional): URL records to process; defaults to every URL of the project.
+        - workers (Dict[str, int], optional): Worker threads per stage ('download', 'convert',
+          'segment', 'embed', 'transcribe'); see pipeline.DEFAULT_WORKERS.
+        - queue_size (int): Capacity of the queue in front of each stage.
+        - max_in_flight (int, optional): Maximum number of URLs in the pipeline at once, which bounds
+          the downloaded audio waiting for the slower stages.
+        - segment_length_ms (int): Length of each segment in milliseconds.
+        - label (bool): Assign new embeddings to speakers as each URL is embedded.
+        - transcribe (bool): Transcribe each URL's speaker turns once it is embedded.
+        - model_name (str): Whisper model size.
+        - language (str, optional): Spoken language; detected per clip when None.
+        - mode (str): Transcription mode, "clips" or "whole_file".
+        - backend (str): Embedding inference backend: "fp32", "int8" or "onnx".
+
+        Returns:
+        - List[Dict]: One result per URL, see PipelineRunner.run.
+        """
+        if mode not in ("clips", "whole_file"):
+            print(f"Unknown transcription mode '{mode}'. Use 'clips' or 'whole_file'.")
+            return []
+
+        if url_ids is None:
+            session = SessionLocal()
+            try:
+                url_ids = [
+                    url_id for (url_id,) in
+                    session.query(URL.url_id).filter_by(project_id=self.project.project_id).order_by(URL.url_id).all()
+                ]
+            finally:
+                session.close()
+
+        if not url_ids:
+            print(f"No URLs found for project '{self.project_name}'. Please add URLs first.")
+            return []
+
+        transcriber = None
+        if transcribe:
+            transcriber_class = WholeFileTranscriber if mode == "whole_file" else BatchTranscriber
+            transcriber = transcriber_class(model_name=model_name, language=language)
+
+        runner = PipelineRunner(
+            self.project.project_id,
+            workers=workers,
+            queue_size=queue_size,
+            max_in_flight=max_in_flight,
+            segment_length_ms=segment_length_ms,
+            embedder=Embedder(backend=backend),
+            labeler=None if label else False,
+            transcriber=transcriber
+        )
+        results = runner.run(url_ids)
+        for result in results:
+            if result['status'] == 'failed':
+                print(f"- URL ID {result['url_id']} failed at the {result['stage']} stage: {result['error']}")
+        return results
+
+    def warm_up_models(self, whisper_model="base", diarization_model=DIARIZATION_MODEL):
+        """
+        Loads the diarization pipeline and the Whisper model ahead of time so a long-lived
+        process keeps them resident across runs.
+
+        Parameters:
+        - whisper_model (str, optional): Whisper model size to load; None skips it.
+        - diarization_model (str, optional): Diarization pipeline to load; None skips it.
+        """
+        if diarization_model:
+            registry.warm_up('pyannote', diarization_model)
+        if whisper_model:
+            registry.warm_up('whisper', whisper_model)
+
+    def release_models(self):
+        """
+        Releases every cached model so its memory can be reclaimed.
+        """
+        released = registry.release()
+        print(f"Released {released} cached model(s).")
+
     def play_segments_by_label(self, label_name):
         """
         Play all audio segments associated with the specified speaker label.
@@ -593,54 +959,26 @@ class Yyt:
             # Retrieve all embedding_ids
             embedding_ids = [el.embedding_id for el in embedding_labels]
 
-            # Retrieve all EmbeddingTimestamps for these embeddings
-            embedding_timestamps = session.query(EmbeddingTimestamp).filter(
-                EmbeddingTimestamp.embedding_id.in_(embedding_ids)
-            ).all()
-
-            if not embedding_timestamps:
-                print(f"No embedding timestamps found for label '{label_name}'.")
-                return
-
-            # Retrieve unique segment_ids
-            segment_ids = list(
-                set(
-                    et.embedding.segment_id
-                    for et in embedding_timestamps
-                    if et.embedding and et.embedding.segment
-                )
+            # Resolve every speaker turn of these embeddings to a range of its parent segment file
+            clip_rows = (
+                ClipReader.query_clips(session)
+                .filter(EmbeddingTimestamp.embedding_id.in_(embedding_ids))
+                .all()
             )
 
-            if not segment_ids:
-                print(f"No segments found for label '{label_name}'.")
-                return
-
-            # Retrieve all Segments
-            segments = session.query(Segment).filter(Segment.segment_id.in_(segment_ids)).all()
-
-            if not segments:
-                print(f"No segments found for label '{label_name}'.")
-                return
-
-            # Retrieve file paths
-            file_paths = [segment.file_path for segment in segments]
-
-            if not file_paths:
-                print(f"No audio files found for label '{label_name}'.")
+            if not clip_rows:
+                print(f"No embedding timestamps found for label '{label_name}'.")
                 return
 
-            # Play each file
-            for file_path in file_paths:
-                if os.path.exists(file_path):
-                    print(f"Playing segment: {file_path}")
+            # Play each speaker turn straight from the mapped parent file
+            with ClipReader() as clip_reader:
+                for timestamp_id, clip, sample_rate in clip_reader.iter_clips(clip_rows):
+                    print(f"Playing timestamp_id {timestamp_id} ({clip.shape[0] / sample_rate:.1f}s)")
                     try:
-                        wave_obj = sa.WaveObject.from_wave_file(file_path)
-                        play_obj = wave_obj.play()
+                        play_obj = sa.play_buffer(clip, clip.shape[1], clip.dtype.itemsize, sample_rate)
                         play_obj.wait_done()  # Wait until playback is finished
                     except Exception as e:
-                        print(f"Failed to play {file_path}: {e}")
-                else:
-                    print(f"File not found: {file_path}")
+                        print(f"Failed to play timestamp_id {timestamp_id}: {e}")
 
         except Exception as e:
             print(f"An error occurred while playing segments: {e}")